@@ -0,0 +1,62 @@
+# app/api/conditional.py
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the values that identify one version of a representation"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def _etag_list(header: str):
+    return [tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()]
+
+
+def _http_date(value: datetime) -> str:
+    # Stored timestamps are naive UTC
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def not_modified(
+    request: Request, response: Response, etag: str, last_modified: Optional[datetime] = None
+) -> Optional[Response]:
+    """Set validators on the response and return a 304 if the client's copy is current.
+
+    Routes call this before building the response model, so an unchanged resource
+    costs only the lookup of its validators.
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = _etag_list(if_none_match)
+        fresh = "*" in tags or etag in tags
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or last_modified is None:
+            return None
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        fresh = last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+    return Response(status_code=304, headers=headers) if fresh else None
+
+
+def require_match(request: Request, etag: str):
+    """Reject a write with 412 unless If-Match (when sent) names the current ETag"""
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return
+    tags = [tag.strip() for tag in if_match.split(",")]
+    if "*" not in tags and etag not in tags:
+        raise HTTPException(status_code=412, detail="Resource has changed; fetch it again before updating")
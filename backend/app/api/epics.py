@@ -1,84 +1,143 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import json
+import time
 
-from app.database import get_db
+from app.database import get_db, get_async_db, AsyncSessionLocal
 from app.models.epic import Epic
-from app.models.user_story import UserStory
+from app.models.user_story import UserStory, is_latest_version
 from app.schemas.project import EpicResponse, UserStoryCreate, UserStoryResponse
-from app.services.gemini import gemini_service
+from app.services.generation import generate_stories_for_epic, stream_stories_for_epic
+from app.services.gemini import GenerationError
+from app.services.jobs import job_queue
+from app.services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, paginate, set_next_page_headers
+from app.api.jobs import job_accepted
+from app.api.conditional import make_etag, not_modified, require_match
+from app.api.stories import story_etag
+from app.models.project import Project
+from app.api.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.get("/{epic_id}", response_model=EpicResponse)
-def get_epic(epic_id: int, db: Session = Depends(get_db)):
+def get_epic(epic_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific epic with its details"""
     epic = db.query(Epic).filter(Epic.id == epic_id).first()
     if not epic:
         raise HTTPException(status_code=404, detail="Epic not found")
-    return epic
+    etag = make_etag("epic", epic.id, epic.updated_at.isoformat())
+    return not_modified(request, response, etag, epic.updated_at) or epic
 
 @router.get("/{epic_id}/stories", response_model=List[UserStoryResponse])
-def get_epic_stories(epic_id: int, db: Session = Depends(get_db)):
-    """Get all user stories for a specific epic"""
+def get_epic_stories(
+    epic_id: int,
+    request: Request,
+    response: Response,
+    latest_only: bool = False,
+    priority: Optional[str] = None,
+    version: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Get an epic's user stories a page at a time, optionally only the latest version of each"""
     epic = db.query(Epic).filter(Epic.id == epic_id).first()
     if not epic:
         raise HTTPException(status_code=404, detail="Epic not found")
     
-    stories = db.query(UserStory).filter(UserStory.epic_id == epic_id).all()
+    revision = db.query(Project.revision).filter(Project.id == epic.project_id).scalar()
+    unchanged = not_modified(request, response, make_etag("epic-stories", epic_id, revision, request.url.query))
+    if unchanged:
+        return unchanged
+
+    query = db.query(UserStory).filter(UserStory.epic_id == epic_id)
+    if latest_only:
+        query = query.filter(is_latest_version())
+    if priority is not None:
+        query = query.filter(UserStory.priority == priority)
+    if version is not None:
+        query = query.filter(UserStory.version == version)
+    try:
+        stories, next_cursor = paginate(query, UserStory, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_page_headers(request, response, next_cursor)
     return stories
 
 @router.post("/{epic_id}/generate-stories", response_model=List[UserStoryResponse])
-async def generate_user_stories(epic_id: int, db: Session = Depends(get_db)):
+async def generate_user_stories(epic_id: int, use_cache: bool = True, background: bool = False, db: AsyncSession = Depends(get_async_db)):
     """Generate user stories for an epic using AI"""
-    epic = db.query(Epic).filter(Epic.id == epic_id).first()
+    epic = await db.get(Epic, epic_id)
     if not epic:
         raise HTTPException(status_code=404, detail="Epic not found")
     
-    # Get project context
-    project = epic.project
+    if background:
+        return job_accepted(await job_queue.enqueue(db, "generate_stories", {"epic_id": epic_id, "use_cache": use_cache}))
     
     try:
-        # Generate stories using Gemini
-        stories_data = await gemini_service.generate_user_stories(
-            epic_title=epic.title,
-            epic_description=epic.description,
-            project_context=f"{project.name}: {project.description}",
-            app_type=project.app_type
-        )
-        
-        # Create and save stories to database
-        created_stories = []
-        for story_data in stories_data:
-            story = UserStory(
-                epic_id=epic_id,
-                title=story_data["title"],
-                user_story=story_data["user_story"],
-                acceptance_criteria=story_data["acceptance_criteria"],
-                priority=story_data.get("priority", "Medium"),
-                story_points=story_data.get("story_points", 3),
-                version=1
-            )
-            db.add(story)
-            created_stories.append(story)
-        
-        db.commit()
-        
-        # Refresh to get IDs
-        for story in created_stories:
-            db.refresh(story)
-        
-        return created_stories
+        return await generate_stories_for_epic(db, epic, use_cache=use_cache)
         
+    except GenerationError as e:
+        await db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=f"Failed to generate stories: {str(e)}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error in generate_user_stories: {e}")  # This will show in your FastAPI logs
         raise HTTPException(status_code=500, detail=f"Failed to generate stories: {str(e)}")
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/{epic_id}/generate-stories/stream")
+async def stream_user_stories(epic_id: int, use_cache: bool = True, db: AsyncSession = Depends(get_async_db)):
+    """Generate user stories for an epic, pushing each saved story over Server-Sent Events"""
+    epic = await db.get(Epic, epic_id)
+    if not epic:
+        raise HTTPException(status_code=404, detail="Epic not found")
+
+    async def events():
+        # The stream outlives the request-scoped session, so it uses its own
+        started = time.perf_counter()
+        first_story_at = None
+        count = 0
+        async with AsyncSessionLocal() as stream_db:
+            try:
+                stream_epic = await stream_db.get(Epic, epic_id)
+                async for story in stream_stories_for_epic(stream_db, stream_epic, use_cache=use_cache):
+                    if first_story_at is None:
+                        first_story_at = time.perf_counter() - started
+                    count += 1
+                    yield _sse("story", UserStoryResponse.model_validate(story).model_dump(mode="json"))
+                yield _sse("done", {
+                    "stories": count,
+                    "first_story_seconds": round(first_story_at, 3) if first_story_at is not None else None,
+                    "total_seconds": round(time.perf_counter() - started, 3)
+                })
+            except Exception as e:
+                await stream_db.rollback()
+                print(f"Error in stream_user_stories: {e}")
+                yield _sse("error", {"detail": f"Failed to generate stories: {str(e)}", "stories": count})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.put("/{epic_id}/stories/{story_id}", response_model=UserStoryResponse)
-def update_user_story(epic_id: int, story_id: int, story_update: UserStoryCreate, db: Session = Depends(get_db)):
-    """Update a user story"""
+def update_user_story(
+    epic_id: int,
+    story_id: int,
+    story_update: UserStoryCreate,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Update a user story; send If-Match with the ETag you read to avoid overwriting newer edits"""
     story = db.query(UserStory).filter(
         UserStory.id == story_id, 
         UserStory.epic_id == epic_id
@@ -86,6 +145,7 @@ def update_user_story(epic_id: int, story_id: int, story_update: UserStoryCreate
     
     if not story:
         raise HTTPException(status_code=404, detail="User story not found")
+    require_match(request, story_etag(story))
     
     # Update fields
     story.title = story_update.title
@@ -96,6 +156,7 @@ def update_user_story(epic_id: int, story_id: int, story_update: UserStoryCreate
     
     db.commit()
     db.refresh(story)
+    response.headers["ETag"] = story_etag(story)
     
     return story
 
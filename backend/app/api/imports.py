@@ -0,0 +1,32 @@
+# app/api/imports.py
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.models import Project
+from app.schemas.project import ImportResponse
+from app.services.importer import CSV_NEEDS_PROJECT, IMPORT_FORMATS, import_records
+from app.api.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+@router.post("", response_model=ImportResponse)
+def import_backlog(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(" + "|".join(IMPORT_FORMATS) + ")$"),
+    project_id: Optional[int] = Query(None, description="Project for epics whose project is not in the file"),
+    db: Session = Depends(get_db)
+):
+    """Bulk import projects, epics and stories from a JSONL or CSV export.
+
+    Records are validated and inserted in chunked transactions; rows that fail are
+    listed by line number while the rest of the file is still imported.
+    """
+    if project_id is not None and not db.query(Project.id).filter(Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    import_format = format or ("csv" if (file.filename or "").endswith(".csv") else "jsonl")
+    if import_format == "csv" and project_id is None:
+        raise HTTPException(status_code=422, detail=CSV_NEEDS_PROJECT)
+    return import_records(db, file.file, import_format, project_id=project_id)
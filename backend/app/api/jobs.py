@@ -0,0 +1,46 @@
+# app/api/jobs.py
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db
+from app.models import Job
+from app.schemas.project import JobResponse, JobResultResponse
+from app.api.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+def job_accepted(job: Job) -> JSONResponse:
+    """202 response pointing the client at a queued job"""
+    return JSONResponse(
+        status_code=202,
+        content=JobResponse.model_validate(job).model_dump(mode="json"),
+        headers={"Location": f"/api/jobs/{job.id}"}
+    )
+
+@router.get("/", response_model=List[JobResponse])
+def get_jobs(status: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+    """List recent jobs, newest first"""
+    query = db.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    return query.order_by(Job.id.desc()).limit(limit).all()
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Poll the status of a job"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}/result", response_model=JobResultResponse)
+def get_job_result(job_id: int, db: Session = Depends(get_db)):
+    """Fetch the result of a finished job"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in ("pending", "running"):
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+    return job
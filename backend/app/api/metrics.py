@@ -0,0 +1,75 @@
+# app/api/metrics.py
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.cache import response_cache
+from app.services.metrics import http_request_duration, metrics, request_scope
+from app.services.scheduler import model_scheduler
+from app.services.singleflight import generation_flight
+from app.api.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+
+class MetricsMiddleware:
+    """Times each request by route template and exposes its scope to the SQL metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_scope.reset(token)
+            # The router records the matched route in the scope; raw paths would
+            # give every project id its own series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=status
+            )
+
+
+def _service_gauges():
+    cache = response_cache.stats()
+    scheduler = model_scheduler.stats()
+    flight = generation_flight.stats()
+    return {
+        "llm_cache_hits_total": ("LLM response cache hits since start", cache["hits"]),
+        "llm_cache_misses_total": ("LLM response cache misses since start", cache["misses"]),
+        "llm_cache_entries": ("Responses stored in the LLM cache", cache["stored_entries"]),
+        "gemini_queue_depth": ("Model calls waiting for a slot", scheduler["queue_depth"]),
+        "gemini_in_flight": ("Model calls running", scheduler["in_flight"]),
+        "gemini_concurrency_limit": ("Current adaptive model call concurrency", scheduler["concurrency_limit"]),
+        "gemini_throttled_total": ("Model calls throttled by Gemini since start", scheduler["throttled"]),
+        "gemini_retries_total": ("Model call retries since start", scheduler["retries"]),
+        "generation_coalesced_total": ("Generation requests that joined an identical one in flight", flight["coalesced"]),
+    }
+
+
+metrics.add_collector(_service_gauges)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request, model call and SQL metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
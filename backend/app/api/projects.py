@@ -1,19 +1,61 @@
 # app/api/projects.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.models import Project, Epic
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer, selectinload, with_loader_criteria
+from typing import Dict, List, Optional
+import json
+from app.database import get_db, get_async_db, AsyncSessionLocal
+from app.models import Project, Epic, UserStory
+from app.models.user_story import is_latest_version
 from app.schemas.project import (
     ProjectCreate, 
     ProjectResponse, 
     ProjectUpdate,
     GenerateEpicsRequest,
-    EpicResponse
+    GenerateStoriesBatchRequest,
+    GenerateStoriesBatchResponse,
+    EpicResponse,
+    ProjectTreeResponse,
+    DuplicatesResponse
 )
-from app.services.gemini import gemini_service
+from app.config import settings
+from app.services.generation import generate_epics_for_project, generate_stories_for_epics, plan_project
+from app.services.gemini import GenerationError
+from app.services.jobs import job_queue
+from app.services.dedup import find_duplicate_groups
+from app.services.export import EXPORT_FORMATS, export_project
+from app.services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, paginate, set_next_page_headers
+from app.api.jobs import job_accepted
+from app.api.conditional import make_etag, not_modified, require_match
+from app.api.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+
+def _project_etag(project: Project) -> str:
+    return make_etag("project", project.id, project.updated_at.isoformat())
+
+def _project_revision(db: Session, project_id: int) -> Optional[int]:
+    """Change counter of a project, or None if it does not exist"""
+    return db.query(Project.revision).filter(Project.id == project_id).scalar()
+
+# Large text columns the tree endpoint can leave out, keyed by the name used in ?omit=
+TREE_TRIMMABLE_FIELDS = {
+    "project.description": Project.description,
+    "project.context": Project.context,
+    "epic.description": Epic.description,
+    "story.user_story": UserStory.user_story,
+    "story.acceptance_criteria": UserStory.acceptance_criteria,
+}
+TREE_FIELDS = {
+    "project": ["id", "name", "description", "app_type", "context", "created_at", "updated_at"],
+    "epic": ["id", "title", "description", "created_at", "updated_at"],
+    "story": [
+        "id", "title", "user_story", "acceptance_criteria", "priority", "story_points",
+        "version", "parent_story_id", "root_story_id", "duplicate_of_id", "created_at", "updated_at"
+    ],
+}
 
 @router.post("/", response_model=ProjectResponse)
 def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
@@ -25,32 +67,60 @@ def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
     return db_project
 
 @router.get("/", response_model=List[ProjectResponse])
-def get_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all projects"""
-    projects = db.query(Project).offset(skip).limit(limit).all()
-    return projects
+def get_projects(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    app_type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get projects a page at a time; the next page's cursor is in X-Next-Cursor"""
+    query = db.query(Project)
+    if app_type is not None:
+        query = query.filter(Project.app_type == app_type)
+    try:
+        projects, next_cursor = paginate(query, Project, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_page_headers(request, response, next_cursor)
+    etag = make_etag("projects", request.url.query, next_cursor, *(
+        f"{project.id}@{project.updated_at.isoformat()}" for project in projects
+    ))
+    return not_modified(request, response, etag) or projects
 
 @router.get("/{project_id}", response_model=ProjectResponse)
-def get_project(project_id: int, db: Session = Depends(get_db)):
+def get_project(project_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific project"""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    return project
+    return not_modified(request, response, _project_etag(project), project.updated_at) or project
 
 @router.put("/{project_id}", response_model=ProjectResponse)
-def update_project(project_id: int, project: ProjectUpdate, db: Session = Depends(get_db)):
-    """Update a project"""
+def update_project(
+    project_id: int,
+    project: ProjectUpdate,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Update a project; send If-Match with the ETag you read to avoid overwriting newer edits"""
     db_project = db.query(Project).filter(Project.id == project_id).first()
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
+    require_match(request, _project_etag(db_project))
     
     update_data = project.dict(exclude_unset=True)
+    if "context" in update_data and update_data["context"] != db_project.context:
+        # Rebuilt from the new context by the next generation
+        db_project.context_digest = None
     for field, value in update_data.items():
         setattr(db_project, field, value)
     
     db.commit()
     db.refresh(db_project)
+    response.headers["ETag"] = _project_etag(db_project)
     return db_project
 
 @router.delete("/{project_id}")
@@ -67,51 +137,228 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
 @router.post("/{project_id}/generate-epics", response_model=List[EpicResponse])
 async def generate_epics(
     project_id: int, 
-    db: Session = Depends(get_db)
+    use_cache: bool = True,
+    background: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    project = db.query(Project).filter(Project.id == project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
+    if background:
+        return job_accepted(await job_queue.enqueue(db, "generate_epics", {"project_id": project_id, "use_cache": use_cache}))
+    
     try:
-        # Create the project_context dictionary that your Gemini service expects
-        project_context = {
-            'app_type': project.app_type,
-            'name': project.name,
-            'description': project.description,
-            'context': project.context
-        }
-        
-        # Call your existing generate_epics method with the correct parameter
-        epics_data = gemini_service.generate_epics(project_context)
-        
-        # Save epics to database
-        created_epics = []
-        for epic_data in epics_data:
-            epic = Epic(
-                project_id=project_id,
-                title=epic_data["title"],
-                description=epic_data["description"]
-            )
-            db.add(epic)
-            created_epics.append(epic)
-        
-        db.commit()
-        
-        # Refresh to get IDs
-        for epic in created_epics:
-            db.refresh(epic)
-        
-        return created_epics
+        return await generate_epics_for_project(db, project, use_cache=use_cache)
         
+    except GenerationError as e:
+        await db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=f"Failed to generate epics: {str(e)}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error in generate_epics: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate epics: {str(e)}")
     
 
 @router.get("/{project_id}/epics", response_model=List[EpicResponse])
-def get_project_epics(project_id: int, db: Session = Depends(get_db)):
-    """Get all epics for a project"""
-    epics = db.query(Epic).filter(Epic.project_id == project_id).all()
-    return epics
\ No newline at end of file
+def get_project_epics(
+    project_id: int,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Get a project's epics a page at a time; the next page's cursor is in X-Next-Cursor"""
+    revision = _project_revision(db, project_id)
+    if revision is not None:
+        etag = make_etag("project-epics", project_id, revision, request.url.query)
+        unchanged = not_modified(request, response, etag)
+        if unchanged:
+            return unchanged
+
+    query = db.query(Epic).filter(Epic.project_id == project_id)
+    try:
+        epics, next_cursor = paginate(query, Epic, cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_page_headers(request, response, next_cursor)
+    return epics
+
+@router.post("/{project_id}/plan")
+async def plan_whole_project(
+    project_id: int,
+    max_parallel: Optional[int] = Query(None, ge=1, le=32),
+    batch_size: int = Query(1, ge=1, le=10),
+    use_cache: bool = True,
+    background: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Generate epics and all of their user stories in one call.
+
+    Streams newline-delimited JSON progress events as each epic's stories are saved,
+    or with background=true returns a job whose progress can be polled. batch_size > 1
+    packs several epics into each story prompt.
+    """
+    project = await db.get(Project, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if background:
+        return job_accepted(await job_queue.enqueue(db, "plan_project", {
+            "project_id": project_id, "max_parallel": max_parallel, "batch_size": batch_size, "use_cache": use_cache
+        }))
+
+    async def events():
+        # The stream outlives the request-scoped session, so it uses its own
+        async with AsyncSessionLocal() as stream_db:
+            try:
+                stream_project = await stream_db.get(Project, project_id)
+                async for event in plan_project(
+                    stream_db, stream_project, max_parallel=max_parallel, use_cache=use_cache, batch_size=batch_size
+                ):
+                    yield json.dumps(event) + "\n"
+            except Exception as e:
+                await stream_db.rollback()
+                print(f"Error in plan_whole_project: {e}")
+                yield json.dumps({"event": "failed", "error": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.post("/{project_id}/generate-stories", response_model=GenerateStoriesBatchResponse)
+async def generate_project_stories(
+    project_id: int,
+    request: GenerateStoriesBatchRequest,
+    use_cache: bool = True,
+    background: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Generate user stories for several epics, packing batch_size epics into each prompt"""
+    project = await db.get(Project, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    query = select(Epic).where(Epic.project_id == project_id)
+    if request.epic_ids is not None:
+        query = query.where(Epic.id.in_(request.epic_ids))
+    epics = (await db.scalars(query.order_by(Epic.id))).all()
+    if request.epic_ids is not None and len(epics) != len(set(request.epic_ids)):
+        raise HTTPException(status_code=404, detail="Epic not found in this project")
+
+    batch_size = request.batch_size or settings.story_batch_size
+    if background:
+        return job_accepted(await job_queue.enqueue(db, "generate_stories_batch", {
+            "project_id": project_id,
+            "epic_ids": [epic.id for epic in epics],
+            "batch_size": batch_size,
+            "use_cache": use_cache
+        }))
+
+    created, failed, stats = await generate_stories_for_epics(db, project, epics, batch_size=batch_size, use_cache=use_cache)
+    return {"stories": created, "failed": failed, "stats": stats}
+
+@router.get("/{project_id}/tree", response_model=ProjectTreeResponse, response_model_exclude_unset=True)
+def get_project_tree(
+    project_id: int,
+    request: Request,
+    response: Response,
+    omit: Optional[str] = Query(None, description="Comma-separated fields to leave out, e.g. project.context,story.acceptance_criteria"),
+    include_history: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Get a project with its epics and their current stories.
+
+    Epics and stories are loaded with selectinload, so the request costs four
+    queries however large the project is: the revision lookup, the project, its
+    epics and their stories (benchmarks/check_tree_queries.py checks this). The
+    ETag follows the project's change counter, so a client polling an unchanged
+    tree gets a 304 after one query.
+    """
+    revision = _project_revision(db, project_id)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    unchanged = not_modified(request, response, make_etag("project-tree", project_id, revision, request.url.query))
+    if unchanged:
+        return unchanged
+
+    omitted = {field.strip() for field in omit.split(",") if field.strip()} if omit else set()
+    unknown = omitted - TREE_TRIMMABLE_FIELDS.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot omit: {', '.join(sorted(unknown))}")
+
+    deferred = [TREE_TRIMMABLE_FIELDS[field] for field in omitted]
+    epic_loader = selectinload(Project.epics)
+    story_loader = epic_loader.selectinload(Epic.user_stories)
+    options = [
+        *(defer(column) for column in deferred if column.class_ is Project),
+        epic_loader.options(*(defer(column) for column in deferred if column.class_ is Epic)),
+        story_loader.options(*(defer(column) for column in deferred if column.class_ is UserStory)),
+    ]
+    if not include_history:
+        options.append(with_loader_criteria(UserStory, is_latest_version()))
+
+    project = db.query(Project).options(*options).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    def node(obj, kind: str) -> Dict:
+        # Only touch loaded columns; reading a deferred one would issue a query
+        return {
+            field: getattr(obj, field)
+            for field in TREE_FIELDS[kind]
+            if f"{kind}.{field}" not in omitted
+        }
+
+    tree = node(project, "project")
+    tree["epics"] = [
+        dict(
+            node(epic, "epic"),
+            user_stories=[node(story, "story") for story in sorted(epic.user_stories, key=lambda story: story.id)]
+        )
+        for epic in sorted(project.epics, key=lambda epic: epic.id)
+    ]
+    return ProjectTreeResponse.model_validate(tree)
+
+@router.get("/{project_id}/duplicates", response_model=DuplicatesResponse)
+def get_project_duplicates(
+    project_id: int,
+    threshold: Optional[float] = Query(None, gt=0, le=1),
+    db: Session = Depends(get_db)
+):
+    """Group the project's current stories into clusters of near-duplicates.
+
+    Uses MinHash signatures banded for locality-sensitive hashing, so only stories
+    that collide in a band are compared.
+    """
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    threshold = threshold or settings.dedup_similarity_threshold
+    groups = find_duplicate_groups(db, project_id, threshold)
+    db.commit()  # Keep any signatures computed for older stories
+    return {"project_id": project_id, "threshold": threshold, "groups": groups}
+
+@router.get("/{project_id}/export")
+def export_project_file(
+    project_id: int,
+    format: str = Query("csv", pattern="^(" + "|".join(EXPORT_FORMATS) + ")$"),
+    include_history: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Download the project's epics and stories as CSV, JSONL or a Jira / Azure DevOps import file.
+
+    Rows are streamed from a server-side cursor as they are read, so large projects
+    start downloading at once and never sit in memory whole. parent_story_id and
+    root_story_id are only filled in with include_history, when the versions they
+    point at are part of the file.
+    """
+    if not db.query(Project.id).filter(Project.id == project_id).first():
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        export_project(project_id, format, include_history),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="project-{project_id}.{extension}"'}
+    )
@@ -0,0 +1,35 @@
+# app/api/search.py
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.schemas.project import SearchResponse
+from app.services.search import SEARCH_KINDS, SearchUnavailable, search
+from app.api.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+@router.get("", response_model=SearchResponse)
+def search_all(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, description="Comma-separated subset of project,epic,story"),
+    project_id: Optional[int] = None,
+    latest_only: bool = True,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Ranked full-text search over projects, epics and stories, with highlighted matches"""
+    kinds = [k.strip() for k in kind.split(",") if k.strip()] if kind else list(SEARCH_KINDS)
+    unknown = set(kinds) - set(SEARCH_KINDS)
+    if unknown or not kinds:
+        raise HTTPException(status_code=400, detail=f"kind must be a subset of {', '.join(SEARCH_KINDS)}")
+
+    try:
+        rows = search(db, q, kinds, project_id=project_id, latest_only=latest_only, limit=limit + 1, offset=offset)
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    hits = [dict(row, id=row["entity_id"]) for row in rows[:limit]]
+    return {"query": q, "hits": hits, "next_offset": offset + limit if len(rows) > limit else None}
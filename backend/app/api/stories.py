@@ -1,31 +1,51 @@
 # app/api/stories.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, get_async_db
 from app.models.user_story import UserStory
 from app.models.epic import Epic
-from app.schemas.project import UserStoryCreate, UserStoryResponse
-from app.services.gemini import gemini_service
+from app.schemas.project import RefineStoriesBatchRequest, RefineStoriesBatchResponse, UserStoryCreate, UserStoryResponse
+from app.services.generation import refine_stories, refine_story
+from app.services.gemini import GenerationError
+from app.services.jobs import job_queue
+from app.api.jobs import job_accepted
+from app.api.conditional import make_etag, not_modified, require_match
+from app.models.project import Project
+from app.api.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+
+def story_etag(story: UserStory) -> str:
+    """Validator for a story, shared by every route that reads or edits one"""
+    return make_etag("story", story.id, story.version, story.updated_at.isoformat())
 
 @router.get("/{story_id}", response_model=UserStoryResponse)
-def get_user_story(story_id: int, db: Session = Depends(get_db)):
+def get_user_story(story_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific user story"""
     story = db.query(UserStory).filter(UserStory.id == story_id).first()
     if not story:
         raise HTTPException(status_code=404, detail="User story not found")
-    return story
+    return not_modified(request, response, story_etag(story), story.updated_at) or story
 
 @router.put("/{story_id}", response_model=UserStoryResponse)
-def update_user_story(story_id: int, story_update: UserStoryCreate, db: Session = Depends(get_db)):
-    """Update a user story"""
+def update_user_story(
+    story_id: int,
+    story_update: UserStoryCreate,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Update a user story; send If-Match with the ETag you read to avoid overwriting newer edits"""
     story = db.query(UserStory).filter(UserStory.id == story_id).first()
     
     if not story:
         raise HTTPException(status_code=404, detail="User story not found")
+    require_match(request, story_etag(story))
     
     # Update fields
     story.title = story_update.title
@@ -36,6 +56,7 @@ def update_user_story(story_id: int, story_update: UserStoryCreate, db: Session
     
     db.commit()
     db.refresh(story)
+    response.headers["ETag"] = story_etag(story)
     
     return story
 
@@ -53,65 +74,78 @@ def delete_user_story(story_id: int, db: Session = Depends(get_db)):
     return {"message": "User story deleted successfully"}
 
 @router.post("/{story_id}/refine", response_model=UserStoryResponse)
-async def refine_user_story(story_id: int, feedback: str, db: Session = Depends(get_db)):
+async def refine_user_story(story_id: int, feedback: str, use_cache: bool = True, background: bool = False, db: AsyncSession = Depends(get_async_db)):
     """Refine a user story based on feedback (creates a new version)"""
-    original_story = db.query(UserStory).filter(UserStory.id == story_id).first()
+    original_story = await db.get(UserStory, story_id)
     
     if not original_story:
         raise HTTPException(status_code=404, detail="User story not found")
     
+    if background:
+        return job_accepted(await job_queue.enqueue(db, "refine_story", {
+            "story_id": story_id, "feedback": feedback, "use_cache": use_cache
+        }))
+    
     try:
-        # Get epic context for better refinement
-        epic = db.query(Epic).filter(Epic.id == original_story.epic_id).first()
-        project = epic.project
-        
-        # Use Gemini to refine the story
-        refined_data = await gemini_service.refine_user_story(
-            original_story=original_story.user_story,
-            acceptance_criteria=original_story.acceptance_criteria,
-            feedback=feedback,
-            epic_context=f"{epic.title}: {epic.description}",
-            project_context=f"{project.name}: {project.description}"
-        )
-        
-        # Create new version of the story
-        new_version = original_story.version + 1
-        refined_story = UserStory(
-            epic_id=original_story.epic_id,
-            title=refined_data["title"],
-            user_story=refined_data["user_story"],
-            acceptance_criteria=refined_data["acceptance_criteria"],
-            priority=refined_data.get("priority", original_story.priority),
-            story_points=refined_data.get("story_points", original_story.story_points),
-            version=new_version,
-            parent_story_id=story_id
-        )
-        
-        db.add(refined_story)
-        db.commit()
-        db.refresh(refined_story)
-        
-        return refined_story
+        return await refine_story(db, original_story, feedback, use_cache=use_cache)
         
+    except GenerationError as e:
+        await db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=f"Failed to refine story: {str(e)}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to refine story: {str(e)}")
 
+@router.post("/refine", response_model=RefineStoriesBatchResponse)
+async def refine_user_stories(
+    request: RefineStoriesBatchRequest,
+    use_cache: bool = True,
+    background: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Refine several user stories with the same feedback, packing batch_size stories into each prompt"""
+    story_ids = list(dict.fromkeys(request.story_ids))
+    stories = (await db.scalars(select(UserStory).where(UserStory.id.in_(story_ids)))).all()
+    if len(stories) != len(story_ids):
+        missing = sorted(set(story_ids) - {story.id for story in stories})
+        raise HTTPException(status_code=404, detail=f"User stories not found: {missing}")
+    stories = sorted(stories, key=lambda story: story_ids.index(story.id))
+
+    batch_size = request.batch_size or settings.refine_batch_size
+    if background:
+        return job_accepted(await job_queue.enqueue(db, "refine_stories_batch", {
+            "story_ids": story_ids,
+            "feedback": request.feedback,
+            "batch_size": batch_size,
+            "use_cache": use_cache
+        }))
+
+    try:
+        created, failed, stats = await refine_stories(db, stories, request.feedback, batch_size=batch_size, use_cache=use_cache)
+    except Exception as e:
+        # Model failures are reported per story; this is the single insert of the new versions
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to save refined stories: {str(e)}")
+    return {"stories": created, "failed": failed, "stats": stats}
+
 @router.get("/{story_id}/versions", response_model=List[UserStoryResponse])
-def get_story_versions(story_id: int, db: Session = Depends(get_db)):
+def get_story_versions(story_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get all versions of a user story"""
-    # Find the root story (version 1 with no parent)
-    root_story = db.query(UserStory).filter(UserStory.id == story_id).first()
-    if not root_story:
+    story = db.query(UserStory).filter(UserStory.id == story_id).first()
+    if not story:
         raise HTTPException(status_code=404, detail="User story not found")
     
-    # If this story has a parent, find the root
-    while root_story.parent_story_id:
-        root_story = db.query(UserStory).filter(UserStory.id == root_story.parent_story_id).first()
+    revision = db.query(Project.revision).join(Epic, Epic.project_id == Project.id).filter(
+        Epic.id == story.epic_id
+    ).scalar()
+    unchanged = not_modified(request, response, make_etag("story-versions", story.lineage_id, revision))
+    if unchanged:
+        return unchanged
     
-    # Get all versions starting from root
+    # Every version points at its root, so one indexed query returns the whole lineage
+    root_id = story.lineage_id
     versions = db.query(UserStory).filter(
-        (UserStory.id == root_story.id) | (UserStory.parent_story_id == root_story.id)
-    ).order_by(UserStory.version).all()
+        or_(UserStory.id == root_id, UserStory.root_story_id == root_id)
+    ).order_by(UserStory.version, UserStory.id).all()
     
     return versions
\ No newline at end of file
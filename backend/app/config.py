@@ -3,12 +3,68 @@ from typing import Optional
 
 class Settings(BaseSettings):
     # API Configuration
-    gemini_api_key: str
+    gemini_api_key: Optional[str] = None  # Only checked when the first model call builds the client
     gemini_model: str = "gemini-1.5-flash"
+    gemini_max_concurrency: int = 8  # Parallel in-flight model calls per worker
+    gemini_min_concurrency: int = 1  # Floor for the adaptive limit when throttled
+    gemini_requests_per_minute: int = 60  # Token bucket refill rate, set to the project quota
+    gemini_burst: int = 10  # Token bucket capacity
+    gemini_max_retries: int = 5
+    gemini_backoff_base_seconds: float = 1.0
+    gemini_backoff_max_seconds: float = 30.0
+    gemini_backend: str = "gemini"  # "fake" answers offline from FakeGenerativeModel, for load tests
+    gemini_warmup: bool = False  # Build the client and make one test call at startup, in the background
+    plan_max_parallel: int = 4  # Concurrent per-epic story generations in /plan
+    story_batch_size: int = 4  # Epics packed into one prompt by batched story generation
+    refine_batch_size: int = 5  # Stories packed into one prompt by bulk refinement
+    context_digest_max_tokens: int = 300  # Budget for the project context digest embedded in prompts
+
+    # Fake model backend (gemini_backend = "fake")
+    fake_gemini_latency_ms: float = 800  # Mean simulated round trip
+    fake_gemini_latency_jitter_ms: float = 400  # Standard deviation, or half-width for "uniform"
+    fake_gemini_latency_distribution: str = "lognormal"  # fixed, uniform or lognormal
+    fake_gemini_malformed_rate: float = 0.0  # Share of responses cut off mid-JSON
+    fake_gemini_throttle_rate: float = 0.0  # Share of calls failing with a 429
+    fake_gemini_seed: Optional[int] = None
+
+    # Background jobs
+    job_workers: int = 4
+    job_max_attempts: int = 3  # Jobs interrupted more often than this are failed on recovery
+    job_lease_seconds: int = 60  # A running job whose worker stops renewing its lease this long is recovered
+
+    # LLM response cache
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "./llm_cache.db"
+    llm_cache_ttl_seconds: int = 7 * 24 * 3600
+    llm_cache_max_memory_entries: int = 512
+    llm_cache_max_rows: int = 10000
     
+    # Near-duplicate story detection
+    dedup_enabled: bool = True  # Flag duplicates as generated stories are saved
+    dedup_similarity_threshold: float = 0.8  # Estimated Jaccard similarity of word bigrams
+
     # Database
     database_url: str = "sqlite:///./user_stories.db"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: int = 30
+    db_pool_recycle_seconds: int = 1800  # Reconnect before servers or proxies drop idle connections
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 30000  # Postgres only; 0 disables
+
+    # SQLite connection pragmas, applied to every new connection
+    sqlite_journal_mode: str = "WAL"  # Readers no longer block the writer
+    sqlite_synchronous: str = "NORMAL"  # Safe with WAL; fsyncs at checkpoints instead of every commit
+    sqlite_busy_timeout_ms: int = 5000  # Wait for a write lock instead of failing with "database is locked"
+    sqlite_cache_size_kib: int = 65536
+    sqlite_mmap_size_bytes: int = 268435456
     
+    # Request profiling (opt-in): Server-Timing spans, and sampled stacks of slow requests
+    profiling_enabled: bool = False
+    profiling_slow_request_ms: int = 0  # Dump a sampling profile above this duration; 0 disables
+    profiling_sample_interval_ms: int = 5
+    profiling_dump_dir: str = "./profiles"
+
     # App Configuration
     app_name: str = "User Story Generator"
     debug: bool = True
@@ -1,19 +1,114 @@
-from sqlalchemy import create_engine
+from typing import Dict
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.services.metrics import instrument_engine
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+# Async driver for each sync database URL scheme
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_database_url(url: str) -> str:
+    """The same database as url, addressed through its asyncio driver"""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(
+        hide_password=False
+    )
+
+def _is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+def engine_options(url: str, is_async: bool = False) -> Dict:
+    """create_engine keyword arguments for url from the database settings"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options: Dict = {"pool_pre_ping": settings.db_pool_pre_ping}
+
+    if backend == "sqlite":
+        if not is_async:
+            options["connect_args"] = {"check_same_thread": False}
+        if not _is_sqlite_file(url):
+            # In-memory databases live in a single connection; keep SQLAlchemy's pool for them
+            return options
+        if is_async:
+            # aiosqlite defaults to NullPool, opening a connection and thread per session
+            options["poolclass"] = AsyncAdaptedQueuePool
+    elif backend == "postgresql" and settings.db_statement_timeout_ms:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+
+    options.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds
+    )
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size = -{int(settings.sqlite_cache_size_kib)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size_bytes)}")
+    finally:
+        cursor.close()
+
+def _tune(engine: Engine) -> Engine:
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    instrument_engine(engine)
+    return engine
+
+# Sync engine for scripts, migrations and the threadpool (def) routes
+engine = _tune(create_engine(settings.database_url, **engine_options(settings.database_url)))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine for the async def routes and background jobs, so database I/O
+# never blocks the event loop that is also driving model calls
+async_engine = create_async_engine(
+    async_database_url(settings.database_url),
+    **engine_options(settings.database_url, is_async=True)
+)
+_tune(async_engine.sync_engine)
+
+# Objects are read after commit when responses are serialised, where an
+# expired attribute could not be lazily reloaded
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+def database_report(bind: Engine) -> Dict:
+    """Effective pool and per-connection settings, as the database reports them"""
+    report = {"backend": bind.dialect.name, "pool": type(bind.pool).__name__}
+    if hasattr(bind.pool, "size"):
+        report["pool_size"] = bind.pool.size()
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size"):
+                report[pragma] = conn.execute(text(f"PRAGMA {pragma}")).scalar()
+        elif bind.dialect.name == "postgresql":
+            report["statement_timeout"] = conn.execute(text("SHOW statement_timeout")).scalar()
+    return report
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
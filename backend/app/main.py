@@ -1,18 +1,39 @@
 # app/main.py
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from app.database import engine, database_report
+from app.migrations import init_schema
 from app.config import settings
-from app.api import projects, epics, stories
+from app.api import projects, epics, stories, jobs, search, imports, metrics
+from app.api.metrics import MetricsMiddleware
+from app.api.profiling import ProfiledRoute, enable_profiling
 from app.services.gemini import gemini_service
+from app.services.cache import response_cache
+from app.services.jobs import job_queue
+from app.services.scheduler import model_scheduler
+from app.services.singleflight import generation_flight
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema setup waits for startup and the model client for its first use, so importing the app stays cheap
+    init_schema(engine)
+    print("Database settings: " + ", ".join(f"{key}={value}" for key, value in database_report(engine).items()))
+    await job_queue.start()
+    warm_up = asyncio.create_task(gemini_service.warm_up()) if settings.gemini_warmup else None
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    await job_queue.stop()
 
 app = FastAPI(
     title=settings.app_name,
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
+# Routes declared on the app below report the serialization span too
+app.router.route_class = ProfiledRoute
 
 # Configure CORS
 app.add_middleware(
@@ -23,23 +44,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in per-request span timings, returned in a Server-Timing header
+if settings.profiling_enabled:
+    enable_profiling(app)
+
+# Added last, so it is outermost: request timings include CORS handling and profiling
+app.add_middleware(MetricsMiddleware)
+
 # Test endpoint
 @app.get("/")
 def read_root():
     return {"message": "User Story Generator API", "status": "running"}
 
 @app.get("/api/test-gemini")
-def test_gemini():
+async def test_gemini():
     """Test if Gemini API is properly configured"""
-    if gemini_service.test_connection():
+    if await gemini_service.test_connection():
         return {"status": "success", "message": "Gemini API connected successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to connect to Gemini API")
 
+@app.get("/api/cache/stats")
+def cache_stats():
+    """LLM response cache hit/miss counters"""
+    return response_cache.stats()
+
+@app.delete("/api/cache")
+def clear_cache():
+    """Drop all cached LLM responses"""
+    response_cache.clear()
+    return {"message": "Cache cleared"}
+
+@app.get("/api/llm/stats")
+def llm_stats():
+    """Model call scheduler queue depth, concurrency and retry counters"""
+    return {
+        "scheduler": model_scheduler.stats(),
+        "coalescing": generation_flight.stats()
+    }
+
 # Include routers
 app.include_router(projects.router, prefix="/api/projects", tags=["projects"])
 app.include_router(epics.router, prefix="/api/epics", tags=["epics"])
 app.include_router(stories.router, prefix="/api/stories", tags=["stories"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
+app.include_router(imports.router, prefix="/api/import", tags=["import"])
+app.include_router(metrics.router, tags=["metrics"])
 
 if __name__ == "__main__":
     import uvicorn
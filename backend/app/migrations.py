@@ -0,0 +1,78 @@
+# app/migrations.py
+from sqlalchemy import exists, inspect, select, text
+from sqlalchemy.engine import Engine
+
+from app.database import Base
+from app.models import Project, Epic, StoryBand, UserStory
+from app.services import dedup
+from app.services.search import install_search_index
+
+
+def _add_column(engine: Engine, table: str, column: str, ddl: str) -> bool:
+    """Add a column if the table predates it; returns True when it was added"""
+    columns = {col["name"] for col in inspect(engine).get_columns(table)}
+    if column in columns:
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def _backfill_root_story_ids(engine: Engine):
+    # Walk every refine chain from its root once instead of one query per hop
+    with engine.begin() as conn:
+        conn.execute(text("""
+            WITH RECURSIVE lineage(id, root_id) AS (
+                SELECT id, id FROM user_stories WHERE parent_story_id IS NULL
+                UNION ALL
+                SELECT s.id, l.root_id FROM user_stories s JOIN lineage l ON s.parent_story_id = l.id
+            )
+            UPDATE user_stories
+            SET root_story_id = (SELECT root_id FROM lineage WHERE lineage.id = user_stories.id)
+            WHERE parent_story_id IS NOT NULL AND root_story_id IS NULL
+        """))
+
+
+def _backfill_story_bands(engine: Engine):
+    # Index the signatures stored before the band table existed, a page at a time
+    with engine.begin() as conn:
+        if conn.scalar(select(exists().select_from(StoryBand.__table__))):
+            return
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                select(UserStory.id, Epic.project_id, UserStory.minhash)
+                .join(Epic, Epic.id == UserStory.epic_id)
+                .where(UserStory.id > last_id, UserStory.minhash.is_not(None))
+                .order_by(UserStory.id)
+                .limit(dedup.BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            dedup.index_signatures(conn, [tuple(row) for row in rows], replace=False)
+            last_id = rows[-1].id
+
+
+def run_migrations(engine: Engine):
+    """Apply additive schema changes that create_all cannot make to existing tables"""
+    if _add_column(engine, "user_stories", "root_story_id", "INTEGER REFERENCES user_stories(id)"):
+        _backfill_root_story_ids(engine)
+    _add_column(engine, "projects", "revision", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(engine, "user_stories", "minhash", "BLOB")
+    _add_column(engine, "user_stories", "duplicate_of_id", "INTEGER REFERENCES user_stories(id)")
+    _add_column(engine, "projects", "context_digest", "TEXT")
+    _add_column(engine, "jobs", "worker_id", "VARCHAR(100)")
+    _add_column(engine, "jobs", "lease_expires_at", "DATETIME")
+
+    for model in (Project, Epic, UserStory):
+        for index in model.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    install_search_index(engine)
+    _backfill_story_bands(engine)
+
+
+def init_schema(engine: Engine):
+    """Create missing tables, then apply run_migrations; safe to run on every start"""
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
@@ -2,5 +2,8 @@
 from app.models.project import Project
 from app.models.epic import Epic
 from app.models.user_story import UserStory
+from app.models.job import Job
+from app.models.story_band import StoryBand
+from app.models import revisions  # registers the project revision flush hooks
 
-__all__ = ["Project", "Epic", "UserStory"]
\ No newline at end of file
+__all__ = ["Project", "Epic", "UserStory", "Job", "StoryBand"]
\ No newline at end of file
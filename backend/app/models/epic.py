@@ -1,11 +1,14 @@
 # app/models/epic.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
 class Epic(Base):
     __tablename__ = "epics"
+    __table_args__ = (
+        Index("ix_epics_project_created_id", "project_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"))
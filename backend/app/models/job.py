@@ -0,0 +1,24 @@
+# app/models/job.py
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from datetime import datetime
+from app.database import Base
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # generate_epics, generate_stories, refine_story, plan_project
+    status = Column(String(20), default="pending", index=True)  # pending, running, succeeded, failed
+    params = Column(JSON)  # Handler arguments, e.g. {"epic_id": 3}
+    progress = Column(JSON)  # Optional handler-reported progress
+    result = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Lease of the worker running the job, renewed while it runs
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
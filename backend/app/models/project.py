@@ -1,19 +1,26 @@
 # app/models/project.py
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # Keyset pagination seeks on (created_at, id), optionally within an app_type
+        Index("ix_projects_created_id", "created_at", "id"),
+        Index("ix_projects_app_type_created_id", "app_type", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), nullable=False)
     description = Column(Text)
     app_type = Column(String(100))  # e.g., "geospatial", "finance", "ecommerce"
     context = Column(Text)  # Detailed context about the project
+    context_digest = Column(Text, nullable=True)  # Token-budgeted digest of context used in prompts; NULL until first needed
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    revision = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped on any change to the project, its epics or stories
     
     # Relationships
     epics = relationship("Epic", back_populates="project", cascade="all, delete-orphan")
\ No newline at end of file
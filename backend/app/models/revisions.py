@@ -0,0 +1,52 @@
+# app/models/revisions.py
+from typing import Iterable
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from app.models.project import Project
+from app.models.epic import Epic
+from app.models.user_story import UserStory
+
+
+def bump_project_revisions(db: Session, project_ids: Iterable[int] = (), epic_ids: Iterable[int] = ()):
+    """Advance the change counter of the projects owning these projects or epics"""
+    project_ids = {pid for pid in project_ids if pid is not None}
+    epic_ids = {eid for eid in epic_ids if eid is not None}
+    if epic_ids:
+        project_ids |= set(db.scalars(select(Epic.project_id).where(Epic.id.in_(epic_ids))))
+    if not project_ids:
+        return
+    db.execute(
+        # Keep updated_at, which describes the project row itself, out of the column's onupdate
+        update(Project).where(Project.id.in_(project_ids)).values(
+            revision=Project.revision + 1, updated_at=Project.updated_at
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    db.info.setdefault("bumped_project_ids", set()).update(project_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session: Session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    project_ids, epic_ids = set(), set()
+    changed = list(session.new) + list(session.deleted)
+    changed += [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    for obj in changed:
+        if isinstance(obj, Project) and obj not in session.deleted:
+            project_ids.add(obj.id)
+        elif isinstance(obj, Epic):
+            project_ids.add(obj.project_id)
+        elif isinstance(obj, UserStory):
+            epic_ids.add(obj.epic_id)
+    bump_project_revisions(session, project_ids, epic_ids)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_bumped_revisions(session: Session, flush_context):
+    # The counter was changed behind the ORM's back; reload it on next access
+    for project_id in session.info.pop("bumped_project_ids", ()):
+        project = session.identity_map.get((Project, (project_id,), None))
+        if project is not None:
+            session.expire(project, ["revision"])
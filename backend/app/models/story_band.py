@@ -0,0 +1,30 @@
+# app/models/story_band.py
+from sqlalchemy import BigInteger, Column, Index, Integer, delete, event
+
+from app.database import Base
+from app.models.user_story import UserStory
+
+
+class StoryBand(Base):
+    """LSH bucket of a story's MinHash signature in one band.
+
+    Stories sharing a (band, key) bucket are duplicate candidates, so a new story
+    is compared against its bucket mates instead of the whole project.
+    """
+    __tablename__ = "story_lsh_bands"
+    __table_args__ = (
+        # Bucket lookups filter on key alone: it is a 64-bit hash, so the band is checked afterwards
+        Index("ix_story_lsh_bands_project_key", "project_id", "key"),
+        # Rows are only ever found by key or story id, so the rowid b-tree is dead weight
+        {"sqlite_with_rowid": False},
+    )
+
+    story_id = Column(Integer, primary_key=True)
+    band = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    key = Column(BigInteger, nullable=False)
+
+
+@event.listens_for(UserStory, "after_delete")
+def _drop_story_bands(mapper, connection, story):
+    connection.execute(delete(StoryBand.__table__).where(StoryBand.story_id == story.id))
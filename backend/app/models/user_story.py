@@ -1,11 +1,20 @@
 # app/models/user_story.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON, LargeBinary, event, exists, func, inspect, or_, text
+from sqlalchemy.orm import relationship, aliased, deferred
 from datetime import datetime
 from app.database import Base
 
 class UserStory(Base):
     __tablename__ = "user_stories"
+    __table_args__ = (
+        # Keyset pagination of an epic's stories, unfiltered or by priority or version
+        Index("ix_user_stories_epic_created_id", "epic_id", "created_at", "id"),
+        Index("ix_user_stories_epic_priority_created_id", "epic_id", "priority", "created_at", "id"),
+        Index("ix_user_stories_epic_version_created_id", "epic_id", "version", "created_at", "id"),
+        # Stories whose signature duplicate detection still has to compute
+        Index("ix_user_stories_unhashed", "epic_id", sqlite_where=text("minhash IS NULL"),
+              postgresql_where=text("minhash IS NULL")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     epic_id = Column(Integer, ForeignKey("epics.id"))
@@ -20,7 +29,35 @@ class UserStory(Base):
     # For versioning
     version = Column(Integer, default=1)
     parent_story_id = Column(Integer, ForeignKey("user_stories.id"), nullable=True)
+    root_story_id = Column(Integer, ForeignKey("user_stories.id"), nullable=True, index=True)  # NULL on the root itself
+
+    # Near-duplicate detection
+    minhash = deferred(Column(LargeBinary, nullable=True))  # MinHash signature of the story text
+    duplicate_of_id = Column(Integer, ForeignKey("user_stories.id"), nullable=True, index=True)
     
     # Relationships
     epic = relationship("Epic", back_populates="user_stories")
-    parent_story = relationship("UserStory", remote_side=[id])
\ No newline at end of file
+    parent_story = relationship("UserStory", remote_side=[id], foreign_keys=[parent_story_id])
+
+    @property
+    def lineage_id(self) -> int:
+        """Id of the version-1 story this story descends from"""
+        return self.root_story_id or self.id
+
+
+@event.listens_for(UserStory, "before_update")
+def _clear_stale_minhash(mapper, connection, story):
+    # The signature describes the old text; duplicate detection recomputes it
+    state = inspect(story)
+    if any(state.attrs[name].history.has_changes() for name in ("title", "user_story", "acceptance_criteria")):
+        story.minhash = None
+
+
+def is_latest_version():
+    """SQL condition: no later version exists in this story's lineage"""
+    newer = aliased(UserStory)
+    lineage = func.coalesce(UserStory.root_story_id, UserStory.id)
+    return ~exists().where(
+        or_(newer.id == lineage, newer.root_story_id == lineage),
+        newer.version > UserStory.version
+    )
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 # Project Schemas
@@ -58,12 +58,47 @@ class UserStoryResponse(UserStoryBase):
     epic_id: int
     version: int
     parent_story_id: Optional[int] = None
+    root_story_id: Optional[int] = None
+    duplicate_of_id: Optional[int] = None  # Set when saved as a near-duplicate of an older story
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+# Project tree schemas (large text fields are optional so they can be trimmed)
+class UserStoryTreeNode(BaseModel):
+    id: int
+    title: str
+    user_story: Optional[str] = None
+    acceptance_criteria: Optional[List[str]] = None
+    priority: Optional[str] = None
+    story_points: Optional[int] = None
+    version: int
+    parent_story_id: Optional[int] = None
+    root_story_id: Optional[int] = None
+    duplicate_of_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+class EpicTreeNode(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    user_stories: List[UserStoryTreeNode] = []
+
+class ProjectTreeResponse(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    app_type: Optional[str] = None
+    context: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    epics: List[EpicTreeNode] = []
+
 # Request schemas for operations
 class GenerateEpicsRequest(BaseModel):
     """Request body for generating epics (optional, can be empty)"""
@@ -71,4 +106,90 @@ class GenerateEpicsRequest(BaseModel):
 
 class RefineStoryRequest(BaseModel):
     """Request body for refining a user story"""
-    feedback: str
\ No newline at end of file
+    feedback: str
+
+class GenerateStoriesBatchRequest(BaseModel):
+    """Request body for generating stories for several epics with batched prompts"""
+    epic_ids: Optional[List[int]] = None  # Defaults to every epic in the project
+    batch_size: Optional[int] = Field(None, ge=1, le=10)
+
+class GenerateStoriesBatchResponse(BaseModel):
+    stories: Dict[int, List[UserStoryResponse]]
+    failed: Dict[int, str]
+    stats: Dict[str, int]
+
+class RefineStoriesBatchRequest(BaseModel):
+    """Request body for refining several user stories with the same feedback"""
+    story_ids: List[int] = Field(..., min_length=1, max_length=200)
+    feedback: str
+    batch_size: Optional[int] = Field(None, ge=1, le=10)
+
+class RefineStoriesBatchResponse(BaseModel):
+    stories: Dict[int, UserStoryResponse]  # New version, by the id of the story it refines
+    failed: Dict[int, str]
+    stats: Dict[str, int]
+
+# Job Schemas
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    params: Optional[Dict[str, Any]] = None
+    progress: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    updated_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class JobResultResponse(JobResponse):
+    result: Optional[Any] = None
+
+# Search Schemas
+class SearchHit(BaseModel):
+    kind: str  # project, epic or story
+    id: int
+    project_id: Optional[int] = None
+    epic_id: Optional[int] = None
+    title: str  # With matches wrapped in <mark>
+    snippet: str
+    score: float  # Higher is more relevant
+
+class SearchResponse(BaseModel):
+    query: str
+    hits: List[SearchHit]
+    next_offset: Optional[int] = None
+
+# Duplicate detection Schemas
+class DuplicateMember(BaseModel):
+    id: int
+    similarity: float  # Estimated Jaccard similarity to the canonical story
+
+class DuplicateGroup(BaseModel):
+    canonical_id: int  # Oldest story in the group
+    stories: List[DuplicateMember]
+
+class DuplicatesResponse(BaseModel):
+    project_id: int
+    threshold: float
+    groups: List[DuplicateGroup]
+
+# Import Schemas
+class ImportRowError(BaseModel):
+    line: int  # Line of the record in the uploaded file
+    error: str
+
+class ImportCounts(BaseModel):
+    projects: int
+    epics: int
+    stories: int
+
+class ImportResponse(BaseModel):
+    created: ImportCounts
+    project_ids: List[int]  # Projects created from project records
+    error_count: int
+    errors: List[ImportRowError]  # The first errors, when there are very many
@@ -0,0 +1,200 @@
+# app/services/cache.py
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from app.config import settings
+
+
+class ResponseCache:
+    """Content-addressed prompt -> response cache: in-memory LRU over a SQLite table.
+
+    All disk work runs on one background thread, so the event loop never waits on
+    SQLite: lookups that miss memory await it, writes are queued behind it. Hits
+    only note their access time in memory; those times and the eviction of
+    expired and least recently used rows are written out at most once per
+    maintenance interval.
+    """
+
+    # Seconds between flushing access times and evicting rows
+    MAINTENANCE_INTERVAL_SECONDS = 60
+
+    def __init__(self, path: str, ttl_seconds: int, max_memory_entries: int, max_rows: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._accessed: Dict[str, float] = {}
+        self._last_maintenance = 0.0
+        self._lock = threading.Lock()
+        # One thread owns the connection, which also keeps writes in submission order.
+        # It is opened on first use, so importing the app touches no files.
+        self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache")
+        self._path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: Optional[Dict] = None) -> str:
+        """Hash the model name, rendered prompt and generation parameters"""
+        payload = json.dumps(
+            {"model": model, "prompt": prompt, "params": params or {}},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._accessed[key] = now
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        row = await asyncio.get_running_loop().run_in_executor(self._disk, self._load, key)
+        with self._lock:
+            # Expired rows are left for the next maintenance pass
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self._accessed[key] = now
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, model: str, value: str):
+        """Store a response in memory now and in the SQLite table in the background"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, expires_at)
+        self._disk.submit(self._store, key, model, value, expires_at, now)
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+            self._accessed.clear()
+        self._disk.submit(self._clear).result()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current sizes"""
+        rows = self._disk.submit(self._count).result()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "stored_entries": rows
+            }
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    # The methods below run on the disk thread only
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            conn = sqlite3.connect(self._path, check_same_thread=False)
+            # WAL with synchronous=NORMAL: a commit appends to the log instead of syncing the file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_response_cache_last_access "
+                "ON llm_response_cache (last_access)"
+            )
+            conn.commit()
+            self._db = conn
+        return self._db
+
+    def _load(self, key: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT value, expires_at FROM llm_response_cache WHERE key = ?", (key,)
+        ).fetchone()
+
+    def _store(self, key: str, model: str, value: str, expires_at: float, now: float):
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, model, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, value, expires_at, now)
+            )
+            if now - self._last_maintenance >= self.MAINTENANCE_INTERVAL_SECONDS:
+                self._last_maintenance = now
+                self._maintain(now)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            # Losing a cache write only costs a later model call
+            if self._db is not None:
+                self._db.rollback()
+            print(f"Error writing LLM cache: {e}")
+
+    def _clear(self):
+        self._conn.execute("DELETE FROM llm_response_cache")
+        self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+
+    def _maintain(self, now: float):
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+        self._conn.executemany(
+            "UPDATE llm_response_cache SET last_access = ? WHERE key = ?",
+            [(at, key) for key, at in accessed.items()]
+        )
+        # Expired rows go first, then least recently used rows beyond the size bound
+        expired = self._conn.execute(
+            "DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,)
+        ).rowcount
+        overflow = self._count() - self.max_rows
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_response_cache WHERE key IN ("
+                "SELECT key FROM llm_response_cache ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+        with self._lock:
+            self.evictions += expired + max(overflow, 0)
+
+
+# Singleton instance
+response_cache = ResponseCache(
+    path=settings.llm_cache_path,
+    ttl_seconds=settings.llm_cache_ttl_seconds,
+    max_memory_entries=settings.llm_cache_max_memory_entries,
+    max_rows=settings.llm_cache_max_rows
+)
\ No newline at end of file
@@ -0,0 +1,78 @@
+# app/services/context_digest.py
+import re
+from collections import Counter
+from typing import List, Optional, Set
+
+from app.services.gemini import gemini_service
+
+# Words too common to say what a sentence is about
+_STOPWORDS = frozenset("""
+    a about all also an and any are as at be been but by can could do does each for from had has have how if in
+    into is it its may more most must no not of on or our should so some such than that the their them then there
+    these they this those through to up us use used using was we were what when where which while who will with
+    would you your
+""".split())
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Sentences sharing more of their words than this with one already kept add little
+REDUNDANCY_THRESHOLD = 0.6
+
+
+def _sentences(text: str) -> List[str]:
+    sentences = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line:
+            sentences.extend(part for part in _SENTENCE_BREAK.split(line) if part)
+    return sentences
+
+
+def _content_words(sentence: str) -> Set[str]:
+    return {word for word in _WORD.findall(sentence.lower()) if len(word) > 2 and word not in _STOPWORDS}
+
+
+def digest_context(context: Optional[str], max_tokens: int) -> str:
+    """Extractive digest of context within max_tokens: its most central sentences, in their original order.
+
+    A sentence scores the mean number of distinct sentences sharing each of its
+    content words, so sentences about the recurring themes of the context win;
+    near repeats of a sentence already kept are skipped. Contexts within budget
+    are only whitespace-normalized.
+    """
+    sentences = _sentences(context or "")
+    text = " ".join(sentences)
+    if gemini_service.estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = max_tokens * 4  # Same four characters per token as estimate_tokens
+    # Boilerplate repeated throughout the context should not look central
+    sentences = list(dict.fromkeys(sentences))
+    words = [_content_words(sentence) for sentence in sentences]
+    frequency = Counter(word for sentence_words in words for word in sentence_words)
+
+    def score(index: int) -> float:
+        if not words[index]:
+            return 0.0
+        # Slight preference for earlier sentences, which usually introduce the project
+        return sum(frequency[word] for word in words[index]) / len(words[index]) * (1 - 0.2 * index / len(sentences))
+
+    kept: List[int] = []
+    used = 0
+    for index in sorted(range(len(sentences)), key=score, reverse=True):
+        length = len(sentences[index]) + 1
+        if used + length > max_chars or not words[index]:
+            continue
+        if any(
+            len(words[index] & words[other]) / len(words[index] | words[other]) > REDUNDANCY_THRESHOLD
+            for other in kept
+        ):
+            continue
+        kept.append(index)
+        used += length
+
+    if not kept:
+        # A single sentence longer than the whole budget
+        return text[:max_chars]
+    return " ".join(sentences[index] for index in sorted(kept))
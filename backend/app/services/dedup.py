@@ -0,0 +1,297 @@
+# app/services/dedup.py
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Epic, StoryBand, UserStory
+from app.models.user_story import is_latest_version
+
+# 128 permutations in 16 bands of 8 rows: pairs above ~0.7 Jaccard share a band
+# with high probability, pairs below ~0.5 rarely do. Changing these invalidates
+# stored signatures, which are then recomputed.
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SIGNATURE_BYTES = NUM_PERM * 4
+
+# Stories hashed per NumPy batch; bounds the (NUM_PERM x shingles) work array
+BATCH_SIZE = 1000
+
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 2 ** 63, ROWS_PER_BAND, dtype=np.uint64) | np.uint64(1)
+
+
+def story_text(title: Optional[str], user_story: Optional[str], acceptance_criteria) -> str:
+    """The text of a story that duplicate detection compares"""
+    criteria = acceptance_criteria if isinstance(acceptance_criteria, list) else []
+    return " ".join([title or "", user_story or "", *(str(item) for item in criteria)])
+
+
+def shingle_hashes(text: str) -> List[int]:
+    """32-bit hashes of the word bigrams of text (a single word hashes alone)"""
+    words = re.findall(r"\w+", text.lower())
+    grams = [" ".join(pair) for pair in zip(words, words[1:])] or words or [""]
+    return sorted({zlib.crc32(gram.encode("utf-8")) for gram in grams})
+
+
+def minhash_signatures(texts: Sequence[str]) -> np.ndarray:
+    """MinHash signatures, one uint32 row of NUM_PERM values per text"""
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for start in range(0, len(texts), BATCH_SIZE):
+        shingles = [shingle_hashes(text) for text in texts[start:start + BATCH_SIZE]]
+        offsets = np.cumsum([0] + [len(s) for s in shingles[:-1]])
+        values = np.fromiter((h for s in shingles for h in s), dtype=np.uint64)
+        # Multiply-shift hashing; uint64 arithmetic wraps, the high 32 bits are the hash
+        with np.errstate(over="ignore"):
+            permuted = (_PERM_A[:, None] * values[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+        signatures[start:start + len(shingles)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+    return signatures
+
+
+def signature_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def signature_from_bytes(data: Optional[bytes]) -> Optional[np.ndarray]:
+    if data is None or len(data) != SIGNATURE_BYTES:
+        return None
+    return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """LSH bucket of every signature in every band, as (n, BANDS) signed 64-bit keys that fit a BIGINT"""
+    bands = signatures.reshape(len(signatures), BANDS, ROWS_PER_BAND).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        return (bands * _BAND_MIX).sum(axis=2).view(np.int64)
+
+
+def candidate_pairs(signatures: np.ndarray) -> np.ndarray:
+    """Index pairs (i, j), i < j, that collide in at least one LSH band"""
+    n = len(signatures)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    keys = band_keys(signatures)
+    found = []
+    for band in range(BANDS):
+        order = np.argsort(keys[:, band], kind="stable")
+        sorted_keys = keys[order, band]
+        new_run = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        # Pair every member of a bucket with the bucket's first member; linear in
+        # bucket size, and clustering joins the rest
+        run_first = order[np.maximum.accumulate(np.where(new_run, np.arange(n), 0))]
+        members = ~new_run
+        if members.any():
+            found.append(np.stack([run_first[members], order[members]], axis=1))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(found), axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def similar_pairs(signatures: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Candidate pairs whose estimated Jaccard similarity is at least threshold"""
+    pairs = candidate_pairs(signatures)
+    if not len(pairs):
+        return pairs, np.empty(0)
+    similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+    keep = similarity >= threshold
+    return pairs[keep], similarity[keep]
+
+
+def _chunks(items: Sequence, size: int = 500) -> Iterable[Sequence]:
+    # Keeps IN lists under SQLite's bound-parameter limit
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def index_signatures(db: Session, entries: Iterable[Tuple[int, int, Optional[bytes]]], replace: bool = True):
+    """Store the band keys of (story_id, project_id, signature bytes) entries.
+
+    replace drops the stories' older keys first; stories inserted in this
+    transaction have none.
+    """
+    entries = [
+        (story_id, project_id, signature)
+        for story_id, project_id, data in entries
+        if (signature := signature_from_bytes(data)) is not None
+    ]
+    if not entries:
+        return
+    bands = StoryBand.__table__
+    if replace:
+        story_ids = [story_id for story_id, _, _ in entries]
+        for chunk in _chunks(story_ids):
+            db.execute(delete(bands).where(bands.c.story_id.in_(chunk)))
+    keys = band_keys(np.stack([signature for _, _, signature in entries])).tolist()
+    db.execute(insert(bands), [
+        {"story_id": story_id, "project_id": project_id, "band": band, "key": key}
+        for (story_id, project_id, _), story_keys in zip(entries, keys)
+        for band, key in enumerate(story_keys)
+    ])
+
+
+def _store_signatures(db: Session, project_id: int, story_ids: List[int], signatures: np.ndarray):
+    # Core UPDATE: caching a signature is not an edit, so skip the ORM hooks
+    stories = UserStory.__table__
+    data = [signature_bytes(signature) for signature in signatures]
+    db.execute(
+        update(stories).where(stories.c.id == bindparam("story_id")).values(minhash=bindparam("signature")),
+        [{"story_id": story_id, "signature": signature} for story_id, signature in zip(story_ids, data)]
+    )
+    index_signatures(db, [(story_id, project_id, signature) for story_id, signature in zip(story_ids, data)])
+
+
+def _compute_signatures(db: Session, story_ids: List[int]) -> np.ndarray:
+    texts = {
+        row.id: story_text(row.title, row.user_story, row.acceptance_criteria)
+        for chunk in _chunks(story_ids)
+        for row in db.execute(
+            select(UserStory.id, UserStory.title, UserStory.user_story, UserStory.acceptance_criteria)
+            .where(UserStory.id.in_(chunk))
+        )
+    }
+    return minhash_signatures([texts[story_id] for story_id in story_ids])
+
+
+def index_unhashed(db: Session, project_id: int):
+    """Sign and index the project's stories that have no signature yet, such as edited ones"""
+    story_ids = list(db.scalars(
+        select(UserStory.id)
+        .join(Epic, Epic.id == UserStory.epic_id)
+        .where(Epic.project_id == project_id, UserStory.minhash.is_(None))
+        .order_by(UserStory.id)
+    ))
+    if story_ids:
+        _store_signatures(db, project_id, story_ids, _compute_signatures(db, story_ids))
+
+
+def _project_signatures(db: Session, project_id: int) -> Tuple[List[int], np.ndarray]:
+    """Ids and signatures of a project's current stories, filling in any missing ones"""
+    rows = db.execute(
+        select(UserStory.id, UserStory.minhash)
+        .join(Epic, Epic.id == UserStory.epic_id)
+        .where(Epic.project_id == project_id, is_latest_version())
+        .order_by(UserStory.id)
+    ).all()
+    ids = [row.id for row in rows]
+    signatures = np.empty((len(rows), NUM_PERM), dtype=np.uint32)
+    missing = []
+    for i, row in enumerate(rows):
+        signature = signature_from_bytes(row.minhash)
+        if signature is None:
+            missing.append(i)
+        else:
+            signatures[i] = signature
+
+    if missing:
+        missing_ids = [ids[i] for i in missing]
+        computed = _compute_signatures(db, missing_ids)
+        signatures[missing] = computed
+        _store_signatures(db, project_id, missing_ids, computed)
+    return ids, signatures
+
+
+def find_duplicate_groups(db: Session, project_id: int, threshold: Optional[float] = None) -> List[Dict]:
+    """Clusters of near-duplicate current stories in a project, without pairwise comparison.
+
+    Each group lists its oldest story as canonical and every member's estimated
+    similarity to it.
+    """
+    threshold = threshold if threshold is not None else settings.dedup_similarity_threshold
+    ids, signatures = _project_signatures(db, project_id)
+    pairs, _ = similar_pairs(signatures, threshold)
+
+    parent = list(range(len(ids)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in {i for pair in pairs.tolist() for i in pair}:
+        clusters.setdefault(find(i), []).append(i)
+
+    groups = []
+    for root, members in sorted(clusters.items()):
+        members.sort()
+        similarity = (signatures[members] == signatures[root]).mean(axis=1)
+        groups.append({
+            "canonical_id": ids[root],
+            "stories": [
+                {"id": ids[i], "similarity": round(float(s), 3)}
+                for i, s in zip(members, similarity)
+            ]
+        })
+    return groups
+
+
+def _latest_signatures(db: Session, project_id: int, story_ids: Iterable[int]) -> Dict[int, np.ndarray]:
+    signatures = {}
+    for chunk in _chunks(sorted(story_ids)):
+        for row in db.execute(
+            select(UserStory.id, UserStory.minhash)
+            .join(Epic, Epic.id == UserStory.epic_id)
+            .where(UserStory.id.in_(chunk), Epic.project_id == project_id, is_latest_version())
+        ):
+            signature = signature_from_bytes(row.minhash)
+            if signature is not None:
+                signatures[row.id] = signature
+    return signatures
+
+
+def flag_duplicates(db: Session, project_id: int, stories: Iterable[UserStory], threshold: Optional[float] = None):
+    """Point each new story's duplicate_of_id at the most similar older story in the project.
+
+    Only the new stories' band keys are looked up in the band index, so the cost
+    follows the number of new stories and their bucket mates, not the project size.
+    The stories must already be indexed.
+    """
+    stories = {story.id: story for story in stories}
+    if not stories:
+        return
+    threshold = threshold if threshold is not None else settings.dedup_similarity_threshold
+    index_unhashed(db, project_id)
+    new_signatures = _latest_signatures(db, project_id, stories)
+    if not new_signatures:
+        return
+
+    new_ids = list(new_signatures)
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for story_id, story_keys in zip(new_ids, band_keys(np.stack(list(new_signatures.values()))).tolist()):
+        for band, key in enumerate(story_keys):
+            buckets.setdefault((band, key), []).append(story_id)
+
+    bands = StoryBand.__table__
+    candidates: Dict[int, set] = {}
+    for chunk in _chunks(sorted({key for _, key in buckets})):
+        for row in db.execute(
+            select(bands.c.story_id, bands.c.band, bands.c.key)
+            .where(bands.c.project_id == project_id, bands.c.key.in_(chunk))
+        ):
+            for story_id in buckets.get((row.band, row.key), ()):
+                if row.story_id < story_id:
+                    candidates.setdefault(story_id, set()).add(row.story_id)
+
+    old_signatures = _latest_signatures(db, project_id, set().union(*candidates.values()) if candidates else ())
+    for story_id, older_ids in candidates.items():
+        older_ids = sorted(older_id for older_id in older_ids if older_id in old_signatures)
+        if not older_ids:
+            continue
+        similarity = (np.stack([old_signatures[i] for i in older_ids]) == new_signatures[story_id]).mean(axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] >= threshold:
+            stories[story_id].duplicate_of_id = older_ids[best]
@@ -0,0 +1,204 @@
+# app/services/export.py
+import csv
+import io
+import json
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Project, Epic, UserStory
+from app.models.user_story import is_latest_version
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 500
+
+# Bytes buffered before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "jira": ("text/csv", "jira.csv"),
+    "azure-devops": ("text/csv", "azure-devops.csv"),
+}
+
+_EPIC_COLUMNS = [Epic.id, Epic.title, Epic.description, Epic.created_at]
+_STORY_COLUMNS = [
+    UserStory.id, UserStory.title, UserStory.user_story, UserStory.acceptance_criteria,
+    UserStory.priority, UserStory.story_points, UserStory.version, UserStory.parent_story_id,
+    UserStory.root_story_id, UserStory.duplicate_of_id, UserStory.created_at
+]
+_STORY_KEYS = [
+    "id", "title", "user_story", "acceptance_criteria", "priority", "story_points", "version",
+    "parent_story_id", "root_story_id", "duplicate_of_id", "created_at"
+]
+
+# Azure DevOps priorities are 1 (highest) to 4
+AZURE_PRIORITIES = {"high": 1, "medium": 2, "low": 3}
+
+
+def _epic_story_rows(db: Session, project_id: int, include_history: bool) -> Iterator[tuple]:
+    """(epic, story or None) pairs in epic order, streamed from a server-side cursor.
+
+    Without history the earlier versions are left out, so parent_story_id and
+    root_story_id come back as None rather than pointing at rows not exported.
+    """
+    story_join = UserStory.epic_id == Epic.id
+    if not include_history:
+        story_join = and_(story_join, is_latest_version())
+    statement = (
+        select(*_EPIC_COLUMNS, *_STORY_COLUMNS)
+        .outerjoin(UserStory, story_join)
+        .where(Epic.project_id == project_id)
+        .order_by(Epic.id, UserStory.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    epic_width = len(_EPIC_COLUMNS)
+    for row in db.execute(statement):
+        epic = dict(zip(["id", "title", "description", "created_at"], row[:epic_width]))
+        story = dict(zip(_STORY_KEYS, row[epic_width:])) if row[epic_width] is not None else None
+        if story is not None and not include_history:
+            story["parent_story_id"] = story["root_story_id"] = None
+        yield epic, story
+
+
+def _criteria_text(criteria, bullet: str = "- ") -> str:
+    return "\n".join(f"{bullet}{item}" for item in (criteria or []))
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _csv_chunks(header: List[str], rows: Iterator[List]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    # The header goes out before the first row has been fetched
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _flat_csv(db: Session, project: Dict, include_history: bool) -> Iterator[str]:
+    header = [
+        "project_id", "epic_id", "epic_title", "epic_description", "story_id", "title", "user_story",
+        "acceptance_criteria", "priority", "story_points", "version", "parent_story_id", "root_story_id",
+        "duplicate_of_id", "created_at"
+    ]
+
+    def rows():
+        for epic, story in _epic_story_rows(db, project["id"], include_history):
+            story = story or {}
+            yield [
+                project["id"], epic["id"], epic["title"], epic["description"], story.get("id"), story.get("title"),
+                story.get("user_story"), _criteria_text(story.get("acceptance_criteria"), ""), story.get("priority"),
+                story.get("story_points"), story.get("version"), story.get("parent_story_id"),
+                story.get("root_story_id"), story.get("duplicate_of_id"), _iso(story.get("created_at"))
+            ]
+
+    return _csv_chunks(header, rows())
+
+
+def _jira_csv(db: Session, project: Dict, include_history: bool) -> Iterator[str]:
+    # Issue Id / Parent Id link stories to their epic within the import file
+    header = ["Issue Id", "Parent Id", "Issue Type", "Summary", "Description", "Priority", "Story Points", "Labels"]
+    label = (project["app_type"] or "").replace(" ", "-")
+
+    def rows():
+        current_epic = None
+        for epic, story in _epic_story_rows(db, project["id"], include_history):
+            if epic["id"] != current_epic:
+                current_epic = epic["id"]
+                yield [f"E{epic['id']}", "", "Epic", epic["title"], epic["description"] or "", "", "", label]
+            if story is not None:
+                description = story["user_story"] or ""
+                if story["acceptance_criteria"]:
+                    description += "\n\nh3. Acceptance Criteria\n" + _criteria_text(story["acceptance_criteria"], "* ")
+                yield [
+                    f"S{story['id']}", f"E{epic['id']}", "Story", story["title"], description,
+                    (story["priority"] or "Medium").capitalize(), story["story_points"] or "", label
+                ]
+
+    return _csv_chunks(header, rows())
+
+
+def _azure_devops_csv(db: Session, project: Dict, include_history: bool) -> Iterator[str]:
+    # A blank ID creates new work items; Title 1 / Title 2 columns express the hierarchy
+    header = ["ID", "Work Item Type", "Title 1", "Title 2", "Description", "Acceptance Criteria", "Priority",
+              "Story Points", "Tags"]
+    tags = project["app_type"] or ""
+
+    def rows():
+        current_epic = None
+        for epic, story in _epic_story_rows(db, project["id"], include_history):
+            if epic["id"] != current_epic:
+                current_epic = epic["id"]
+                yield ["", "Epic", epic["title"], "", epic["description"] or "", "", "", "", tags]
+            if story is not None:
+                yield [
+                    "", "User Story", "", story["title"], story["user_story"] or "",
+                    _criteria_text(story["acceptance_criteria"]),
+                    AZURE_PRIORITIES.get((story["priority"] or "").lower(), 2), story["story_points"] or "", tags
+                ]
+
+    return _csv_chunks(header, rows())
+
+
+def _jsonl(db: Session, project: Dict, include_history: bool) -> Iterator[str]:
+    # One record per line; ids let an importer rebuild the hierarchy
+    yield json.dumps({"type": "project", **project}, default=_json_default) + "\n"
+    lines = []
+    current_epic = None
+    for epic, story in _epic_story_rows(db, project["id"], include_history):
+        if epic["id"] != current_epic:
+            current_epic = epic["id"]
+            lines.append(json.dumps({"type": "epic", "project_id": project["id"], **epic}, default=_json_default))
+        if story is not None:
+            lines.append(json.dumps({"type": "story", "epic_id": epic["id"], **story}, default=_json_default))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+_WRITERS: Dict[str, Callable[[Session, Dict, bool], Iterator[str]]] = {
+    "csv": _flat_csv,
+    "jsonl": _jsonl,
+    "jira": _jira_csv,
+    "azure-devops": _azure_devops_csv,
+}
+
+
+def export_project(project_id: int, export_format: str, include_history: bool = False) -> Iterator[str]:
+    """Stream a project's epics and stories in export_format, a chunk at a time.
+
+    Uses its own session because the response is iterated after the request's
+    session has closed. Memory use is bounded by the cursor batch and chunk size.
+    """
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(Project.id, Project.name, Project.description, Project.app_type, Project.context, Project.created_at)
+            .where(Project.id == project_id)
+        ).first()
+        if row is None:
+            return
+        yield from _WRITERS[export_format](db, dict(row._mapping), include_history)
+    finally:
+        db.close()
@@ -0,0 +1,144 @@
+# app/services/fake_model.py
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+class FakeGenerativeModel:
+    """Offline stand-in for genai.GenerativeModel, for load tests and local development.
+
+    Answers each of GeminiService's prompts with well-formed JSON of the right
+    shape after a simulated round trip, and can inject malformed responses and
+    429s at the configured rates. Like the real client, generate_content blocks.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 800,
+        latency_jitter_ms: float = 400,
+        distribution: str = "lognormal",
+        malformed_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        stream_chunk_chars: int = 80,
+        seed: Optional[int] = None
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency = latency_ms / 1000
+        self.jitter = latency_jitter_ms / 1000
+        self.distribution = distribution
+        self.malformed_rate = malformed_rate
+        self.throttle_rate = throttle_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()  # Random is shared by the executor threads
+        self.calls = 0
+
+    def _latency(self) -> float:
+        with self._lock:
+            if self.distribution == "fixed" or self.latency <= 0:
+                return max(0.0, self.latency)
+            if self.distribution == "uniform":
+                return max(0.0, self._random.uniform(self.latency - self.jitter, self.latency + self.jitter))
+            # Lognormal with the given mean and standard deviation: a long right tail, like real model calls
+            sigma = math.sqrt(math.log1p((self.jitter / self.latency) ** 2))
+            mu = math.log(self.latency) - sigma ** 2 / 2
+            return self._random.lognormvariate(mu, sigma)
+
+    def _happens(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self._happens(self.throttle_rate):
+            # Throttled calls come back fast, as Gemini's do
+            time.sleep(min(0.05, self.latency))
+            raise google_exceptions.ResourceExhausted("Fake model: quota exceeded")
+        text = self.respond(prompt)
+        if self._happens(self.malformed_rate):
+            # Cut the JSON off mid-way, like a response that hit its token limit
+            text = text[:max(1, len(text) // 2)]
+        usage = SimpleNamespace(prompt_token_count=max(1, len(prompt) // 4), candidates_token_count=max(1, len(text) // 4))
+        latency = self._latency()
+        if stream:
+            return self._stream(text, latency)
+        time.sleep(latency)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def _stream(self, text: str, latency: float) -> Iterator[SimpleNamespace]:
+        chunks = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)] or [""]
+        # Spread the round trip over the chunks, with the first one a little later
+        delay = latency / (len(chunks) + 1)
+        time.sleep(delay * 2)
+        for chunk in chunks:
+            yield SimpleNamespace(text=chunk)
+            time.sleep(delay)
+
+    def respond(self, prompt: str) -> str:
+        """Well-formed JSON answering prompt, shaped for whichever GeminiService prompt it is"""
+        if "Say 'API Connected'" in prompt:
+            return "API Connected"
+        if "suggest 5-8 epics" in prompt:
+            return json.dumps(self._epics(prompt))
+        if "Refine this user story" in prompt:
+            title = _field(prompt, "Current Title") or "Refined story"
+            return json.dumps({**self._story(title), "title": f"{title} (refined)"})
+        if "Create a detailed user story" in prompt:
+            story = self._story(_field(prompt, "Story Title") or "Story")
+            return json.dumps({
+                "user_story": story["user_story"], "acceptance_criteria": story["acceptance_criteria"],
+                "technical_notes": "None", "priority": story["priority"].lower(), "estimated_points": story["story_points"]
+            })
+        if "one key per story" in prompt:
+            titles = re.findall(r"^\s*\[(S\d+)\] Title: (.*)$", prompt, flags=re.MULTILINE)
+            return json.dumps({key: {**self._story(title), "title": f"{title} (refined)"} for key, title in titles})
+        if "one key per epic" in prompt:
+            keys = re.findall(r"^\s*\[(E\d+)\] (.*?):", prompt, flags=re.MULTILINE)
+            return json.dumps({key: self._stories(title) for key, title in keys})
+        return json.dumps(self._stories(_field(prompt, "Epic") or "Epic"))
+
+    def _epics(self, prompt: str) -> List[Dict]:
+        name = _field(prompt, "Project Name") or "the project"
+        areas = ["Accounts", "Onboarding", "Search", "Notifications", "Reporting", "Billing", "Administration", "Integrations"]
+        count = 5 + self.calls % 4
+        return [
+            {
+                "title": f"{area} for {name}",
+                "description": f"Everything users need around {area.lower()} in {name}.",
+                "suggested_stories": [f"{area} story {i + 1}" for i in range(3)]
+            }
+            for area in areas[:count]
+        ]
+
+    def _stories(self, epic: str) -> List[Dict]:
+        return [self._story(f"{epic}: story {i + 1}") for i in range(3 + self.calls % 3)]
+
+    def _story(self, title: str) -> Dict:
+        points = (1, 2, 3, 5, 8, 13)
+        return {
+            "title": title[:180],
+            "user_story": f"As a user, I want {title.lower()} so that I can get my work done",
+            "acceptance_criteria": [
+                f"Given I am signed in, when I open {title.lower()}, then I see it",
+                "Given invalid input, when I submit, then I see an error",
+                "Given a slow network, when I retry, then nothing is saved twice"
+            ],
+            "priority": ("High", "Medium", "Low")[self.calls % 3],
+            "story_points": points[self.calls % len(points)]
+        }
+
+
+def _field(prompt: str, label: str) -> Optional[str]:
+    match = re.search(rf"^\s*{re.escape(label)}: (.*)$", prompt, flags=re.MULTILINE)
+    return match.group(1).strip() if match else None
@@ -1,25 +1,203 @@
 # app/services/gemini.py
-import google.generativeai as genai
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Iterator, List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from app.config import settings
+from app.services.cache import response_cache
+from app.services.json_stream import JSONArrayStreamParser
+from app.services.metrics import gemini_cache_hits, gemini_call_duration, gemini_parse_failures, record_gemini_usage
+from app.services.profiling import span
+from app.services.scheduler import model_scheduler, retryable_status
+import asyncio
 import json
+import threading
+import time
+
+class GenerationError(Exception):
+    """The model could not produce a usable response"""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        # 503 when Gemini kept throttling us after every retry, 502 otherwise
+        self.status_code = status_code
+
+    @classmethod
+    def wrap(cls, operation: str, error: Exception) -> "GenerationError":
+        if isinstance(error, cls):
+            return error
+        status_code = 503 if retryable_status(error) is not None else 502
+        return cls(f"{operation} failed: {error}", status_code=status_code)
+
+def build_model():
+    """The model client for settings.gemini_backend"""
+    if settings.gemini_backend == "fake":
+        from app.services.fake_model import FakeGenerativeModel
+        return FakeGenerativeModel(
+            latency_ms=settings.fake_gemini_latency_ms,
+            latency_jitter_ms=settings.fake_gemini_latency_jitter_ms,
+            distribution=settings.fake_gemini_latency_distribution,
+            malformed_rate=settings.fake_gemini_malformed_rate,
+            throttle_rate=settings.fake_gemini_throttle_rate,
+            seed=settings.fake_gemini_seed
+        )
+    if settings.gemini_backend != "gemini":
+        raise ValueError(f"Unknown gemini_backend {settings.gemini_backend!r}; use gemini or fake")
+    if not settings.gemini_api_key:
+        raise GenerationError("GEMINI_API_KEY is not set", status_code=503)
+    # The SDK takes most of a second to import, so only processes that call the model pay for it
+    import google.generativeai as genai
+    genai.configure(api_key=settings.gemini_api_key)
+    return genai.GenerativeModel(settings.gemini_model)
 
 class GeminiService:
     def __init__(self):
-        genai.configure(api_key=settings.gemini_api_key)
-        self.model = genai.GenerativeModel(settings.gemini_model)
-    
-    def generate_epics(self, project_context: Dict) -> List[Dict]:
-        """Generate epic suggestions based on project context"""
-        prompt = f"""
-        You are an expert product owner. Based on the following project details, 
+        # Built on first use, so importing the app neither loads the SDK nor needs an API key
+        self._model = None
+        self._model_lock = threading.Lock()
+        # The SDK call is blocking, so it runs on a dedicated pool instead of the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.gemini_max_concurrency,
+            thread_name_prefix="gemini"
+        )
+
+    @property
+    def model(self):
+        """The model client, built by the first call that needs it"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = build_model()
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    async def warm_up(self):
+        """Build the model client off the event loop and make one call, so the first real request skips both"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(self._executor, lambda: self.model)
+        except Exception as e:
+            print(f"Error warming up model client: {e}")
+            return
+        connected = await self.test_connection()
+        print(f"Model warm-up {'succeeded' if connected else 'failed'} in {time.perf_counter() - start:.2f}s")
+
+    async def _generate_content(self, prompt: str, method: str = "generate_content", **kwargs):
+        """Run a blocking generate_content call on the offload executor, via the scheduler"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            with span("gemini"):
+                response = await model_scheduler.run(lambda: loop.run_in_executor(
+                    self._executor,
+                    # Looked up on the executor thread, where building the client cannot stall the loop
+                    lambda: self.model.generate_content(prompt, **kwargs)
+                ))
+        except Exception:
+            gemini_call_duration.observe(time.perf_counter() - start, method=method, outcome="error")
+            raise
+        gemini_call_duration.observe(time.perf_counter() - start, method=method, outcome="ok")
+        return response
+
+    async def _stream_content(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Yield text chunks from a streamed generate_content call run on the offload executor"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True, **kwargs):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        async with model_scheduler.slot():
+            loop.run_in_executor(self._executor, produce)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is done:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                # Stop pulling from the model if the consumer went away
+                cancelled.set()
+
+    async def _generate_json(self, prompt: str, use_cache: bool = True, method: str = "generate_content", **params):
+        """Generate and parse a JSON response, serving repeats from the response cache"""
+        use_cache = use_cache and settings.llm_cache_enabled
+        key = response_cache.make_key(settings.gemini_model, prompt, params)
+        if use_cache:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                gemini_cache_hits.inc(method=method)
+                return self._parse_json(cached)
+
+        response = await self._generate_content(prompt, method=method, **params)
+        text = response.text
+        record_gemini_usage(method, response, prompt, text)
+        try:
+            parsed = self._parse_json(text)
+        except ValueError as e:
+            gemini_parse_failures.inc(method=method, reason="invalid_json")
+            raise GenerationError(f"Model returned invalid JSON: {e}")
+        # Only responses that parsed are worth replaying
+        response_cache.set(key, settings.gemini_model, text)
+        return parsed
+
+    @staticmethod
+    def _parse_json(text: str):
+        """Strip markdown code fences from a model response and parse the JSON"""
+        with span("parse"):
+            json_str = text.strip()
+            if json_str.startswith("```json"):
+                json_str = json_str[7:]
+            if json_str.endswith("```"):
+                json_str = json_str[:-3]
+            return json.loads(json_str.strip())
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough prompt token count (about four characters per token)"""
+        return max(1, len(text) // 4)
+
+    @staticmethod
+    def valid_story(story) -> bool:
+        """Whether a parsed item is a well-formed story"""
+        return (
+            isinstance(story, dict)
+            and isinstance(story.get("title"), str)
+            and isinstance(story.get("user_story"), str)
+            and isinstance(story.get("acceptance_criteria"), list)
+        )
+
+    @classmethod
+    def valid_stories(cls, stories) -> bool:
+        """Whether a parsed response is a non-empty list of well-formed stories"""
+        return isinstance(stories, list) and bool(stories) and all(cls.valid_story(story) for story in stories)
+
+    @staticmethod
+    def epics_prompt(project_context: Dict) -> str:
+        """Render the prompt that asks for a JSON array of epics for a project"""
+        return f"""
+        You are an expert product owner. Based on the following project details,
         suggest 5-8 epics that would be essential for this application.
-        
+
         Project Type: {project_context.get('app_type')}
         Project Name: {project_context.get('name')}
         Description: {project_context.get('description')}
         Context: {project_context.get('context')}
-        
+
         Return ONLY a JSON array of epics with this structure:
         [
             {{
@@ -28,35 +206,36 @@ class GeminiService:
                 "suggested_stories": ["Story 1 title", "Story 2 title", "Story 3 title"]
             }}
         ]
-        
+
         Focus on core functionality for a {project_context.get('app_type')} application.
         """
-        
+
+    async def generate_epics(self, project_context: Dict, use_cache: bool = True) -> List[Dict]:
+        """Generate epic suggestions based on project context"""
+        with span("prompt"):
+            prompt = self.epics_prompt(project_context)
+
         try:
-            response = self.model.generate_content(prompt)
-            # Clean the response and parse JSON
-            json_str = response.text.strip()
-            if json_str.startswith("```json"):
-                json_str = json_str[7:]
-            if json_str.endswith("```"):
-                json_str = json_str[:-3]
-            
-            return json.loads(json_str)
+            epics = await self._generate_json(prompt, use_cache=use_cache, method="generate_epics")
         except Exception as e:
             print(f"Error generating epics: {e}")
-            return []
-    
-    def generate_user_story(self, context: Dict) -> Dict:
+            raise GenerationError.wrap("Epic generation", e)
+        if not isinstance(epics, list) or not epics:
+            gemini_parse_failures.inc(method="generate_epics", reason="unexpected_shape")
+            raise GenerationError("Epic generation returned no epics")
+        return epics
+
+    async def generate_user_story(self, context: Dict, use_cache: bool = True) -> Dict:
         """Generate a detailed user story"""
         prompt = f"""
         You are an expert product owner. Create a detailed user story based on:
-        
+
         Project Type: {context.get('app_type')}
         Project Context: {context.get('project_context')}
         Epic: {context.get('epic_title')}
         Story Title: {context.get('story_title')}
         Additional Context: {context.get('additional_context', '')}
-        
+
         Return ONLY a JSON object with this structure:
         {{
             "user_story": "As a [user type], I want [functionality] so that [benefit]",
@@ -69,69 +248,135 @@ class GeminiService:
             "estimated_points": 1-13
         }}
         """
-        
+
         try:
-            response = self.model.generate_content(prompt)
-            json_str = response.text.strip()
-            if json_str.startswith("```json"):
-                json_str = json_str[7:]
-            if json_str.endswith("```"):
-                json_str = json_str[:-3]
-            
-            return json.loads(json_str)
+            return await self._generate_json(prompt, use_cache=use_cache, method="generate_user_story")
         except Exception as e:
             print(f"Error generating user story: {e}")
-            return {}
-    
-    def refine_user_story(self, story_data: Dict, feedback: str) -> Dict:
-        """Refine an existing user story based on feedback"""
-        prompt = f"""
+            raise GenerationError.wrap("User story generation", e)
+
+    @staticmethod
+    def refine_prompt(story_data: Dict, feedback: str) -> str:
+        """Render the prompt that asks for a refined version of one user story"""
+        return f"""
         You are an expert product owner. Refine this user story based on the feedback:
-        
+
+        Current Title: {story_data.get('title')}
         Current User Story: {story_data.get('user_story')}
         Current Acceptance Criteria: {json.dumps(story_data.get('acceptance_criteria'))}
-        
+        Current Priority: {story_data.get('priority')}
+        Current Story Points: {story_data.get('story_points')}
+
         Feedback/Changes Requested: {feedback}
-        
+
+        Epic Context: {story_data.get('epic_context')}
         Project Context: {story_data.get('project_context')}
-        
-        Return ONLY a JSON object with the updated story in the same format:
+
+        Return ONLY a JSON object with the updated story in this format:
         {{
+            "title": "Updated title",
             "user_story": "Updated user story...",
             "acceptance_criteria": ["Updated criteria..."],
-            "technical_notes": "Updated notes",
-            "priority": "high|medium|low",
-            "estimated_points": 1-13
+            "priority": "High|Medium|Low",
+            "story_points": 1-13
         }}
         """
-        
+
+    async def refine_user_story(self, story_data: Dict, feedback: str, use_cache: bool = True) -> Dict:
+        """Refine an existing user story based on feedback"""
+        with span("prompt"):
+            prompt = self.refine_prompt(story_data, feedback)
+
         try:
-            response = self.model.generate_content(prompt)
-            json_str = response.text.strip()
-            if json_str.startswith("```json"):
-                json_str = json_str[7:]
-            if json_str.endswith("```"):
-                json_str = json_str[:-3]
-            
-            return json.loads(json_str)
+            refined = await self._generate_json(prompt, use_cache=use_cache, method="refine_user_story")
         except Exception as e:
             print(f"Error refining user story: {e}")
-            return {}
-        
-    async def generate_user_stories(self, epic_title: str, epic_description: str, project_context: str, app_type: str):
-        """Generate user stories for a specific epic"""
-        
-        prompt = f"""
+            raise GenerationError.wrap("Story refinement", e)
+        if not self.valid_refinement(refined):
+            gemini_parse_failures.inc(method="refine_user_story", reason="unexpected_shape")
+            raise GenerationError("Story refinement returned no valid story")
+        return refined
+
+    @staticmethod
+    def valid_refinement(refined) -> bool:
+        """Whether a parsed response is a well-formed refined story"""
+        return (
+            isinstance(refined, dict)
+            and isinstance(refined.get("user_story"), str)
+            and isinstance(refined.get("acceptance_criteria"), list)
+        )
+
+    @staticmethod
+    def batch_refine_prompt(project_context: str, feedback: str, stories: List[Dict]) -> str:
+        """Render one prompt asking for refined versions of several stories, keyed by story key"""
+        story_blocks = "\n".join(
+            f"""        [{story['key']}] Title: {story['title']}
+             User Story: {story['user_story']}
+             Acceptance Criteria: {json.dumps(story['acceptance_criteria'])}
+             Priority: {story['priority']}, Story Points: {story['story_points']}
+             Epic Context: {story['epic_context']}"""
+            for story in stories
+        )
+        keys = ", ".join(f'"{story["key"]}"' for story in stories)
+        return f"""
+        You are an expert product owner. Refine each of the following user stories based on the same feedback.
+
+        Feedback/Changes Requested: {feedback}
+
+        Project Context: {project_context}
+
+        Stories:
+{story_blocks}
+
+        Return ONLY a JSON object with one key per story ({keys}), each holding the updated story in this format:
+        {{
+            "<story key>": {{
+                "title": "Updated title",
+                "user_story": "Updated user story...",
+                "acceptance_criteria": ["Updated criteria..."],
+                "priority": "High|Medium|Low",
+                "story_points": 1-13
+            }}
+        }}
+
+        Apply the feedback to every story, keeping each one about its own functionality.
+        """
+
+    async def refine_user_stories_batch(self, project_context: str, feedback: str, stories: List[Dict], use_cache: bool = True) -> Dict[str, Dict]:
+        """Refine several stories of one project with the same feedback in one call.
+
+        stories is a list of refine story_data dictionaries with a "key" added. Returns
+        the response by key, unvalidated: callers check each entry with
+        valid_refinement and fall back to per-story calls for the rest.
+        """
+        with span("prompt"):
+            prompt = self.batch_refine_prompt(project_context, feedback, stories)
+
+        try:
+            response = await self._generate_json(prompt, use_cache=use_cache, method="refine_user_stories_batch")
+        except Exception as e:
+            print(f"Error refining batched user stories: {e}")
+            raise GenerationError.wrap("Batched story refinement", e)
+        if not isinstance(response, dict):
+            gemini_parse_failures.inc(method="refine_user_stories_batch", reason="unexpected_shape")
+            raise GenerationError("Batched story refinement did not return an object")
+
+        return response
+
+    @staticmethod
+    def user_stories_prompt(epic_title: str, epic_description: str, project_context: str, app_type: str) -> str:
+        """Render the prompt that asks for a JSON array of user stories for one epic"""
+        return f"""
         Create detailed user stories for the following epic in a {app_type} application.
-        
+
         Project Context: {project_context}
-        
+
         Epic: {epic_title}
         Description: {epic_description}
-        
+
         Generate 3-5 user stories that break down this epic into actionable development tasks.
         Each user story should follow the format: "As a [user type], I want [functionality] so that [benefit]"
-        
+
         Return the response as a JSON array with this exact structure:
         [
             {{
@@ -146,7 +391,7 @@ class GeminiService:
                 "story_points": 1-13
             }}
         ]
-        
+
         Make sure:
         - User stories are specific and actionable
         - Acceptance criteria use Given-When-Then format
@@ -154,51 +399,151 @@ class GeminiService:
         - Priority reflects business value and dependencies
         - Stories cover different aspects of the epic
         """
-        
+
+    async def generate_user_stories(self, epic_title: str, epic_description: str, project_context: str, app_type: str, use_cache: bool = True):
+        """Generate user stories for a specific epic"""
+        with span("prompt"):
+            prompt = self.user_stories_prompt(epic_title, epic_description, project_context, app_type)
+
         try:
-            response = self.model.generate_content(prompt)
-            
-            # Clean up the response text
-            response_text = response.text.strip()
-            
-            # Remove markdown code block markers if present
-            if response_text.startswith('```json'):
-                response_text = response_text[7:]
-            if response_text.endswith('```'):
-                response_text = response_text[:-3]
-            
-            response_text = response_text.strip()
-            
-            # Parse JSON
-            stories = json.loads(response_text)
-            
-            return stories
-            
+            stories = await self._generate_json(prompt, use_cache=use_cache, method="generate_user_stories")
         except Exception as e:
             print(f"Error generating user stories: {e}")
-            # Return fallback stories if AI generation fails
-            return [
-                {
-                    "title": "Basic Implementation",
-                    "user_story": f"As a user, I want to use the {epic_title.lower()} functionality so that I can achieve my goals",
+            raise GenerationError.wrap("User story generation", e)
+        if not self.valid_stories(stories):
+            gemini_parse_failures.inc(method="generate_user_stories", reason="unexpected_shape")
+            raise GenerationError("User story generation returned no valid stories")
+        return stories
+
+    @staticmethod
+    def batch_user_stories_prompt(project_context: str, app_type: str, epics: List[Dict]) -> str:
+        """Render one prompt asking for user stories for several epics, keyed by epic key"""
+        epic_lines = "\n".join(
+            f"        [{epic['key']}] {epic['title']}: {epic['description']}" for epic in epics
+        )
+        keys = ", ".join(f'"{epic["key"]}"' for epic in epics)
+        return f"""
+        Create detailed user stories for each of the following epics in a {app_type} application.
+
+        Project Context: {project_context}
+
+        Epics:
+{epic_lines}
+
+        For every epic, generate 3-5 user stories that break it down into actionable development tasks.
+        Each user story should follow the format: "As a [user type], I want [functionality] so that [benefit]"
+
+        Return ONLY a JSON object with one key per epic ({keys}), each holding an array with this exact structure:
+        {{
+            "<epic key>": [
+                {{
+                    "title": "Brief descriptive title",
+                    "user_story": "As a [user type], I want [functionality] so that [benefit]",
                     "acceptance_criteria": [
-                        "Given I am on the application, when I access this feature, then it should work correctly",
-                        "Given valid input, when I use this feature, then I should get expected results"
+                        "Given [context], when [action], then [outcome]",
+                        "Given [context], when [action], then [outcome]",
+                        "Given [context], when [action], then [outcome]"
                     ],
-                    "priority": "Medium",
-                    "story_points": 5
-                }
+                    "priority": "High|Medium|Low",
+                    "story_points": 1-13
+                }}
             ]
-    
-    def test_connection(self) -> bool:
+        }}
+
+        Make sure:
+        - User stories are specific and actionable
+        - Acceptance criteria use Given-When-Then format
+        - Story points follow Fibonacci sequence (1, 2, 3, 5, 8, 13)
+        - Priority reflects business value and dependencies
+        - Stories stay within their own epic and cover different aspects of it
+        """
+
+    async def generate_user_stories_batch(self, project_context: str, app_type: str, epics: List[Dict], use_cache: bool = True) -> Dict[str, List[Dict]]:
+        """Generate user stories for several epics in one call.
+
+        epics is a list of {"key", "title", "description"}. Returns the response by key,
+        unvalidated: callers check each entry with valid_stories and fall back to
+        per-epic calls for the rest.
+        """
+        with span("prompt"):
+            prompt = self.batch_user_stories_prompt(project_context, app_type, epics)
+
+        try:
+            response = await self._generate_json(prompt, use_cache=use_cache, method="generate_user_stories_batch")
+        except Exception as e:
+            print(f"Error generating batched user stories: {e}")
+            raise GenerationError.wrap("Batched user story generation", e)
+        if not isinstance(response, dict):
+            gemini_parse_failures.inc(method="generate_user_stories_batch", reason="unexpected_shape")
+            raise GenerationError("Batched user story generation did not return an object")
+
+        return response
+
+    async def stream_user_stories(self, epic_title: str, epic_description: str, project_context: str, app_type: str, use_cache: bool = True) -> AsyncIterator[Dict]:
+        """Stream user stories for an epic, yielding each story as soon as its JSON object closes.
+
+        Malformed items are skipped and counted as parse failures; the response is
+        cached only when every item was well-formed.
+        """
+        prompt = self.user_stories_prompt(epic_title, epic_description, project_context, app_type)
+        key = response_cache.make_key(settings.gemini_model, prompt, {})
+        parser = JSONArrayStreamParser()
+        method = "stream_user_stories"
+        counts = {"valid": 0, "invalid": 0}
+
+        def checked(items) -> Iterator[Dict]:
+            for item in items:
+                if self.valid_story(item):
+                    counts["valid"] += 1
+                    yield item
+                else:
+                    counts["invalid"] += 1
+                    gemini_parse_failures.inc(method=method, reason="unexpected_shape")
+
+        cached = await response_cache.get(key) if use_cache and settings.llm_cache_enabled else None
+        if cached is not None:
+            gemini_cache_hits.inc(method=method)
+            for story in checked(parser.feed(cached)):
+                yield story
+            return
+
+        chunks = []
+        start = time.perf_counter()
+        try:
+            async for chunk in self._stream_content(prompt):
+                chunks.append(chunk)
+                for story in checked(parser.feed(chunk)):
+                    yield story
+        except ValueError as e:
+            gemini_call_duration.observe(time.perf_counter() - start, method=method, outcome="ok")
+            gemini_parse_failures.inc(method=method, reason="invalid_json")
+            raise GenerationError(f"Model returned invalid JSON: {e}")
+        except GenerationError:
+            raise
+        except Exception as e:
+            gemini_call_duration.observe(time.perf_counter() - start, method=method, outcome="error")
+            raise GenerationError.wrap("User story streaming", e)
+        gemini_call_duration.observe(time.perf_counter() - start, method=method, outcome="ok")
+        record_gemini_usage(method, None, prompt, "".join(chunks))
+
+        if not parser.finished:
+            gemini_parse_failures.inc(method=method, reason="invalid_json")
+            raise GenerationError("Model stream ended before the JSON array was closed")
+        if not counts["valid"]:
+            raise GenerationError("User story streaming returned no valid stories")
+        if not counts["invalid"]:
+            # Same key as generate_user_stories, so either path can replay the other
+            response_cache.set(key, settings.gemini_model, "".join(chunks))
+
+    async def test_connection(self) -> bool:
         """Test if Gemini API is working"""
         try:
-            response = self.model.generate_content("Say 'API Connected' and nothing else")
+            response = await self._generate_content("Say 'API Connected' and nothing else", method="test_connection")
             return "Connected" in response.text
         except Exception as e:
             print(f"Connection error: {e}")
             return False
-        
+
 
 # Singleton instance
 gemini_service = GeminiService()
\ No newline at end of file
@@ -0,0 +1,498 @@
+# app/services/generation.py
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import Project, Epic, UserStory
+from app.schemas.project import EpicResponse, UserStoryResponse
+from app.services.context_digest import digest_context
+from app.services.gemini import gemini_service
+from app.services.metrics import gemini_fallbacks
+from app.services.persistence import (
+    bulk_create_epics, flag_story_duplicates, insert_stories, story_rows, with_signatures
+)
+from app.services.singleflight import generation_flight
+
+
+def context_digest_for(project: Project) -> str:
+    """The project's stored context digest, or one computed now if it has none yet"""
+    if project.context_digest is not None:
+        return project.context_digest
+    return digest_context(project.context, settings.context_digest_max_tokens)
+
+
+def project_summary(project: Project) -> str:
+    """Name, description and context digest, for prompts about part of the project"""
+    digest = context_digest_for(project)
+    return f"{project.name}: {project.description}" + (f" {digest}" if digest else "")
+
+
+def project_context_for(project: Project) -> Dict:
+    """Build the project_context dictionary the Gemini service expects"""
+    return {
+        'app_type': project.app_type,
+        'name': project.name,
+        'description': project.description,
+        # Long contexts would otherwise make every prompt grow with them
+        'context': context_digest_for(project)
+    }
+
+
+def story_prompt_args(epic: Epic, project: Project) -> Dict:
+    """Keyword arguments for the per-epic user story prompt"""
+    return {
+        "epic_title": epic.title,
+        "epic_description": epic.description,
+        "project_context": project_summary(project),
+        "app_type": project.app_type
+    }
+
+
+def refine_story_data(story: UserStory, epic: Epic, project: Project) -> Dict:
+    """The story_data dictionary the refine prompt expects"""
+    return {
+        "title": story.title,
+        "user_story": story.user_story,
+        "acceptance_criteria": story.acceptance_criteria,
+        "priority": story.priority,
+        "story_points": story.story_points,
+        "epic_context": f"{epic.title}: {epic.description}",
+        "project_context": project_summary(project)
+    }
+
+
+def refined_story_row(original: Dict, story_data: Dict, refined_data: Dict) -> Dict:
+    """Column values for the new version created by refining a story"""
+    return {
+        "epic_id": original["epic_id"],
+        "title": refined_data.get("title", story_data["title"]),
+        "user_story": refined_data["user_story"],
+        "acceptance_criteria": refined_data["acceptance_criteria"],
+        "priority": refined_data.get("priority", story_data["priority"]),
+        "story_points": refined_data.get("story_points", story_data["story_points"]),
+        "version": original["version"] + 1,
+        "parent_story_id": original["id"],
+        "root_story_id": original["root_id"]
+    }
+
+
+async def _adopt(db: AsyncSession, objects: List) -> List:
+    # Rows saved by a shared single-flight task belong to its own (closed) session;
+    # merge them without reloading so each caller gets its own copies for free
+    return [await db.merge(obj, load=False) for obj in objects]
+
+
+async def ensure_context_digest(db: AsyncSession, project: Project) -> Project:
+    """Compute and store the project's context digest if it has none yet"""
+    if project.context_digest is None and project.context:
+        # Pages of context take a noticeable fraction of a second to digest
+        digest = await asyncio.to_thread(digest_context, project.context, settings.context_digest_max_tokens)
+        # A Core update, as a derived column is not an edit: no revision bump or new updated_at.
+        # Matching on context keeps a digest of old text from landing after update_project.
+        await db.execute(
+            update(Project).where(Project.id == project.id, Project.context == project.context).values(
+                context_digest=digest, updated_at=Project.updated_at
+            ),
+            execution_options={"synchronize_session": False}
+        )
+        set_committed_value(project, "context_digest", digest)
+    return project
+
+
+async def _release_connection(db: AsyncSession):
+    # End the session's read transaction before a model call: holding its pooled
+    # connection through the round trip, while the save takes a second one, lets
+    # a burst of generate requests exhaust the pool
+    await db.commit()
+
+
+async def _save_stories(db: AsyncSession, rows: List[Dict], flag: bool = True) -> List[UserStory]:
+    # Signing is CPU-bound: do it on a worker thread, before the write transaction
+    # starts, so neither the event loop nor the database lock waits on it
+    rows = await asyncio.to_thread(with_signatures, rows)
+    return await db.run_sync(insert_stories, rows, flag)
+
+
+async def generate_epics_for_project(db: AsyncSession, project: Project, use_cache: bool = True) -> List[Epic]:
+    """Generate epics for a project and save them.
+
+    Concurrent identical calls share one generation, so the epics are written once.
+    """
+    project_id = project.id
+    project_context = project_context_for(await ensure_context_digest(db, project))
+
+    async def generate_and_save() -> List[Epic]:
+        epics_data = await gemini_service.generate_epics(project_context, use_cache=use_cache)
+        async with AsyncSessionLocal() as flight_db:
+            return await flight_db.run_sync(bulk_create_epics, project_id, epics_data)
+
+    key = generation_flight.key("generate_epics", project_id, gemini_service.epics_prompt(project_context))
+    await _release_connection(db)
+    epics = await generation_flight.do(key, generate_and_save)
+    return await _adopt(db, epics)
+
+
+async def generate_stories_for_epic(db: AsyncSession, epic: Epic, use_cache: bool = True) -> List[UserStory]:
+    """Generate user stories for an epic and save them.
+
+    Concurrent identical calls share one generation, so the stories are written once.
+    """
+    epic_id = epic.id
+    project = await ensure_context_digest(db, await db.get(Project, epic.project_id))
+    prompt_args = story_prompt_args(epic, project)
+
+    async def generate_and_save() -> List[UserStory]:
+        stories_data = await gemini_service.generate_user_stories(**prompt_args, use_cache=use_cache)
+        async with AsyncSessionLocal() as flight_db:
+            return await _save_stories(flight_db, story_rows(epic_id, stories_data))
+
+    key = generation_flight.key("generate_stories", epic_id, gemini_service.user_stories_prompt(**prompt_args))
+    await _release_connection(db)
+    stories = await generation_flight.do(key, generate_and_save)
+    return await _adopt(db, stories)
+
+
+def _original_story(story: UserStory) -> Dict:
+    return {"id": story.id, "epic_id": story.epic_id, "version": story.version, "root_id": story.lineage_id}
+
+
+async def refine_story(db: AsyncSession, original_story: UserStory, feedback: str, use_cache: bool = True) -> UserStory:
+    """Refine a user story with the model and save the result as a new version.
+
+    Concurrent identical refinements share one generation and one new version.
+    """
+    # Get epic context for better refinement; relationships cannot lazy-load on an AsyncSession
+    epic = await db.get(Epic, original_story.epic_id)
+    project = await ensure_context_digest(db, await db.get(Project, epic.project_id))
+    story_data = refine_story_data(original_story, epic, project)
+    original = _original_story(original_story)
+
+    async def generate_and_save() -> List[UserStory]:
+        refined_data = await gemini_service.refine_user_story(story_data, feedback, use_cache=use_cache)
+        async with AsyncSessionLocal() as flight_db:
+            # New versions are indexed for later duplicate checks but not flagged, as before
+            return await _save_stories(flight_db, [refined_story_row(original, story_data, refined_data)], flag=False)
+
+    key = generation_flight.key("refine_story", original["id"], gemini_service.refine_prompt(story_data, feedback))
+    await _release_connection(db)
+    refined = await generation_flight.do(key, generate_and_save)
+    return (await _adopt(db, refined))[0]
+
+
+async def stream_stories_for_epic(db: AsyncSession, epic: Epic, use_cache: bool = True) -> AsyncIterator[UserStory]:
+    """Stream user stories for an epic, saving each one as soon as the model emits it.
+
+    Near-duplicates are flagged once the stream ends, in one pass over all its
+    stories; the yielded stories carry no duplicate_of_id yet.
+    """
+    project = await ensure_context_digest(db, await db.get(Project, epic.project_id))
+    prompt_args = story_prompt_args(epic, project)
+    await _release_connection(db)
+    saved: List[UserStory] = []
+    async for story_data in gemini_service.stream_user_stories(**prompt_args, use_cache=use_cache):
+        story = (await _save_stories(db, story_rows(epic.id, [story_data]), flag=False))[0]
+        saved.append(story)
+        yield story
+    await db.run_sync(flag_story_duplicates, saved)
+
+
+def _new_batch_stats() -> Dict:
+    return {"calls": 0, "fallback_calls": 0, "prompt_tokens": 0, "baseline_calls": 0, "baseline_prompt_tokens": 0}
+
+
+def summarize_batch_stats(stats: Dict) -> Dict:
+    """Model calls and estimated prompt tokens used, against one call per epic"""
+    return {
+        "calls": stats["calls"],
+        "fallback_calls": stats["fallback_calls"],
+        "calls_saved": stats["baseline_calls"] - stats["calls"],
+        "prompt_tokens_estimated": stats["prompt_tokens"],
+        "prompt_tokens_saved_estimated": stats["baseline_prompt_tokens"] - stats["prompt_tokens"]
+    }
+
+
+async def _batch_with_fallback(
+    items: List[Tuple[int, Dict, Dict]],
+    stats: Dict,
+    *,
+    method: str,
+    key_prefix: str,
+    batch_call: Callable[[List[Dict]], Awaitable[Dict]],
+    batch_prompt: Callable[[List[Dict]], str],
+    single_call: Callable[[Dict], Awaitable],
+    single_prompt: Callable[[Dict], str],
+    validate: Callable[[object], bool]
+) -> Dict[int, object]:
+    """Run items through one batched model call, falling back to one call per item.
+
+    items are (id, single_call arguments, batch entry); each batch entry is sent with
+    a key added. Returns the validated result or the error per id, and accumulates
+    call and prompt token counts into stats.
+    """
+    stats["baseline_calls"] += len(items)
+    stats["baseline_prompt_tokens"] += sum(gemini_service.estimate_tokens(single_prompt(args)) for _, args, _ in items)
+
+    results: Dict[int, object] = {}
+    if len(items) > 1:
+        keyed = [dict(entry, key=f"{key_prefix}{i + 1}") for i, (_, _, entry) in enumerate(items)]
+        stats["calls"] += 1
+        stats["prompt_tokens"] += gemini_service.estimate_tokens(batch_prompt(keyed))
+        try:
+            by_key = await batch_call(keyed)
+        except Exception as e:
+            print(f"{method} failed, falling back to one call each: {e}")
+            by_key = {}
+        for entry, (item_id, _, _) in zip(keyed, items):
+            if validate(by_key.get(entry["key"])):
+                results[item_id] = by_key[entry["key"]]
+
+    # Anything the batch missed or got wrong gets its own call
+    missing = [(item_id, args) for item_id, args, _ in items if item_id not in results]
+    stats["calls"] += len(missing)
+    if len(items) > 1:
+        stats["fallback_calls"] += len(missing)
+        if missing:
+            gemini_fallbacks.inc(len(missing), method=method)
+    stats["prompt_tokens"] += sum(gemini_service.estimate_tokens(single_prompt(args)) for _, args in missing)
+    outcomes = await asyncio.gather(*(single_call(args) for _, args in missing), return_exceptions=True)
+    for (item_id, _), outcome in zip(missing, outcomes):
+        results[item_id] = outcome
+    return results
+
+
+async def _generate_batch(batch: List[Epic], project: Project, use_cache: bool, stats: Dict) -> List[Tuple]:
+    """Generate story data for a batch of epics with one prompt, falling back per epic"""
+    prompt_args = [story_prompt_args(epic, project) for epic in batch]
+    project_context, app_type = prompt_args[0]["project_context"], prompt_args[0]["app_type"]
+    outcomes = await _batch_with_fallback(
+        [(epic.id, args, {"title": epic.title, "description": epic.description}) for epic, args in zip(batch, prompt_args)],
+        stats,
+        method="generate_user_stories_batch",
+        key_prefix="E",
+        batch_call=lambda keyed: gemini_service.generate_user_stories_batch(project_context, app_type, keyed, use_cache=use_cache),
+        batch_prompt=lambda keyed: gemini_service.batch_user_stories_prompt(project_context, app_type, keyed),
+        single_call=lambda args: gemini_service.generate_user_stories(**args, use_cache=use_cache),
+        single_prompt=lambda args: gemini_service.user_stories_prompt(**args),
+        validate=gemini_service.valid_stories
+    )
+    return [
+        (epic, None, outcomes[epic.id]) if isinstance(outcomes[epic.id], Exception) else (epic, outcomes[epic.id], None)
+        for epic in batch
+    ]
+
+
+async def iter_stories_data(
+    epics: List[Epic],
+    project: Project,
+    batch_size: int = 1,
+    max_parallel: Optional[int] = None,
+    use_cache: bool = True,
+    stats: Optional[Dict] = None
+) -> AsyncIterator[Tuple[Epic, Optional[List[Dict]], Optional[Exception]]]:
+    """Generate story data for many epics concurrently, yielding (epic, stories_data, error) as each finishes.
+
+    With batch_size > 1 epics are packed that many to a prompt. Batches run under a
+    semaphore of max_parallel; call and token counts are accumulated into stats.
+    """
+    stats = stats if stats is not None else _new_batch_stats()
+    semaphore = asyncio.Semaphore(max_parallel or settings.plan_max_parallel)
+    batch_size = max(1, batch_size)
+    batches = [epics[i:i + batch_size] for i in range(0, len(epics), batch_size)]
+
+    async def run(batch: List[Epic]) -> List[Tuple]:
+        async with semaphore:
+            return await _generate_batch(batch, project, use_cache, stats)
+
+    for next_done in asyncio.as_completed([run(batch) for batch in batches]):
+        for result in await next_done:
+            yield result
+
+
+async def generate_stories_for_epics(
+    db: AsyncSession,
+    project: Project,
+    epics: List[Epic],
+    batch_size: int,
+    use_cache: bool = True
+) -> Tuple[Dict[int, List[UserStory]], Dict[int, str], Dict]:
+    """Generate and save stories for several epics using batched prompts.
+
+    Returns the saved stories per epic, the error per failed epic and the batching stats.
+    """
+    stats = _new_batch_stats()
+    created: Dict[int, List[UserStory]] = {}
+    failed: Dict[int, str] = {}
+    await ensure_context_digest(db, project)
+    await _release_connection(db)
+    async for epic, stories_data, error in iter_stories_data(
+        epics, project, batch_size=batch_size, use_cache=use_cache, stats=stats
+    ):
+        if error is None:
+            try:
+                created[epic.id] = await _save_stories(db, story_rows(epic.id, stories_data))
+                continue
+            except Exception as e:
+                await db.rollback()
+                error = e
+        print(f"Error generating stories for epic {epic.id}: {error}")
+        failed[epic.id] = str(error)
+    return created, failed, summarize_batch_stats(stats)
+
+
+async def _refine_batch(
+    batch: List[Tuple[int, Dict]],
+    project_context: str,
+    feedback: str,
+    use_cache: bool,
+    stats: Dict
+) -> Dict[int, object]:
+    """Refine a batch of one project's stories with one prompt, falling back per story.
+
+    batch is a list of (story id, story_data); returns the refined data or the error per story id.
+    """
+    return await _batch_with_fallback(
+        [(story_id, story_data, story_data) for story_id, story_data in batch],
+        stats,
+        method="refine_user_stories_batch",
+        key_prefix="S",
+        batch_call=lambda keyed: gemini_service.refine_user_stories_batch(project_context, feedback, keyed, use_cache=use_cache),
+        batch_prompt=lambda keyed: gemini_service.batch_refine_prompt(project_context, feedback, keyed),
+        single_call=lambda story_data: gemini_service.refine_user_story(story_data, feedback, use_cache=use_cache),
+        single_prompt=lambda story_data: gemini_service.refine_prompt(story_data, feedback),
+        validate=gemini_service.valid_refinement
+    )
+
+
+async def refine_stories(
+    db: AsyncSession,
+    stories: List[UserStory],
+    feedback: str,
+    batch_size: int,
+    use_cache: bool = True
+) -> Tuple[Dict[int, UserStory], Dict[int, str], Dict]:
+    """Refine many stories with the same feedback using batched prompts.
+
+    Stories are grouped by project and packed batch_size to a prompt, with batches
+    running under a semaphore of plan_max_parallel. Every new version is inserted in
+    one transaction. Returns the new version per original story id, the error per
+    story that could not be refined and the batching stats.
+    """
+    epic_ids = {story.epic_id for story in stories}
+    epics = {epic.id: epic for epic in (await db.scalars(select(Epic).where(Epic.id.in_(epic_ids)))).all()}
+    project_ids = {epic.project_id for epic in epics.values()}
+    projects = {
+        project.id: await ensure_context_digest(db, project)
+        for project in (await db.scalars(select(Project).where(Project.id.in_(project_ids)))).all()
+    }
+
+    originals: Dict[int, Dict] = {}
+    story_data: Dict[int, Dict] = {}
+    by_project: Dict[int, List[int]] = {}
+    for story in stories:
+        epic = epics[story.epic_id]
+        originals[story.id] = _original_story(story)
+        story_data[story.id] = refine_story_data(story, epic, projects[epic.project_id])
+        by_project.setdefault(epic.project_id, []).append(story.id)
+
+    batch_size = max(1, batch_size)
+    batches = [
+        (project_summary(projects[project_id]), [(story_id, story_data[story_id]) for story_id in story_ids[i:i + batch_size]])
+        for project_id, story_ids in by_project.items()
+        for i in range(0, len(story_ids), batch_size)
+    ]
+    stats = _new_batch_stats()
+    semaphore = asyncio.Semaphore(settings.plan_max_parallel)
+
+    async def run(project_context: str, batch: List[Tuple[int, Dict]]) -> Dict[int, object]:
+        async with semaphore:
+            return await _refine_batch(batch, project_context, feedback, use_cache, stats)
+
+    await _release_connection(db)
+    outcomes = await asyncio.gather(*(run(project_context, batch) for project_context, batch in batches))
+
+    refined_ids: List[int] = []
+    rows: List[Dict] = []
+    failed: Dict[int, str] = {}
+    for results in outcomes:
+        for story_id, outcome in results.items():
+            if isinstance(outcome, Exception):
+                print(f"Error refining story {story_id}: {outcome}")
+                failed[story_id] = str(outcome)
+            else:
+                refined_ids.append(story_id)
+                rows.append(refined_story_row(originals[story_id], story_data[story_id], outcome))
+
+    # One INSERT and one commit for every new version
+    created = await _save_stories(db, rows, flag=False)
+    return dict(zip(refined_ids, created)), failed, summarize_batch_stats(stats)
+
+
+async def plan_project(
+    db: AsyncSession,
+    project: Project,
+    max_parallel: Optional[int] = None,
+    use_cache: bool = True,
+    batch_size: int = 1
+) -> AsyncIterator[Dict]:
+    """Generate epics, then stories for every epic concurrently, yielding progress events.
+
+    Story generation fans out under a semaphore of max_parallel calls. Each epic's
+    stories are committed as soon as they arrive, so wall time is roughly one epic
+    call plus the slowest story call. batch_size > 1 packs several epics per prompt.
+    """
+    started = time.perf_counter()
+    stats = _new_batch_stats()
+
+    epics = await generate_epics_for_project(db, project, use_cache=use_cache)
+    total = len(epics)
+    yield {
+        "event": "epics_generated",
+        "total": total,
+        "epics": [EpicResponse.model_validate(epic).model_dump(mode="json") for epic in epics]
+    }
+
+    completed = 0
+    story_count = 0
+    async for epic, stories_data, error in iter_stories_data(
+        epics, project, batch_size=batch_size, max_parallel=max_parallel, use_cache=use_cache, stats=stats
+    ):
+        completed += 1
+        if error is None:
+            try:
+                stories = await _save_stories(db, story_rows(epic.id, stories_data))
+            except Exception as e:
+                await db.rollback()
+                error = e
+        if error is not None:
+            print(f"Error in plan_project for epic {epic.id}: {error}")
+            yield {
+                "event": "epic_failed",
+                "epic_id": epic.id,
+                "error": str(error),
+                "completed": completed,
+                "total": total
+            }
+            continue
+
+        story_count += len(stories)
+        yield {
+            "event": "stories_generated",
+            "epic_id": epic.id,
+            "completed": completed,
+            "total": total,
+            "stories": [UserStoryResponse.model_validate(story).model_dump(mode="json") for story in stories]
+        }
+
+    yield {
+        "event": "completed",
+        "epics": total,
+        "stories": story_count,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "batching": summarize_batch_stats(stats)
+    }
\ No newline at end of file
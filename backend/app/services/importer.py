@@ -0,0 +1,323 @@
+# app/services/importer.py
+import argparse
+import csv
+import io
+import json
+import sys
+from collections import ChainMap
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models import Project, Epic, UserStory
+from app.schemas.project import ProjectCreate, EpicCreate, UserStoryCreate
+from app.services.persistence import bulk_create, index_stories, with_signatures
+
+IMPORT_FORMATS = ("jsonl", "csv")
+
+# Records inserted per transaction
+IMPORT_CHUNK_SIZE = 1000
+
+# Errors listed in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+KINDS = ("project", "epic", "story")
+
+CSV_NEEDS_PROJECT = "A CSV import needs project_id: the file has no project record"
+
+
+class RowError(ValueError):
+    """A record that cannot be imported; the import carries on without it"""
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def _optional_int(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"expected an integer, got {value!r}")
+
+
+def jsonl_records(lines: Iterator[str]) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """(line number, record, error) for each non-blank line of the JSONL export format"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"invalid JSON: {e.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "expected a JSON object"
+            continue
+        yield number, record, None
+
+
+def csv_records(lines: Iterator[str]) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Records from the flat CSV export format: an epic the first time its epic_id appears, then the story.
+
+    The file has no project record, so its project_id column is ignored: epics
+    go to the project the import targets.
+    """
+    reader = csv.DictReader(lines)
+    seen_epics = set()
+    end = 1  # The header
+    for row in reader:
+        # Quoted fields can span lines; report the line the record starts on
+        number, end = end + 1, reader.line_num
+        epic_ref = row.get("epic_id") or None
+        if epic_ref not in seen_epics:
+            seen_epics.add(epic_ref)
+            yield number, {
+                "type": "epic", "id": epic_ref, "title": row.get("epic_title"), "description": row.get("epic_description") or None
+            }, None
+        if row.get("story_id") or row.get("title"):
+            criteria = row.get("acceptance_criteria") or ""
+            yield number, {
+                "type": "story", "id": row.get("story_id") or None, "epic_id": epic_ref,
+                "title": row.get("title"), "user_story": row.get("user_story"),
+                "acceptance_criteria": [line for line in criteria.splitlines() if line.strip()],
+                "priority": row.get("priority") or "Medium", "story_points": row.get("story_points") or None,
+                "version": row.get("version") or None, "parent_story_id": row.get("parent_story_id") or None,
+                "root_story_id": row.get("root_story_id") or None, "duplicate_of_id": row.get("duplicate_of_id") or None
+            }, None
+
+
+class Importer:
+    """Validates records and inserts them in chunked transactions, remapping file ids to new ids.
+
+    Ids in the file are only references: epics point at a project by its file id
+    (or at project_id when the file has no such project), stories at an epic and at
+    the earlier versions they were refined from. A story whose earlier versions are
+    not in the file starts a new lineage. A bad record is reported and skipped;
+    records committed in earlier chunks stay.
+    """
+
+    def __init__(self, db: Session, project_id: Optional[int] = None, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.project_id = project_id
+        self.chunk_size = chunk_size
+        self.refs: Dict[str, Dict[str, int]] = {kind: {} for kind in KINDS}  # file id -> new id
+        self.pending: Dict[str, List[Tuple[int, Optional[str], Dict]]] = {kind: [] for kind in KINDS}
+        self.pending_story_refs = set()
+        self.created = {kind: 0 for kind in KINDS}
+        self.project_ids: List[int] = []
+        self.errors: List[Dict] = []
+        self.error_count = 0
+
+    def error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def add(self, line: int, record: Dict):
+        try:
+            kind = record.get("type")
+            if kind not in KINDS:
+                raise RowError(f"type must be one of {', '.join(KINDS)}")
+            ref = str(record["id"]) if record.get("id") not in (None, "") else None
+            row = getattr(self, f"_{kind}_row")(record)
+        except RowError as e:
+            self.error(line, str(e))
+            return
+        except ValidationError as e:
+            self.error(line, _validation_message(e))
+            return
+
+        if kind == "story" and {row["parent_ref"], row["root_ref"]} & self.pending_story_refs:
+            # Earlier versions must have ids before the story can point at them
+            self.flush()
+        self.pending[kind].append((line, ref, row))
+        if kind == "story" and ref is not None:
+            self.pending_story_refs.add(ref)
+        if sum(len(rows) for rows in self.pending.values()) >= self.chunk_size:
+            self.flush()
+
+    def _project_row(self, record: Dict) -> Dict:
+        return ProjectCreate.model_validate(record).model_dump()
+
+    def _epic_row(self, record: Dict) -> Dict:
+        project_ref = record.get("project_id")
+        if project_ref in (None, "") and self.project_id is None:
+            raise RowError("epic has no project_id and no target project was given")
+        # Validated with EpicCreate once the project's new id is known
+        return {
+            "title": record.get("title"), "description": record.get("description"),
+            "project_ref": str(project_ref) if project_ref not in (None, "") else None
+        }
+
+    def _story_row(self, record: Dict) -> Dict:
+        if record.get("epic_id") in (None, ""):
+            raise RowError("story has no epic_id")
+        story = UserStoryCreate.model_validate(record)
+        version = _optional_int(record.get("version")) or 1
+        parent_ref, root_ref = record.get("parent_story_id"), record.get("root_story_id")
+        return {
+            **story.model_dump(), "version": version, "epic_ref": str(record["epic_id"]),
+            "parent_ref": str(parent_ref) if parent_ref not in (None, "") else None,
+            "root_ref": str(root_ref) if root_ref not in (None, "") else None,
+            "duplicate_ref": str(record["duplicate_of_id"]) if record.get("duplicate_of_id") not in (None, "") else None
+        }
+
+    def _insert(self, model, new_refs: Dict[str, int], rows: List[Tuple[int, Optional[str], Dict]]):
+        objects = bulk_create(self.db, model, [row for _, _, row in rows], commit=False)
+        for (_, ref, _), obj in zip(rows, objects):
+            if ref is not None:
+                new_refs[ref] = obj.id
+        return objects
+
+    def _resolve_epics(self, refs: ChainMap) -> List[Tuple[int, Optional[str], Dict]]:
+        rows = []
+        for line, ref, row in self.pending["epic"]:
+            project_ref = row["project_ref"]
+            if project_ref in refs["project"]:
+                project_id = refs["project"][project_ref]
+            elif self.project_id is not None:
+                project_id = self.project_id
+            else:
+                self.error(line, f"unknown project_id {project_ref}")
+                continue
+            try:
+                epic = EpicCreate(project_id=project_id, title=row["title"], description=row["description"])
+            except ValidationError as e:
+                self.error(line, _validation_message(e))
+                continue
+            rows.append((line, ref, epic.model_dump()))
+        return rows
+
+    def _resolve_stories(self, refs: ChainMap) -> List[Tuple[int, Optional[str], Dict]]:
+        resolved = []
+        for line, ref, row in self.pending["story"]:
+            if row["epic_ref"] not in refs["epic"]:
+                self.error(line, f"unknown epic_id {row['epic_ref']}")
+                continue
+            lineage = (row["parent_ref"], row["root_ref"])
+            if any(lineage_ref is not None and lineage_ref not in refs["story"] for lineage_ref in lineage):
+                # Earlier versions left out of the file (an export without history):
+                # keep the story as the start of a new lineage
+                lineage = (None, None)
+            resolved.append((line, ref, {
+                "epic_id": refs["epic"][row["epic_ref"]],
+                "parent_story_id": refs["story"].get(lineage[0]), "root_story_id": refs["story"].get(lineage[1]),
+                "title": row["title"], "user_story": row["user_story"],
+                "acceptance_criteria": row["acceptance_criteria"], "priority": row["priority"],
+                "story_points": row["story_points"], "version": row["version"],
+                # A duplicate hint only survives when the other story came along
+                "duplicate_of_id": refs["story"].get(row["duplicate_ref"])
+            }))
+        rows = with_signatures([row for _, _, row in resolved])
+        return [(line, ref, row) for (line, ref, _), row in zip(resolved, rows)]
+
+    def flush(self):
+        """Insert the pending records in one transaction"""
+        pending_lines = [line for rows in self.pending.values() for line, _, _ in rows]
+        if not pending_lines:
+            return
+        new_refs = {kind: {} for kind in KINDS}
+        refs = {kind: ChainMap(new_refs[kind], self.refs[kind]) for kind in KINDS}
+        error_count = self.error_count
+        try:
+            projects = self._insert(Project, new_refs["project"], self.pending["project"])
+            epics = self._insert(Epic, new_refs["epic"], self._resolve_epics(refs))
+            story_rows = self._resolve_stories(refs)
+            stories = self._insert(UserStory, new_refs["story"], story_rows)
+            if stories:
+                index_stories(self.db, stories, [row for _, _, row in story_rows])
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            print(f"Error importing records: {e}")
+            # Unresolved-reference errors for this chunk are superseded by the failure
+            del self.errors[error_count:]
+            self.error_count = error_count
+            for line in pending_lines:
+                self.error(line, f"database error: {e.__class__.__name__}")
+        else:
+            for kind in KINDS:
+                self.refs[kind].update(new_refs[kind])
+            self.created["project"] += len(projects)
+            self.created["epic"] += len(epics)
+            self.created["story"] += len(stories)
+            self.project_ids.extend(project.id for project in projects)
+        finally:
+            self.db.expunge_all()
+            self.pending = {kind: [] for kind in KINDS}
+            self.pending_story_refs = set()
+
+    def report(self) -> Dict:
+        return {
+            "created": {"projects": self.created["project"], "epics": self.created["epic"],
+                        "stories": self.created["story"]},
+            "project_ids": self.project_ids,
+            "error_count": self.error_count,
+            "errors": sorted(self.errors, key=lambda error: error["line"])
+        }
+
+
+def import_records(db: Session, stream: IO[bytes], import_format: str, project_id: Optional[int] = None,
+                   chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """Import a JSONL or CSV export from a binary stream, reading it a line at a time.
+
+    A CSV file has no project record, so it needs project_id.
+    """
+    if import_format == "csv" and project_id is None:
+        raise ValueError(CSV_NEEDS_PROJECT)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    records = jsonl_records(text) if import_format == "jsonl" else csv_records(text)
+    importer = Importer(db, project_id=project_id, chunk_size=chunk_size)
+    line = 0
+    try:
+        for line, record, error in records:
+            if error:
+                importer.error(line, error)
+            else:
+                importer.add(line, record)
+    except (UnicodeDecodeError, csv.Error) as e:
+        importer.error(line + 1, f"cannot read the rest of the file: {e}")
+    importer.flush()
+    text.detach()
+    return importer.report()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import projects, epics and stories from a JSONL or CSV export")
+    parser.add_argument("path", help="File to import, or - for stdin")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--project-id", type=int, help="Project for epics whose project is not in the file")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    import_format = args.format or ("csv" if args.path.endswith(".csv") else "jsonl")
+    if import_format == "csv" and args.project_id is None:
+        parser.error(CSV_NEEDS_PROJECT.replace("project_id", "--project-id"))
+
+    from app.database import SessionLocal, engine
+    from app.migrations import init_schema
+    init_schema(engine)
+
+    db = SessionLocal()
+    try:
+        if args.project_id is not None and db.get(Project, args.project_id) is None:
+            print(f"Error: project {args.project_id} not found")
+            return 1
+        if args.path == "-":
+            report = import_records(db, sys.stdin.buffer, import_format, args.project_id, args.chunk_size)
+        else:
+            with open(args.path, "rb") as stream:
+                report = import_records(db, stream, import_format, args.project_id, args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+    return 0 if report["error_count"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+# app/services/jobs.py
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import Project, Epic, UserStory, Job
+from app.schemas.project import EpicResponse, UserStoryResponse
+from app.services import generation
+
+# A handler receives its own session, the job's params and an async progress
+# callback, and returns a JSON-serialisable result
+JobHandler = Callable[[AsyncSession, Dict, Callable[[Dict], Awaitable[None]]], Awaitable[Any]]
+
+
+class JobQueue:
+    """Persistent background queue for LLM generation, drained by in-process workers.
+
+    Jobs live in the jobs table, so a job survives client disconnects and proxy
+    timeouts. Ids are handed to workers through an in-memory queue. A worker that
+    claims a job takes a lease on it and renews it while the job runs; several
+    processes can share the table, and a running job is only queued again once its
+    lease has expired, i.e. its process died. Each process sweeps for such jobs,
+    and for pending jobs nobody has queued, at startup and then once per lease.
+    """
+
+    def __init__(self, workers: int, lease_seconds: int):
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def handler(self, kind: str):
+        """Register the coroutine that runs jobs of this kind"""
+        def register(fn: JobHandler) -> JobHandler:
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    async def enqueue(self, db: AsyncSession, kind: str, params: Dict) -> Job:
+        """Persist a new job and hand it to the workers"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = Job(kind=kind, params=params, status="pending")
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        self._put(job.id)
+        return job
+
+    async def start(self):
+        """Recover unfinished jobs and start the worker tasks"""
+        self._queue = asyncio.Queue()
+        for job_id in self._recover():
+            self._put(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self):
+        """Cancel the workers and release their leases, so interrupted jobs can run again at once"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job).where(Job.status == "running", Job.worker_id == self.worker_id).values(
+                    status="pending", worker_id=None, lease_expires_at=None
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            await db.commit()
+
+    def _put(self, job_id: int):
+        if self._queue is not None and job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    def _recover(self) -> List[int]:
+        """Requeue running jobs whose lease expired, fail those interrupted too often,
+        and return the ids of every pending job"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            # Rows from before leases existed have none
+            expired = or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)
+            recovered = 0
+            for job_id, attempts in db.execute(
+                select(Job.id, Job.attempts).where(Job.status == "running", expired).order_by(Job.id)
+            ).all():
+                failed = attempts >= settings.job_max_attempts
+                values = (
+                    {"status": "failed", "error": "Abandoned after repeated interruptions", "finished_at": now}
+                    if failed else {"status": "pending"}
+                )
+                # Conditional on the lease still being expired, in case another process got here first
+                claimed = db.execute(
+                    update(Job).where(Job.id == job_id, Job.status == "running", expired).values(
+                        worker_id=None, lease_expires_at=None, **values
+                    ),
+                    execution_options={"synchronize_session": False}
+                )
+                recovered += bool(claimed.rowcount) and not failed
+            db.commit()
+            if recovered:
+                print(f"Recovered {recovered} job(s) whose worker stopped renewing its lease")
+            return list(db.scalars(select(Job.id).where(Job.status == "pending").order_by(Job.id)))
+        finally:
+            db.close()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                for job_id in await asyncio.to_thread(self._recover):
+                    self._put(job_id)
+            except Exception as e:
+                print(f"Error recovering jobs: {e}")
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _lease(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def _renew(self, job_id: int):
+        # Its own session: the handler's may be mid-transaction at any moment
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(Job).where(Job.id == job_id, Job.worker_id == self.worker_id).values(
+                            lease_expires_at=self._lease(), updated_at=Job.updated_at
+                        ),
+                        execution_options={"synchronize_session": False}
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"Error renewing the lease on job {job_id}: {e}")
+
+    async def _run(self, job_id: int):
+        async with AsyncSessionLocal() as db:
+            # Claim the job atomically so a job is never run twice
+            claimed = await db.execute(
+                update(Job).where(Job.id == job_id, Job.status == "pending").values(
+                    status="running",
+                    attempts=Job.attempts + 1,
+                    started_at=datetime.utcnow(),
+                    worker_id=self.worker_id,
+                    lease_expires_at=self._lease()
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            await db.commit()
+            if not claimed.rowcount:
+                return
+            job = await db.get(Job, job_id)
+            kind, params = job.kind, job.params or {}
+
+            async def report(progress: Dict):
+                job.progress = progress
+                await db.commit()
+
+            renewal = asyncio.create_task(self._renew(job_id))
+            try:
+                result = await self.handlers[kind](db, params, report)
+            except Exception as e:
+                await db.rollback()
+                print(f"Error in job {job_id} ({kind}): {e}")
+                job.status = "failed"
+                job.error = str(e)
+            else:
+                job.status = "succeeded"
+                job.result = result
+            finally:
+                renewal.cancel()
+            job.finished_at = datetime.utcnow()
+            job.lease_expires_at = None
+            await db.commit()
+
+
+job_queue = JobQueue(workers=settings.job_workers, lease_seconds=settings.job_lease_seconds)
+
+
+async def _get_or_fail(db: AsyncSession, model, entity_id: int):
+    entity = await db.get(model, entity_id)
+    if entity is None:
+        raise ValueError(f"{model.__name__} {entity_id} not found")
+    return entity
+
+
+@job_queue.handler("generate_epics")
+async def _generate_epics_job(db: AsyncSession, params: Dict, report) -> List[Dict]:
+    project = await _get_or_fail(db, Project, params["project_id"])
+    epics = await generation.generate_epics_for_project(db, project, use_cache=params.get("use_cache", True))
+    return [EpicResponse.model_validate(epic).model_dump(mode="json") for epic in epics]
+
+
+@job_queue.handler("generate_stories")
+async def _generate_stories_job(db: AsyncSession, params: Dict, report) -> List[Dict]:
+    epic = await _get_or_fail(db, Epic, params["epic_id"])
+    stories = await generation.generate_stories_for_epic(db, epic, use_cache=params.get("use_cache", True))
+    return [UserStoryResponse.model_validate(story).model_dump(mode="json") for story in stories]
+
+
+@job_queue.handler("generate_stories_batch")
+async def _generate_stories_batch_job(db: AsyncSession, params: Dict, report) -> Dict:
+    project = await _get_or_fail(db, Project, params["project_id"])
+    epics = (await db.scalars(select(Epic).where(Epic.id.in_(params["epic_ids"])).order_by(Epic.id))).all()
+    created, failed, stats = await generation.generate_stories_for_epics(
+        db, project, epics, batch_size=params["batch_size"], use_cache=params.get("use_cache", True)
+    )
+    return {
+        "stories": {
+            epic_id: [UserStoryResponse.model_validate(story).model_dump(mode="json") for story in stories]
+            for epic_id, stories in created.items()
+        },
+        "failed": failed,
+        "stats": stats
+    }
+
+
+@job_queue.handler("refine_story")
+async def _refine_story_job(db: AsyncSession, params: Dict, report) -> Dict:
+    story = await _get_or_fail(db, UserStory, params["story_id"])
+    refined = await generation.refine_story(db, story, params["feedback"], use_cache=params.get("use_cache", True))
+    return UserStoryResponse.model_validate(refined).model_dump(mode="json")
+
+
+@job_queue.handler("refine_stories_batch")
+async def _refine_stories_batch_job(db: AsyncSession, params: Dict, report) -> Dict:
+    stories = (await db.scalars(select(UserStory).where(UserStory.id.in_(params["story_ids"])))).all()
+    stories = sorted(stories, key=lambda story: params["story_ids"].index(story.id))
+    created, failed, stats = await generation.refine_stories(
+        db, stories, params["feedback"], batch_size=params["batch_size"], use_cache=params.get("use_cache", True)
+    )
+    return {
+        "stories": {
+            story_id: UserStoryResponse.model_validate(story).model_dump(mode="json")
+            for story_id, story in created.items()
+        },
+        "failed": failed,
+        "stats": stats
+    }
+
+
+@job_queue.handler("plan_project")
+async def _plan_project_job(db: AsyncSession, params: Dict, report) -> Dict:
+    project = await _get_or_fail(db, Project, params["project_id"])
+    epics, failed = [], []
+    summary = {}
+    async for event in generation.plan_project(
+        db, project,
+        max_parallel=params.get("max_parallel"),
+        use_cache=params.get("use_cache", True),
+        batch_size=params.get("batch_size", 1)
+    ):
+        if event["event"] == "epics_generated":
+            epics = [dict(epic, stories=[]) for epic in event["epics"]]
+        elif event["event"] == "stories_generated":
+            next(epic for epic in epics if epic["id"] == event["epic_id"])["stories"] = event["stories"]
+        elif event["event"] == "epic_failed":
+            failed.append({"epic_id": event["epic_id"], "error": event["error"]})
+        elif event["event"] == "completed":
+            summary = event
+        if "completed" in event and "total" in event:
+            await report({"completed": event["completed"], "total": event["total"]})
+    return {"epics": epics, "failed": failed, "summary": summary}
\ No newline at end of file
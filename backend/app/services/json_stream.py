@@ -0,0 +1,59 @@
+# app/services/json_stream.py
+import json
+from typing import Any, List
+
+
+class JSONArrayStreamParser:
+    """Incrementally parse a streamed top-level JSON array.
+
+    Feed it text chunks as they arrive; each call returns the array elements
+    (objects or nested arrays) that closed within that chunk. Anything before
+    the opening bracket, such as a ```json fence, is skipped.
+    """
+
+    def __init__(self):
+        self.finished = False
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element: List[str] = []
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a chunk of text and return every element completed by it"""
+        items = []
+        for ch in chunk:
+            if self.finished:
+                break
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._depth >= 2:
+                self._element.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 2:
+                    self._element = [ch]
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    items.append(json.loads("".join(self._element)))
+                    self._element = []
+                elif self._depth == 0:
+                    self.finished = True
+        return items
\ No newline at end of file
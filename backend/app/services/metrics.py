@@ -0,0 +1,226 @@
+# app/services/metrics.py
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MODEL_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+# ASGI scope of the request being served, so SQL events can name its route
+request_scope: ContextVar[Optional[Dict]] = ContextVar("request_scope", default=None)
+
+# Route label for work done outside a request, such as background jobs
+BACKGROUND_ROUTE = "background"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic total per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {values[-1]}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(values[-2])}"
+            yield f"{self.name}_count{labels} {values[-1]}"
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List = []
+        # Callables returning {name: (documentation, value)} read at scrape time;
+        # names ending in _total are counters, the rest gauges
+        self._collectors: List[Callable[[], Dict[str, Tuple[str, float]]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Dict[str, Tuple[str, float]]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, (documentation, value) in gauges.items():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Time to serve a request, until the last body byte is sent",
+    ["method", "route", "status"]
+)
+gemini_call_duration = metrics.histogram(
+    "gemini_call_duration_seconds", "Gemini call latency, including time queued for a model slot",
+    ["method", "outcome"], MODEL_BUCKETS
+)
+gemini_prompt_tokens = metrics.counter(
+    "gemini_prompt_tokens_total", "Prompt tokens sent to Gemini (estimated when the response has no usage data)",
+    ["method"]
+)
+gemini_output_tokens = metrics.counter(
+    "gemini_output_tokens_total", "Output tokens received from Gemini (estimated when the response has no usage data)",
+    ["method"]
+)
+gemini_prompt_tokens_per_call = metrics.histogram(
+    "gemini_prompt_tokens_per_call", "Prompt tokens of each Gemini call (estimated when the response has no usage data)",
+    ["method"], TOKEN_BUCKETS
+)
+gemini_cache_hits = metrics.counter(
+    "gemini_cache_hits_total", "Gemini calls answered from the response cache", ["method"]
+)
+gemini_parse_failures = metrics.counter(
+    "gemini_parse_failures_total", "Gemini responses that were not valid JSON or not the expected shape",
+    ["method", "reason"]
+)
+gemini_fallbacks = metrics.counter(
+    "gemini_fallbacks_total", "Per-epic calls made because a batched story prompt missed the epic", ["method"]
+)
+db_query_duration = metrics.histogram(
+    "db_query_duration_seconds", "SQL statement execution time by the route that issued it",
+    ["route", "operation"], QUERY_BUCKETS
+)
+
+
+def current_route() -> str:
+    """Path template of the route serving this request, or BACKGROUND_ROUTE"""
+    scope = request_scope.get()
+    if scope is None:
+        return BACKGROUND_ROUTE
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def record_gemini_usage(method: str, response, prompt: str, text: str):
+    """Count prompt and output tokens, from the response's usage data when it has any"""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    prompt_tokens = prompt_tokens or max(1, len(prompt) // 4)
+    gemini_prompt_tokens.inc(prompt_tokens, method=method)
+    gemini_prompt_tokens_per_call.observe(prompt_tokens, method=method)
+    gemini_output_tokens.inc(output_tokens or max(1, len(text) // 4), method=method)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    db_query_duration.observe(time.perf_counter() - starts.pop(), route=current_route(), operation=operation)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_query_start"):
+        connection.info["metrics_query_start"].pop()
+
+
+def instrument_engine(engine: Engine):
+    """Time every statement the engine runs, attributed to the current route"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
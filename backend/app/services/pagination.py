@@ -0,0 +1,57 @@
+# app/services/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor this API did not issue"""
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just after the given row"""
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def paginate(query: Query, model, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """Return one page of query ordered by (created_at, id) and the cursor for the next.
+
+    Seeks past the last row seen instead of using OFFSET, so every page is an index
+    range scan no matter how deep the client has paged.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) > tuple_(created_at, row_id))
+
+    # Fetch one extra row to learn whether another page exists without a COUNT
+    rows = query.order_by(model.created_at, model.id).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def set_next_page_headers(request: Request, response: Response, next_cursor: Optional[str]):
+    """Expose the next cursor as X-Next-Cursor and an RFC 8288 Link header"""
+    if next_cursor is None:
+        return
+    response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
@@ -0,0 +1,143 @@
+# app/services/persistence.py
+from typing import Dict, List, Type
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.config import settings
+from app.models import Epic, UserStory
+from app.models.revisions import bump_project_revisions
+from app.services import dedup
+from app.services.profiling import span
+
+
+def commit_without_expiring(db: Session):
+    """Commit but keep loaded attributes, so returning the objects needs no refresh SELECT"""
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire_on_commit
+
+
+def bulk_create(db: Session, model: Type[Base], rows: List[Dict], commit: bool = True) -> List:
+    """Insert rows in one statement and return ORM objects with ids and defaults filled in.
+
+    Uses INSERT ... RETURNING where the dialect supports it for executemany (SQLite
+    >= 3.35, Postgres), so ids and generated columns come back in the same round trip.
+    Older SQLite falls back to a flush, which still avoids a SELECT per row.
+    """
+    if not rows:
+        return []
+
+    with span("insert"):
+        dialect = db.get_bind().dialect
+        if dialect.insert_executemany_returning:
+            # sort_by_parameter_order would make SQLite fall back to one INSERT per row;
+            # autoincrement ids follow the VALUES order, so sorting on them is equivalent
+            objects = sorted(
+                db.scalars(insert(model).returning(model), rows).all(),
+                key=lambda obj: obj.id
+            )
+        else:
+            objects = [model(**row) for row in rows]
+            db.add_all(objects)
+            db.flush()
+
+        # A bulk INSERT skips the flush hooks that keep project revisions current
+        if dialect.insert_executemany_returning:
+            bump_project_revisions(
+                db,
+                project_ids=[row["project_id"] for row in rows if "project_id" in row],
+                epic_ids=[row["epic_id"] for row in rows if "epic_id" in row]
+            )
+
+    if commit:
+        commit_without_expiring(db)
+    return objects
+
+
+def epic_rows(project_id: int, epics_data: List[Dict]) -> List[Dict]:
+    """Column values for generated epics"""
+    return [
+        {
+            "project_id": project_id,
+            "title": epic_data["title"],
+            "description": epic_data["description"]
+        }
+        for epic_data in epics_data
+    ]
+
+
+def story_rows(epic_id: int, stories_data: List[Dict]) -> List[Dict]:
+    """Column values for generated version-1 user stories"""
+    return [
+        {
+            "epic_id": epic_id,
+            "title": story_data["title"],
+            "user_story": story_data["user_story"],
+            "acceptance_criteria": story_data["acceptance_criteria"],
+            "priority": story_data.get("priority", "Medium"),
+            "story_points": story_data.get("story_points", 3),
+            "version": 1
+        }
+        for story_data in stories_data
+    ]
+
+
+def with_signatures(rows: List[Dict]) -> List[Dict]:
+    """Story rows with their MinHash signature added; CPU-bound, so callers on the event loop use a thread"""
+    signatures = dedup.minhash_signatures([
+        dedup.story_text(row["title"], row["user_story"], row["acceptance_criteria"]) for row in rows
+    ])
+    return [{**row, "minhash": dedup.signature_bytes(signature)} for row, signature in zip(rows, signatures)]
+
+
+def bulk_create_epics(db: Session, project_id: int, epics_data: List[Dict]) -> List[Epic]:
+    """Persist generated epics for a project in one statement"""
+    return bulk_create(db, Epic, epic_rows(project_id, epics_data))
+
+
+def index_stories(db: Session, stories: List[UserStory], rows: List[Dict]):
+    """Add the band keys of newly inserted stories to the duplicate lookup index"""
+    epic_ids = {story.epic_id for story in stories}
+    project_ids = dict(db.execute(select(Epic.id, Epic.project_id).where(Epic.id.in_(epic_ids))).all())
+    dedup.index_signatures(db, [
+        (story.id, project_ids[story.epic_id], row.get("minhash")) for story, row in zip(stories, rows)
+    ], replace=False)
+
+
+def flag_story_duplicates(db: Session, stories: List[UserStory], commit: bool = True):
+    """Point saved stories at the older stories of their project they nearly duplicate"""
+    if settings.dedup_enabled and stories:
+        epic_ids = {story.epic_id for story in stories}
+        project_ids = dict(db.execute(select(Epic.id, Epic.project_id).where(Epic.id.in_(epic_ids))).all())
+        by_project: Dict[int, List[UserStory]] = {}
+        for story in stories:
+            by_project.setdefault(project_ids[story.epic_id], []).append(story)
+        for project_id, project_stories in by_project.items():
+            dedup.flag_duplicates(db, project_id, project_stories)
+    if commit:
+        commit_without_expiring(db)
+
+
+def insert_stories(db: Session, rows: List[Dict], flag: bool = True) -> List[UserStory]:
+    """Insert story rows that carry their signatures (see with_signatures) in one transaction.
+
+    The new stories are indexed for duplicate lookups and, with flag, checked
+    against their project's older stories.
+    """
+    stories = bulk_create(db, UserStory, rows, commit=False)
+    if stories:
+        index_stories(db, stories, rows)
+        if flag:
+            flag_story_duplicates(db, stories, commit=False)
+    commit_without_expiring(db)
+    return stories
+
+
+def bulk_create_stories(db: Session, epic_id: int, stories_data: List[Dict], flag: bool = True) -> List[UserStory]:
+    """Persist generated user stories for an epic in one statement, flagging near-duplicates"""
+    return insert_stories(db, with_signatures(story_rows(epic_id, stories_data)), flag=flag)
@@ -0,0 +1,168 @@
+# app/services/profiling.py
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Spans reported in Server-Timing, in this order when present
+SPAN_DESCRIPTIONS = {
+    "prompt": "Prompt building",
+    "gemini": "Gemini round trips",
+    "parse": "JSON cleanup and parsing",
+    "insert": "Bulk inserts",
+    "db": "SQL execution",
+    "serialize": "Response serialization",
+}
+
+# Leaf frames from these modules are idle threads, not work
+_IDLE_MODULES = ("threading", "queue", "selectors", "concurrent.futures.thread", "asyncio.base_events")
+
+
+class RequestProfile:
+    """Span timings gathered while one request is served"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}  # name -> [seconds, count]
+        self.samples: Optional[Counter] = None  # Folded stacks, when sampling
+        self.endpoint_returned: Optional[float] = None  # Set by ProfiledRoute, starts the serialize span
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: each span's total in ms, then the time so far"""
+        with self._lock:
+            spans = dict(self.spans)
+        parts = [
+            f'{name};dur={spans[name][0] * 1000:.1f};desc="{SPAN_DESCRIPTIONS[name]} x{spans[name][1]}"'
+            for name in SPAN_DESCRIPTIONS if name in spans
+        ]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = {name: {"ms": round(seconds * 1000, 2), "count": count} for name, (seconds, count) in self.spans.items()}
+        return {"method": self.method, "path": self.path, "total_ms": round(self.elapsed() * 1000, 2), "spans": spans}
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Add the time spent in the block to the current request's profile, if it has one"""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+class StackSampler:
+    """Samples every thread's stack while any profiled request is in flight.
+
+    Samples go to every request active at the time, so concurrent requests see
+    each other's work; profile one request at a time for a clean picture.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self._active: List[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, profile: RequestProfile):
+        profile.samples = Counter()
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def detach(self, profile: RequestProfile):
+        with self._lock:
+            self._active.remove(profile)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._thread = None
+                    return
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_globals.get("__name__") in _IDLE_MODULES:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(names)))
+            for profile in active:
+                profile.samples.update(stacks)
+
+
+def dump_samples(profile: RequestProfile, directory: str) -> Optional[str]:
+    """Write a request's samples as folded stacks (flamegraph.pl / speedscope input)"""
+    if not profile.samples:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", profile.path).strip("-") or "root"
+    path = os.path.join(directory, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{profile.method}-{slug}.folded")
+    with open(path, "w") as f:
+        for stack, count in profile.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is not None and starts:
+        profile.add("db", time.perf_counter() - starts.pop())
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("profile_query_start"):
+        connection.info["profile_query_start"].pop()
+
+
+def profile_engine(engine: Engine):
+    """Add SQL execution time to the current request's profile"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
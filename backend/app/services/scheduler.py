@@ -0,0 +1,164 @@
+# app/services/scheduler.py
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+
+# HTTP statuses that mean "slow down / try again" rather than "this request is wrong"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def retryable_status(error: Exception) -> Optional[int]:
+    """Return the HTTP status of a throttling or transient server error, else None"""
+    # Imported here to keep google.api_core off the startup path; errors come after the SDK has loaded it
+    from google.api_core import exceptions as google_exceptions
+    if isinstance(error, google_exceptions.GoogleAPICallError):
+        code = error.code
+        if code in RETRYABLE_STATUS_CODES:
+            return code
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return 429
+    if isinstance(error, (google_exceptions.ServiceUnavailable, google_exceptions.DeadlineExceeded)):
+        return 503
+    return None
+
+
+class ModelCallScheduler:
+    """Admission control for every model call.
+
+    Calls wait for a token from a bucket refilled at the configured requests per
+    minute, then for a concurrency slot. The concurrency limit adapts AIMD-style:
+    it grows by 1/limit per success and halves on a 429/5xx, so throughput settles
+    at the quota ceiling. Throttled calls are retried with jittered exponential
+    backoff.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        burst: int,
+        min_concurrency: int,
+        max_concurrency: int,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float
+    ):
+        self.rate = requests_per_minute / 60.0
+        self.burst = burst
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._decreased_at = 0.0
+        self._loop = None
+        self._bucket_lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Condition] = None
+
+    def _bind_loop(self):
+        # asyncio primitives belong to one event loop; rebuild them if the loop changed
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._bucket_lock = asyncio.Lock()
+            self._slots = asyncio.Condition()
+
+    async def _take_token(self):
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a rate-limited concurrency slot for one model call"""
+        self._bind_loop()
+        self.waiting += 1
+        try:
+            await self._take_token()
+            async with self._slots:
+                await self._slots.wait_for(lambda: self.in_flight < max(self.min_concurrency, int(self.limit)))
+                self.in_flight += 1
+        finally:
+            self.waiting -= 1
+
+        try:
+            yield
+        except Exception as e:
+            if retryable_status(e) is not None:
+                self.throttled += 1
+                # Calls in flight together tend to fail together; back off once per burst
+                now = time.monotonic()
+                if now - self._decreased_at >= 1.0:
+                    self._decreased_at = now
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+            raise
+        else:
+            self.completed += 1
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        finally:
+            async with self._slots:
+                self.in_flight -= 1
+                self._slots.notify_all()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt (1-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a model call under the scheduler, retrying throttling and transient errors"""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot():
+                    return await call()
+            except Exception as e:
+                if retryable_status(e) is None or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(self.backoff_delay(attempt))
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "concurrency_limit": round(self.limit, 2),
+            "tokens_available": round(self._tokens, 2),
+            "requests_per_minute": round(self.rate * 60),
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures
+        }
+
+
+model_scheduler = ModelCallScheduler(
+    requests_per_minute=settings.gemini_requests_per_minute,
+    burst=settings.gemini_burst,
+    min_concurrency=settings.gemini_min_concurrency,
+    max_concurrency=settings.gemini_max_concurrency,
+    max_retries=settings.gemini_max_retries,
+    backoff_base=settings.gemini_backoff_base_seconds,
+    backoff_max=settings.gemini_backoff_max_seconds
+)
\ No newline at end of file
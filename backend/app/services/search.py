@@ -0,0 +1,215 @@
+# app/services/search.py
+import re
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+SEARCH_KINDS = ("project", "epic", "story")
+
+# FTS5 rowids pack the entity id and its kind, so a trigger can replace one
+# document with a rowid lookup instead of scanning the unindexed columns
+KIND_CODES = {"project": 1, "epic": 2, "story": 3}
+
+HIGHLIGHT_START, HIGHLIGHT_END = "<mark>", "</mark>"
+
+# Flatten the JSON list of acceptance criteria into searchable text
+_CRITERIA_TEXT = (
+    "coalesce((SELECT group_concat(value, ' ') FROM json_each("
+    "CASE WHEN json_valid({col}) THEN {col} ELSE '[]' END)), '')"
+)
+
+_SQLITE_DOCUMENTS = {
+    "project": {
+        "table": "projects",
+        "epic_id": "NULL",
+        "project_id": "{row}.id",
+        "title": "{row}.name",
+        "body": "coalesce({row}.description, '') || ' ' || coalesce({row}.context, '')",
+        "columns": "name, description, context",
+    },
+    "epic": {
+        "table": "epics",
+        "epic_id": "{row}.id",
+        "project_id": "{row}.project_id",
+        "title": "{row}.title",
+        "body": "coalesce({row}.description, '')",
+        "columns": "title, description, project_id",
+    },
+    "story": {
+        "table": "user_stories",
+        "epic_id": "{row}.epic_id",
+        "project_id": "(SELECT project_id FROM epics WHERE epics.id = {row}.epic_id)",
+        "title": "{row}.title",
+        "body": "coalesce({row}.user_story, '') || ' ' || " + _CRITERIA_TEXT.format(col="{row}.acceptance_criteria"),
+        "columns": "title, user_story, acceptance_criteria, epic_id",
+    },
+}
+
+# Postgres keeps expression GIN indexes current itself, so no triggers are needed
+_POSTGRES_VECTORS = {
+    "project": "to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || coalesce(context, ''))",
+    "epic": "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))",
+    "story": "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(user_story, '') || ' ' || coalesce(acceptance_criteria::text, ''))",
+}
+
+
+class SearchUnavailable(RuntimeError):
+    """Raised when the database has no full-text search support"""
+
+
+def _document_sql(kind: str, row: str) -> str:
+    """INSERT ... SELECT of the search document for the row aliased as row"""
+    doc = {key: value.replace("{row}", row) for key, value in _SQLITE_DOCUMENTS[kind].items()}
+    return (
+        "INSERT INTO search_index(rowid, kind, entity_id, epic_id, project_id, title, body) "
+        f"SELECT {row}.id * 4 + {KIND_CODES[kind]}, '{kind}', {row}.id, {doc['epic_id']}, "
+        f"{doc['project_id']}, {doc['title']}, {doc['body']}"
+    )
+
+
+def _delete_sql(kind: str, row: str) -> str:
+    return f"DELETE FROM search_index WHERE rowid = {row}.id * 4 + {KIND_CODES[kind]}"
+
+
+def _install_sqlite(engine: Engine):
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")).first()
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, entity_id UNINDEXED, epic_id UNINDEXED, project_id UNINDEXED, "
+            "title, body, tokenize = 'porter unicode61')"
+        ))
+        for kind, doc in _SQLITE_DOCUMENTS.items():
+            table = doc["table"]
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} "
+                f"BEGIN {_document_sql(kind, 'new')}; END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {doc['columns']} ON {table} "
+                f"BEGIN {_delete_sql(kind, 'old')}; {_document_sql(kind, 'new')}; END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} "
+                f"BEGIN {_delete_sql(kind, 'old')}; END"
+            ))
+        if not exists:
+            # Index rows written before the triggers existed
+            for kind, doc in _SQLITE_DOCUMENTS.items():
+                conn.execute(text(f"{_document_sql(kind, 'src')} FROM {doc['table']} AS src"))
+
+
+def _install_postgres(engine: Engine):
+    tables = {"project": "projects", "epic": "epics", "story": "user_stories"}
+    with engine.begin() as conn:
+        for kind, vector in _POSTGRES_VECTORS.items():
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{tables[kind]}_search ON {tables[kind]} USING GIN (({vector}))"
+            ))
+
+
+def install_search_index(engine: Engine):
+    """Create the full-text index and whatever keeps it in sync with the tables"""
+    try:
+        if engine.dialect.name == "sqlite":
+            _install_sqlite(engine)
+        elif engine.dialect.name == "postgresql":
+            _install_postgres(engine)
+    except OperationalError as e:
+        print(f"Error installing full-text search index: {e}")
+
+
+def fts5_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix"""
+    words = re.findall(r"\w+", query, flags=re.UNICODE)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _latest_story_condition(alias: str) -> str:
+    return (
+        f"NOT EXISTS (SELECT 1 FROM user_stories AS story, user_stories AS newer "
+        f"WHERE story.id = {alias} "
+        f"AND (newer.id = coalesce(story.root_story_id, story.id) OR newer.root_story_id = coalesce(story.root_story_id, story.id)) "
+        f"AND newer.version > story.version)"
+    )
+
+
+def _search_sqlite(db: Session, query: str, kinds: Sequence[str], project_id: Optional[int],
+                   latest_only: bool, limit: int, offset: int) -> List[Dict]:
+    match = fts5_query(query)
+    if match is None:
+        return []
+    filters = ["search_index MATCH :match", f"kind IN ({', '.join(repr(kind) for kind in kinds)})"]
+    params = {"match": match, "limit": limit, "offset": offset,
+              "start": HIGHLIGHT_START, "end": HIGHLIGHT_END}
+    if project_id is not None:
+        filters.append("project_id = :project_id")
+        params["project_id"] = project_id
+    if latest_only:
+        filters.append(f"(kind != 'story' OR {_latest_story_condition('entity_id')})")
+    # bm25 weights: a title hit counts three times a body hit
+    rows = db.execute(text(
+        "SELECT kind, entity_id, epic_id, project_id, "
+        "highlight(search_index, 4, :start, :end) AS title, "
+        "snippet(search_index, 5, :start, :end, '…', 16) AS snippet, "
+        "bm25(search_index, 0, 0, 0, 0, 3.0, 1.0) AS score "
+        f"FROM search_index WHERE {' AND '.join(filters)} "
+        "ORDER BY score, rowid LIMIT :limit OFFSET :offset"
+    ), params).mappings().all()
+    # bm25 is lower-is-better; report higher-is-better like ts_rank
+    return [dict(row, score=-row["score"]) for row in rows]
+
+
+def _search_postgres(db: Session, query: str, kinds: Sequence[str], project_id: Optional[int],
+                     latest_only: bool, limit: int, offset: int) -> List[Dict]:
+    selects = {
+        "project": ("projects", "NULL::integer", "id", "name", "coalesce(description, '') || ' ' || coalesce(context, '')"),
+        "epic": ("epics", "id", "project_id", "title", "coalesce(description, '')"),
+        "story": (
+            "user_stories", "epic_id", "(SELECT project_id FROM epics WHERE epics.id = user_stories.epic_id)",
+            "title", "coalesce(user_story, '') || ' ' || coalesce(acceptance_criteria::text, '')"
+        ),
+    }
+    parts = []
+    for kind in kinds:
+        table, epic_id, owner_id, title, body = selects[kind]
+        vector = _POSTGRES_VECTORS[kind]
+        where = [f"{vector} @@ websearch_to_tsquery('english', :query)"]
+        if project_id is not None:
+            where.append(f"{owner_id} = :project_id")
+        if kind == "story" and latest_only:
+            where.append(_latest_story_condition("user_stories.id"))
+        parts.append(
+            f"SELECT '{kind}' AS kind, id AS entity_id, {epic_id} AS epic_id, {owner_id} AS project_id, "
+            f"ts_headline('english', {title}, websearch_to_tsquery('english', :query), :title_options) AS title, "
+            f"ts_headline('english', {body}, websearch_to_tsquery('english', :query), :snippet_options) AS snippet, "
+            f"ts_rank({vector}, websearch_to_tsquery('english', :query)) AS score "
+            f"FROM {table} WHERE {' AND '.join(where)}"
+        )
+    tags = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}"
+    rows = db.execute(text(
+        " UNION ALL ".join(parts) + " ORDER BY score DESC, kind, entity_id LIMIT :limit OFFSET :offset"
+    ), {
+        "query": query, "project_id": project_id, "limit": limit, "offset": offset,
+        "title_options": f"{tags}, HighlightAll=true",
+        "snippet_options": f"{tags}, MaxWords=24, MinWords=8",
+    }).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def search(db: Session, query: str, kinds: Sequence[str] = SEARCH_KINDS, project_id: Optional[int] = None,
+           latest_only: bool = True, limit: int = 20, offset: int = 0) -> List[Dict]:
+    """Ranked full-text hits across projects, epics and stories, best first"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return _search_sqlite(db, query, kinds, project_id, latest_only, limit, offset)
+    if dialect == "postgresql":
+        return _search_postgres(db, query, kinds, project_id, latest_only, limit, offset)
+    raise SearchUnavailable(f"Full-text search is not supported on {dialect}")
@@ -0,0 +1,43 @@
+# app/services/singleflight.py
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key onto one in-flight coroutine.
+
+    The first caller for a key starts the work as a task; callers arriving while
+    it runs await the same task and get the same result (or exception). The task
+    is shielded, so a caller disconnecting does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def key(operation: str, entity_id: int, prompt: str) -> str:
+        """Key on the operation, the entity it targets and a hash of the rendered prompt"""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        return f"{operation}:{entity_id}:{digest}"
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn once for all concurrent callers with this key"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+# Shared by the generation routes and background jobs
+generation_flight = SingleFlight()
\ No newline at end of file
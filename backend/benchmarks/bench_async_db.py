@@ -0,0 +1,153 @@
+# benchmarks/bench_async_db.py - Run from backend/: python -m benchmarks.bench_async_db
+#
+# Mixed read and generate load against the app, run twice: once with generate
+# requests going through the AsyncSession route, once through a copy of the old
+# route that saved with a sync Session on the event loop. Reports requests/sec,
+# read latency and event loop lag for each.
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+# Take the quota limiter out of the picture; this measures the database path
+os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("GEMINI_BURST", "1000")
+os.environ.setdefault("GEMINI_MAX_CONCURRENCY", "64")
+
+import httpx
+
+from app.database import SessionLocal, engine
+from app.main import app
+from app.migrations import init_schema
+from app.models import Project, Epic, UserStory
+from app.services.gemini import gemini_service
+from app.services.generation import story_prompt_args
+from app.services.persistence import bulk_create_stories
+
+# The app creates its schema at startup, which these clients do not run
+init_schema(engine)
+
+DURATION = 5.0
+READERS = 8
+GENERATORS = 4
+MODEL_LATENCY = 0.05
+STORIES_PER_CALL = 25
+SEED_STORIES = 200
+
+STORIES_JSON = "[" + ",".join(
+    '{"title": "Story %d", "user_story": "As a user, I want x so that y", '
+    '"acceptance_criteria": ["Given a, when b, then c", "Given d, when e, then f"], '
+    '"priority": "Medium", "story_points": 3}' % i
+    for i in range(STORIES_PER_CALL)
+) + "]"
+
+
+class SlowModel:
+    """Blocking stand-in for genai.GenerativeModel with a fixed round trip"""
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(MODEL_LATENCY)
+        return type("Response", (), {"text": STORIES_JSON})()
+
+
+@app.post("/bench/sync-generate/{epic_id}")
+async def sync_generate(epic_id: int):
+    """The generate-stories route as it was: sync Session calls made on the event loop"""
+    db = SessionLocal()
+    try:
+        epic = db.query(Epic).filter(Epic.id == epic_id).first()
+        stories_data = await gemini_service.generate_user_stories(
+            **story_prompt_args(epic, epic.project), use_cache=False
+        )
+        return {"created": len(bulk_create_stories(db, epic_id, stories_data))}
+    finally:
+        db.close()
+
+
+def seed(epic_count: int):
+    db = SessionLocal()
+    project = Project(name="Bench", app_type="benchmark", description="Bench", context="Benchmark project")
+    db.add(project)
+    db.flush()
+    epics = [Epic(project_id=project.id, title=f"Epic {i}", description="Bench epic") for i in range(epic_count)]
+    db.add_all(epics)
+    db.flush()
+    db.add_all(
+        UserStory(epic_id=epics[0].id, title=f"Story {i}", user_story="As a user...", priority="Medium",
+                  story_points=3, acceptance_criteria=["Given a, when b, then c"], version=1)
+        for i in range(SEED_STORIES)
+    )
+    db.commit()
+    ids = [epic.id for epic in epics]
+    db.close()
+    return ids
+
+
+async def run_load(client: httpx.AsyncClient, read_epic: int, generate_urls):
+    deadline = time.perf_counter() + DURATION
+    read_latencies, generated, lags = [], [0], []
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            (await client.get(f"/api/epics/{read_epic}/stories?limit=100")).raise_for_status()
+            read_latencies.append(time.perf_counter() - start)
+
+    async def generator(url):
+        while time.perf_counter() < deadline:
+            (await client.post(url)).raise_for_status()
+            generated[0] += 1
+
+    async def lag_probe():
+        # How late a 10ms timer fires shows how long the loop was blocked
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    await asyncio.gather(lag_probe(), *(reader() for _ in range(READERS)), *(generator(url) for url in generate_urls))
+    lags.sort()
+    read_latencies.sort()
+    return {
+        "reads_per_sec": len(read_latencies) / DURATION,
+        "generates_per_sec": generated[0] / DURATION,
+        "read_p95_ms": read_latencies[int(len(read_latencies) * 0.95)] * 1000,
+        "loop_lag_p95_ms": lags[int(len(lags) * 0.95)] * 1000,
+        "loop_lag_max_ms": lags[-1] * 1000,
+    }
+
+
+async def main():
+    gemini_service.model = SlowModel()
+    epic_ids = seed(GENERATORS + 1)
+    read_epic, generate_epics = epic_ids[0], epic_ids[1:]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        results = {
+            "sync session": await run_load(client, read_epic, [f"/bench/sync-generate/{e}" for e in generate_epics]),
+            "async session": await run_load(
+                client, read_epic, [f"/api/epics/{e}/generate-stories?use_cache=false" for e in generate_epics]
+            ),
+        }
+
+    print(f"{READERS} readers + {GENERATORS} generators for {DURATION:.0f}s, "
+          f"{STORIES_PER_CALL} stories per generation, {MODEL_LATENCY * 1000:.0f}ms model latency")
+    print(f"{'':>14} {'reads/s':>8} {'generates/s':>12} {'read p95 ms':>12} {'loop lag p95 ms':>16} {'loop lag max ms':>16}")
+    for label, r in results.items():
+        print(f"{label:>14} {r['reads_per_sec']:>8.1f} {r['generates_per_sec']:>12.1f} {r['read_p95_ms']:>12.1f} "
+              f"{r['loop_lag_p95_ms']:>16.1f} {r['loop_lag_max_ms']:>16.1f}")
+    baseline, current = results["sync session"], results["async session"]
+    total = lambda r: r["reads_per_sec"] + r["generates_per_sec"]
+    print(f"total requests/sec: {total(baseline):.1f} -> {total(current):.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
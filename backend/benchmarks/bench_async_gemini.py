@@ -0,0 +1,88 @@
+# benchmarks/bench_async_gemini.py - Run from backend/: python -m benchmarks.bench_async_gemini
+#
+# Fires concurrent generate-stories requests at the app with a slow stand-in
+# model and checks that they overlap instead of queueing behind each other.
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+
+import httpx
+
+from app.database import SessionLocal, engine
+from app.main import app
+from app.migrations import init_schema
+from app.models import Epic
+from app.services.gemini import gemini_service
+
+# The app creates its schema at startup, which these clients do not run
+init_schema(engine)
+
+MODEL_LATENCY = 0.5
+CONCURRENCY = 8
+
+STORIES_JSON = """```json
+[{"title": "Story", "user_story": "As a user, I want x so that y",
+  "acceptance_criteria": ["Given a, when b, then c"], "priority": "Medium", "story_points": 3}]
+```"""
+
+
+class SlowModel:
+    """Blocking stand-in for genai.GenerativeModel with a fixed round trip"""
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(MODEL_LATENCY)
+        return type("Response", (), {"text": STORIES_JSON})()
+
+
+async def main():
+    gemini_service.model = SlowModel()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        project = (await client.post("/api/projects/", json={
+            "name": "Bench", "app_type": "benchmark", "context": "Benchmark project"
+        })).json()
+        # Seed epics directly so the benchmark only measures story generation
+        db = SessionLocal()
+        epics = [
+            Epic(project_id=project["id"], title=f"Epic {i}", description="Bench epic")
+            for i in range(CONCURRENCY)
+        ]
+        db.add_all(epics)
+        db.commit()
+        epic_ids = [epic.id for epic in epics]
+        db.close()
+
+        async def generate(epic_id):
+            response = await client.post(f"/api/epics/{epic_id}/generate-stories")
+            response.raise_for_status()
+
+        async def probe():
+            # A cheap route issued mid-generation must not wait for the model
+            await asyncio.sleep(MODEL_LATENCY / 4)
+            start = time.perf_counter()
+            (await client.get("/")).raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(probe(), *(generate(epic_id) for epic_id in epic_ids))
+        wall = time.perf_counter() - start
+
+    serial = MODEL_LATENCY * CONCURRENCY
+    print(f"{CONCURRENCY} concurrent generations at {MODEL_LATENCY:.2f}s model latency")
+    print(f"  wall time:          {wall:.2f}s (serial would be {serial:.2f}s)")
+    print(f"  overlap factor:     {serial / wall:.1f}x")
+    print(f"  GET / during load:  {results[0] * 1000:.1f}ms")
+    return 0 if wall < serial / 2 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
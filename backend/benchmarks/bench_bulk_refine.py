@@ -0,0 +1,108 @@
+# benchmarks/bench_bulk_refine.py - Run from backend/: python -m benchmarks.bench_bulk_refine
+#
+# Applies the same feedback to every story of an epic, once through one
+# POST /api/stories/{id}/refine per story and once through POST /api/stories/refine,
+# and compares model calls, prompt tokens, story INSERT statements and wall time.
+
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+os.environ.setdefault("GEMINI_BACKEND", "fake")
+os.environ.setdefault("FAKE_GEMINI_LATENCY_MS", "300")
+os.environ.setdefault("FAKE_GEMINI_LATENCY_JITTER_MS", "0")
+os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "60000")  # Keep the rate limiter out of the timings
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import SessionLocal, engine, async_engine
+from app.main import app
+from app.migrations import init_schema
+from app.models import Epic, Project
+from app.services.gemini import gemini_service
+from app.services.persistence import bulk_create_stories
+
+# The app creates its schema at startup, which these clients do not run
+init_schema(engine)
+
+STORY_COUNT = 20
+FEEDBACK = "Add error-handling acceptance criteria"
+
+
+class RecordingModel:
+    """Fake model that remembers the prompt size of every call"""
+
+    def __init__(self, model):
+        self.model = model
+        self.prompt_tokens = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompt_tokens.append(gemini_service.estimate_tokens(prompt))
+        return self.model.generate_content(prompt, **kwargs)
+
+
+def seed() -> list:
+    db = SessionLocal()
+    project = Project(name="Bench", app_type="benchmark", description="Bench", context="Bench project")
+    db.add(project)
+    db.flush()
+    epic = Epic(project_id=project.id, title="Checkout", description="Paying for an order")
+    db.add(epic)
+    db.commit()
+    stories = bulk_create_stories(db, epic.id, [
+        {"title": f"Checkout step {i}", "user_story": f"As a shopper, I want step {i} so that I can pay",
+         "acceptance_criteria": ["Given a cart, when I pay, then the order is placed"], "priority": "High",
+         "story_points": 3}
+        for i in range(STORY_COUNT)
+    ])
+    ids = [story.id for story in stories]
+    db.close()
+    return ids
+
+
+def main():
+    recorder = RecordingModel(gemini_service.model)
+    gemini_service.model = recorder
+    inserts = []
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO USER_STORIES"):
+            inserts.append(statement)
+
+    client = TestClient(app)
+
+    results = {}
+    for mode in ("per story", "bulk"):
+        ids = seed()
+        recorder.prompt_tokens.clear()
+        inserts.clear()
+        start = time.perf_counter()
+        if mode == "bulk":
+            response = client.post("/api/stories/refine", json={"story_ids": ids, "feedback": FEEDBACK})
+            response.raise_for_status()
+            refined = len(response.json()["stories"])
+        else:
+            refined = 0
+            for story_id in ids:
+                client.post(f"/api/stories/{story_id}/refine", params={"feedback": FEEDBACK}).raise_for_status()
+                refined += 1
+        results[mode] = (time.perf_counter() - start, len(recorder.prompt_tokens), sum(recorder.prompt_tokens), len(inserts))
+        wall, calls, tokens, insert_count = results[mode]
+        print(f"{mode:>9}: {refined} stories refined in {wall:5.2f}s, {calls:2d} model calls, "
+              f"{tokens:6,} prompt tokens, {insert_count:2d} INSERT statements")
+
+    speedup = results["per story"][0] / results["bulk"][0]
+    print(f"\nBulk refine is {speedup:.1f}x faster with {results['per story'][1] / results['bulk'][1]:.0f}x fewer model calls")
+    return 0 if results["bulk"][1] < results["per story"][1] and results["bulk"][3] == 1 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
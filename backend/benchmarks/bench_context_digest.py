@@ -0,0 +1,107 @@
+# benchmarks/bench_context_digest.py - Run from backend/: python -m benchmarks.bench_context_digest
+#
+# Generates epics and one epic's stories for projects whose context grows from
+# a paragraph to a few hundred pages, with the context embedded verbatim and
+# as the stored digest, and checks that prompt tokens per call stay flat with
+# the digest while they grow with the context verbatim.
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+os.environ.setdefault("GEMINI_BACKEND", "fake")
+os.environ.setdefault("FAKE_GEMINI_LATENCY_MS", "0")
+os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "60000")  # Keep the rate limiter out of the timings
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.main import app
+from app.migrations import init_schema
+from app.models import Project
+from app.services.gemini import gemini_service
+
+# The app creates its schema at startup, which these clients do not run
+init_schema(engine)
+
+CONTEXT_TOKENS = [200, 2_000, 20_000, 200_000]
+
+# Prompt tokens may grow this much from the smallest to the largest context with the digest
+FLAT_TOLERANCE = 1.5
+
+TOPICS = ["offline map tiles", "parcel boundaries", "GPS accuracy", "field surveys", "photo uploads",
+          "role-based access", "audit trails", "shapefile export", "sync conflicts", "county dashboards"]
+TEMPLATES = ["Surveyors need {} to work reliably in remote areas.", "The system must support {} for county staff.",
+             "Managers asked for {} in the next release.", "Legacy tooling handles {} poorly today."]
+
+
+def make_context(tokens: int, rng: random.Random) -> str:
+    paragraphs, size = [], 0
+    while size < tokens * 4:
+        paragraph = " ".join(rng.choice(TEMPLATES).format(rng.choice(TOPICS)) for _ in range(5))
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 1
+    return "\n".join(paragraphs)
+
+
+class RecordingModel:
+    """Fake model that remembers the prompt size of every call"""
+
+    def __init__(self, model):
+        self.model = model
+        self.prompt_tokens = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompt_tokens.append(gemini_service.estimate_tokens(prompt))
+        return self.model.generate_content(prompt, **kwargs)
+
+
+def run(client: TestClient, recorder: RecordingModel, context: str, digest_budget: int):
+    settings.context_digest_max_tokens = digest_budget
+    recorder.prompt_tokens.clear()
+    project = client.post("/api/projects/", json={
+        "name": "Survey", "app_type": "geospatial", "description": "Field survey app", "context": context
+    }).json()
+    start = time.perf_counter()
+    epics = client.post(f"/api/projects/{project['id']}/generate-epics?use_cache=false").json()
+    epics_seconds = time.perf_counter() - start
+    client.post(f"/api/epics/{epics[0]['id']}/generate-stories?use_cache=false").raise_for_status()
+    db = SessionLocal()
+    stored = db.get(Project, project["id"]).context_digest is not None
+    db.close()
+    return recorder.prompt_tokens[0], recorder.prompt_tokens[1], epics_seconds, stored
+
+
+def main():
+    recorder = RecordingModel(gemini_service.model)
+    gemini_service.model = recorder
+    client = TestClient(app)
+    rng = random.Random(7)
+    budget = settings.context_digest_max_tokens
+
+    print(f"Prompt tokens per call, context verbatim vs digested to {budget} tokens")
+    print(f"{'context':>9} {'epics verbatim':>15} {'epics digest':>13} {'stories digest':>15} {'epics call':>11}  stored")
+    digest_tokens = []
+    for tokens in CONTEXT_TOKENS:
+        context = make_context(tokens, rng)
+        verbatim, _, _, _ = run(client, recorder, context, digest_budget=10 ** 9)
+        epics_prompt, stories_prompt, seconds, stored = run(client, recorder, context, digest_budget=budget)
+        digest_tokens.append(epics_prompt)
+        print(f"{tokens:>9,} {verbatim:>15,} {epics_prompt:>13,} {stories_prompt:>15,} {seconds * 1000:>9.0f}ms  {stored}")
+
+    settings.context_digest_max_tokens = budget
+    growth = max(digest_tokens) / min(digest_tokens)
+    print(f"\nDigest prompt growth from smallest to largest context: {growth:.2f}x")
+    return 0 if growth <= FLAT_TOLERANCE else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# benchmarks/bench_dedup.py - Run from backend/: python -m benchmarks.bench_dedup
+#
+# Builds 100k synthetic stories with planted near-duplicates and times MinHash
+# signing and LSH banding, checking that planted pairs are found without the
+# ~5e9 pairwise comparisons a naive scan would need. Then saves stories one at
+# a time into a project holding 20k of them, the way a streamed generation
+# does, and times the save with duplicate flagging against the band index.
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+
+from app.database import SessionLocal, engine
+from app.migrations import init_schema
+from app.models import Epic, Project
+from app.services.dedup import minhash_signatures, similar_pairs
+from app.services.persistence import bulk_create_stories, insert_stories, story_rows, with_signatures
+
+PROJECT_STORIES = 20_000
+SAVES = 20
+
+STORIES = 100_000
+PLANTED = 1_000
+WORDS_PER_STORY = 40
+VOCABULARY = [f"word{i}" for i in range(5_000)]
+
+
+def make_corpus():
+    rng = random.Random(7)
+    texts = [" ".join(rng.choices(VOCABULARY, k=WORDS_PER_STORY)) for _ in range(STORIES - PLANTED)]
+    planted = []
+    for _ in range(PLANTED):
+        # Copy an existing story and change one word, like a regenerated story
+        source = rng.randrange(len(texts))
+        words = texts[source].split()
+        words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+        planted.append((source, len(texts)))
+        texts.append(" ".join(words))
+    return texts, planted
+
+
+def story(text: str) -> dict:
+    return {"title": text[:40], "user_story": text, "acceptance_criteria": []}
+
+
+def time_single_saves(texts) -> tuple:
+    """Median seconds to save and flag one story in a large project, and whether copies were flagged"""
+    init_schema(engine)
+    db = SessionLocal()
+    project = Project(name="Bench", app_type="benchmark", description="Bench", context="Bench")
+    db.add(project)
+    db.flush()
+    epic = Epic(project_id=project.id, title="Bench", description="Bench")
+    db.add(epic)
+    db.commit()
+    for start in range(0, PROJECT_STORIES, 5_000):
+        rows = story_rows(epic.id, [story(text) for text in texts[start:start + 5_000]])
+        insert_stories(db, with_signatures(rows), flag=False)
+
+    rng = random.Random(11)
+    timings, flagged = [], 0
+    for i in range(SAVES):
+        # Alternate fresh stories and near-copies of a stored one
+        copy = i % 2 == 1
+        if copy:
+            words = texts[rng.randrange(PROJECT_STORIES)].split()
+            words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+        else:
+            words = rng.choices(VOCABULARY, k=WORDS_PER_STORY)
+        start = time.perf_counter()
+        saved = bulk_create_stories(db, epic.id, [story(" ".join(words))])[0]
+        timings.append(time.perf_counter() - start)
+        flagged += copy and saved.duplicate_of_id is not None
+    db.close()
+    return statistics.median(timings), flagged / (SAVES // 2)
+
+
+def main():
+    texts, planted = make_corpus()
+
+    start = time.perf_counter()
+    signatures = minhash_signatures(texts)
+    sign_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pairs, _ = similar_pairs(signatures, threshold=0.8)
+    lsh_time = time.perf_counter() - start
+
+    found = {tuple(pair) for pair in pairs.tolist()}
+    recall = sum(pair in found for pair in planted) / len(planted)
+    false_positives = len(found - set(planted))
+    print(f"{STORIES} stories, {PLANTED} planted near-duplicates")
+    print(f"  signatures:       {sign_time:.2f}s ({STORIES / sign_time:,.0f} stories/s)")
+    print(f"  LSH + verify:     {lsh_time:.2f}s")
+    print(f"  recall:           {recall:.1%}")
+    print(f"  other pairs:      {false_positives}")
+
+    save_time, flagged = time_single_saves(texts)
+    print(f"{PROJECT_STORIES} stories in one project, {SAVES} single-story saves")
+    print(f"  save + flag:      {save_time * 1000:.1f}ms median")
+    print(f"  copies flagged:   {flagged:.0%}")
+    return 0 if recall >= 0.95 and flagged >= 0.9 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# benchmarks/bench_export.py - Run from backend/: python -m benchmarks.bench_export
+#
+# Exports projects of growing size in every format and checks that peak Python
+# memory stays flat while the output grows, and that the first chunk (the CSV
+# header or project line) is ready long before the export has finished.
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+
+from sqlalchemy import insert
+
+from app.database import SessionLocal, engine
+from app.migrations import init_schema
+from app.models import Project, Epic, UserStory
+from app.services.export import EXPORT_FORMATS, export_project
+
+SIZES = [2_000, 20_000, 80_000]
+STORIES_PER_EPIC = 100
+
+# Peak memory may grow this much from the smallest to the largest project
+FLAT_TOLERANCE = 1.5
+
+
+def seed(story_count: int) -> int:
+    db = SessionLocal()
+    project = Project(name="Bench", app_type="benchmark", description="Bench", context="Bench")
+    db.add(project)
+    db.flush()
+    epic_ids = [
+        db.execute(insert(Epic).values(project_id=project.id, title=f"Epic {e}", description="Bench epic")
+                   .returning(Epic.id)).scalar()
+        for e in range(story_count // STORIES_PER_EPIC)
+    ]
+    db.execute(insert(UserStory.__table__), [
+        {
+            "epic_id": epic_ids[s // STORIES_PER_EPIC], "title": f"Story {s}",
+            "user_story": "As a user I want to export my backlog so that I can import it elsewhere",
+            "acceptance_criteria": ["Given a project, when exported, then every story is present", "Rows stream"],
+            "priority": "Medium", "story_points": 3, "version": 1
+        }
+        for s in range(story_count)
+    ])
+    db.commit()
+    project_id = project.id
+    db.close()
+    return project_id
+
+
+def measure(project_id: int, export_format: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_chunk = None
+    total_bytes = 0
+    for chunk in export_project(project_id, export_format):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_chunk, elapsed, total_bytes, peak
+
+
+def main():
+    init_schema(engine)
+    projects = {size: seed(size) for size in SIZES}
+
+    ok = True
+    for export_format in EXPORT_FORMATS:
+        peaks = []
+        print(f"{export_format}:")
+        for size, project_id in projects.items():
+            first_chunk, elapsed, total_bytes, peak = measure(project_id, export_format)
+            peaks.append(peak)
+            print(f"  {size:>6} stories: first chunk {first_chunk * 1000:6.1f}ms, total {elapsed:5.2f}s, "
+                  f"{total_bytes / 1e6:6.1f} MB out, peak memory {peak / 1e6:5.2f} MB")
+        if peaks[-1] > peaks[0] * FLAT_TOLERANCE:
+            print(f"  peak memory grew {peaks[-1] / peaks[0]:.1f}x with the project")
+            ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
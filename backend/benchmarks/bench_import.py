@@ -0,0 +1,139 @@
+# benchmarks/bench_import.py - Run from backend/: python -m benchmarks.bench_import
+#
+# Imports a generated JSONL backlog through the chunked importer and compares
+# its rate with creating the same records one object and commit at a time, as
+# a migration through POST /api/projects/ and friends would. Then checks that
+# the app's own exports import back without losing refined stories.
+
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+
+from app.database import SessionLocal, engine
+from app.migrations import init_schema
+from app.models import Project, Epic, UserStory
+from app.services.export import export_project
+from app.services.importer import import_records
+
+EPICS = 200
+STORIES_PER_EPIC = 100
+ONE_AT_A_TIME_SAMPLE = 1_000
+
+# Round-trip project: stories refined this many times, each version a record
+ROUND_TRIP_STORIES = 20
+ROUND_TRIP_VERSIONS = 3
+
+
+def backlog() -> bytes:
+    lines = [{"type": "project", "id": 1, "name": "Migrated", "app_type": "web app", "context": "Imported"}]
+    for e in range(EPICS):
+        lines.append({"type": "epic", "id": e, "project_id": 1, "title": f"Epic {e}", "description": "Imported"})
+        for s in range(STORIES_PER_EPIC):
+            lines.append({
+                "type": "story", "id": e * STORIES_PER_EPIC + s, "epic_id": e, "title": f"Story {e}.{s}",
+                "user_story": f"As user {s} I want feature {e} so that backlog {e * s} migrates",
+                "acceptance_criteria": ["Given an import, when it runs, then the story exists"],
+                "priority": "Medium", "story_points": 3
+            })
+    return "\n".join(json.dumps(line) for line in lines).encode()
+
+
+def one_at_a_time(count: int) -> float:
+    db = SessionLocal()
+    project = Project(name="Slow", app_type="web app", context="Imported")
+    db.add(project)
+    db.commit()
+    epic = Epic(project_id=project.id, title="Epic", description="Imported")
+    db.add(epic)
+    db.commit()
+    start = time.perf_counter()
+    for s in range(count):
+        db.add(UserStory(epic_id=epic.id, title=f"Story {s}", user_story="As a user I want it",
+                         acceptance_criteria=["Given, when, then"], priority="Medium", story_points=3, version=1))
+        db.commit()
+    elapsed = time.perf_counter() - start
+    db.close()
+    return count / elapsed
+
+
+def refined_backlog() -> bytes:
+    lines = [{"type": "project", "id": 1, "name": "Refined", "app_type": "web app", "context": "Round trip"},
+             {"type": "epic", "id": 1, "project_id": 1, "title": "Epic", "description": "Round trip"}]
+    for s in range(ROUND_TRIP_STORIES):
+        root = s * ROUND_TRIP_VERSIONS
+        for v in range(1, ROUND_TRIP_VERSIONS + 1):
+            lines.append({
+                "type": "story", "id": root + v - 1, "epic_id": 1, "title": f"Story {s} v{v}",
+                "user_story": f"As user {s} I want version {v}", "acceptance_criteria": ["Given, when, then"],
+                "priority": "Medium", "version": v, "parent_story_id": root + v - 2 if v > 1 else None,
+                "root_story_id": root if v > 1 else None
+            })
+    return "\n".join(json.dumps(line) for line in lines).encode()
+
+
+def round_trip() -> list:
+    """Export a project with refined stories and import each export back; returns failures"""
+    db = SessionLocal()
+    report = import_records(db, io.BytesIO(refined_backlog()), "jsonl")
+    source_id = report["project_ids"][0]
+    failures = []
+    for export_format, include_history in (("jsonl", False), ("jsonl", True), ("csv", False)):
+        data = "".join(export_project(source_id, export_format, include_history)).encode()
+        target = None
+        if export_format == "csv":
+            target = Project(name="CSV target", app_type="web app", context="Round trip")
+            db.add(target)
+            db.commit()
+            target = target.id
+        report = import_records(db, io.BytesIO(data), export_format, project_id=target)
+        target = target or report["project_ids"][0]
+        stories = (db.query(UserStory.title, UserStory.version, UserStory.root_story_id)
+                   .join(Epic).filter(Epic.project_id == target).all())
+        expected = ROUND_TRIP_STORIES * (ROUND_TRIP_VERSIONS if include_history else 1)
+        name = f"{export_format}{' with history' if include_history else ''}"
+        if report["error_count"] or len(stories) != expected:
+            failures.append(f"{name}: {len(stories)} of {expected} stories, errors {report['errors'][:3]}")
+        elif not include_history and {(title.split(" v")[1], version) for title, version, _ in stories} != {
+                (str(ROUND_TRIP_VERSIONS), ROUND_TRIP_VERSIONS)}:
+            failures.append(f"{name}: latest versions not kept")
+        elif include_history and sum(root is not None for _, _, root in stories) != ROUND_TRIP_STORIES * (ROUND_TRIP_VERSIONS - 1):
+            failures.append(f"{name}: lineage not rebuilt")
+    db.close()
+    return failures
+
+
+def main():
+    init_schema(engine)
+    data = backlog()
+    records = 1 + EPICS * (1 + STORIES_PER_EPIC)
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    report = import_records(db, io.BytesIO(data), "jsonl")
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    slow_rate = one_at_a_time(ONE_AT_A_TIME_SAMPLE)
+    print(f"{records} records ({len(data) / 1e6:.1f} MB)")
+    print(f"  chunked import: {elapsed:.2f}s ({records / elapsed:,.0f} records/s), created {report['created']}")
+    print(f"  one at a time:  {slow_rate:,.0f} records/s (sampled over {ONE_AT_A_TIME_SAMPLE})")
+    print(f"  speedup:        {records / elapsed / slow_rate:.0f}x")
+
+    failures = round_trip()
+    for failure in failures:
+        print(f"  FAIL round trip {failure}")
+    if not failures:
+        print("  round trip:     jsonl, jsonl with history and csv exports import back whole")
+    return 0 if report["error_count"] == 0 and report["created"]["stories"] == EPICS * STORIES_PER_EPIC and not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+# benchmarks/bench_load.py - Run from backend/: python -m benchmarks.bench_load [options]
+#
+# Load test through the real routes without spending Gemini quota: the app runs
+# in-process with the fake model backend (or point --base-url at a server started
+# with GEMINI_BACKEND=fake). A weighted mix of read and generate requests runs for
+# a fixed time; throughput, p50/p95/p99 latency per scenario and database write
+# rates (from /metrics) are printed and saved as JSON. --compare checks a run
+# against an earlier result and fails on a throughput or p95 regression.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Relative weights of the request mix; the last four make model calls
+SCENARIOS = {
+    "list_projects": 10,
+    "project_tree": 25,
+    "epic_stories": 20,
+    "generate_stories": 15,
+    "stream_stories": 5,
+    "refine_story": 15,
+    "create_project": 10,
+}
+
+WRITE_OPERATIONS = ("INSERT", "UPDATE", "DELETE")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against the real routes")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--base-url", help="Test a running server instead of an in-process app")
+    parser.add_argument("--seed-projects", type=int, default=3)
+    parser.add_argument("--use-cache", action="store_true", help="Let repeated prompts hit the LLM cache")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake model mean latency")
+    parser.add_argument("--jitter-ms", type=float, default=150, help="Fake model latency spread")
+    parser.add_argument("--distribution", default="lognormal", choices=("fixed", "uniform", "lognormal"))
+    parser.add_argument("--malformed-rate", type=float, default=0.02, help="Share of truncated JSON responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="Share of 429 responses")
+    parser.add_argument("--requests-per-minute", type=int, default=6000, help="App-side model quota")
+    parser.add_argument("--name", default="load", help="Label for the saved result")
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="Earlier result JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Fail when throughput drops or p95 grows by more than this fraction")
+    return parser.parse_args(argv)
+
+
+def configure_in_process(args):
+    """Point the app at a scratch database and the fake model, before it is imported"""
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'app.db')}")
+    os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir, "llm_cache.db"))
+    os.environ["GEMINI_BACKEND"] = "fake"
+    os.environ["FAKE_GEMINI_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_GEMINI_LATENCY_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["FAKE_GEMINI_LATENCY_DISTRIBUTION"] = args.distribution
+    os.environ["FAKE_GEMINI_MALFORMED_RATE"] = str(args.malformed_rate)
+    os.environ["FAKE_GEMINI_THROTTLE_RATE"] = str(args.throttle_rate)
+    os.environ.setdefault("FAKE_GEMINI_SEED", "7")
+    os.environ["GEMINI_REQUESTS_PER_MINUTE"] = str(args.requests_per_minute)
+    os.environ.setdefault("GEMINI_BURST", str(max(10, args.requests_per_minute // 60)))
+    os.environ.setdefault("GEMINI_BACKOFF_BASE_SECONDS", "0.1")
+    os.environ.setdefault("GEMINI_BACKOFF_MAX_SECONDS", "2")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, in milliseconds"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))] * 1000, 1)
+
+
+def write_counts(metrics_text: str) -> Dict[str, float]:
+    """INSERT/UPDATE/DELETE statement counts from the /metrics SQL histogram"""
+    counts = defaultdict(float)
+    for line in metrics_text.splitlines():
+        if line.startswith("db_query_duration_seconds_count{"):
+            labels, value = line.rsplit(" ", 1)
+            for operation in WRITE_OPERATIONS:
+                if f'operation="{operation}"' in labels:
+                    counts[operation] += float(value)
+    return dict(counts)
+
+
+class LoadTest:
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.random = random.Random(1)
+        self.project_ids: List[int] = []
+        self.epic_ids: List[int] = []
+        self.story_ids: List[int] = []
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.stories_created = 0
+
+    @property
+    def cache(self) -> str:
+        return "true" if self.args.use_cache else "false"
+
+    async def seed(self):
+        for i in range(self.args.seed_projects):
+            await self.create_project(f"Seed {i}")
+        for epic_id in list(self.epic_ids):
+            response = await self.client.post(f"/api/epics/{epic_id}/generate-stories?use_cache={self.cache}")
+            if response.status_code == 200:
+                self.story_ids.extend(story["id"] for story in response.json())
+        if not self.story_ids:
+            raise RuntimeError("Seeding created no stories; is the server using GEMINI_BACKEND=fake?")
+
+    async def create_project(self, name: str):
+        response = await self.client.post("/api/projects/", json={
+            "name": name, "description": "Load test project", "app_type": "web application",
+            "context": "A marketplace where small shops sell handmade goods"
+        })
+        response.raise_for_status()
+        project_id = response.json()["id"]
+        self.project_ids.append(project_id)
+        epics = await self.client.post(f"/api/projects/{project_id}/generate-epics?use_cache={self.cache}")
+        if epics.status_code == 200:
+            self.epic_ids.extend(epic["id"] for epic in epics.json())
+        return epics
+
+    async def run_scenario(self, name: str):
+        client, pick = self.client, self.random.choice
+        if name == "list_projects":
+            return await client.get("/api/projects/?limit=50")
+        if name == "project_tree":
+            return await client.get(f"/api/projects/{pick(self.project_ids)}/tree")
+        if name == "epic_stories":
+            return await client.get(f"/api/epics/{pick(self.epic_ids)}/stories?latest_only=true")
+        if name == "generate_stories":
+            response = await client.post(f"/api/epics/{pick(self.epic_ids)}/generate-stories?use_cache={self.cache}")
+            if response.status_code == 200:
+                self.stories_created += len(response.json())
+                self.story_ids.extend(story["id"] for story in response.json())
+            return response
+        if name == "stream_stories":
+            return await client.post(f"/api/epics/{pick(self.epic_ids)}/generate-stories/stream?use_cache={self.cache}")
+        if name == "refine_story":
+            response = await client.post(
+                f"/api/stories/{pick(self.story_ids)}/refine",
+                params={"feedback": "Make the acceptance criteria testable", "use_cache": self.cache}
+            )
+            if response.status_code == 200:
+                self.stories_created += 1
+            return response
+        if name == "create_project":
+            return await self.create_project("Load")
+        raise ValueError(name)
+
+    async def worker(self, deadline: float):
+        names = list(SCENARIOS)
+        weights = [SCENARIOS[name] for name in names]
+        while time.perf_counter() < deadline:
+            name = self.random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await self.run_scenario(name)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            self.latencies[name].append(time.perf_counter() - start)
+            self.statuses[name][status] += 1
+
+    async def run(self) -> Dict:
+        await self.seed()
+        before = write_counts((await self.client.get("/metrics")).text)
+        start = time.perf_counter()
+        await asyncio.gather(*(self.worker(start + self.args.duration) for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - start
+        after = write_counts((await self.client.get("/metrics")).text)
+
+        scenarios = {}
+        for name in SCENARIOS:
+            latencies = self.latencies.get(name, [])
+            ok = self.statuses[name].get("200", 0)
+            scenarios[name] = {
+                "requests": len(latencies),
+                "ok": ok,
+                "requests_per_second": round(len(latencies) / elapsed, 2),
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99),
+                "statuses": dict(self.statuses[name]),
+            }
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        writes = {operation: after.get(operation, 0) - before.get(operation, 0) for operation in WRITE_OPERATIONS}
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "overall": {
+                "requests": len(all_latencies),
+                "requests_per_second": round(len(all_latencies) / elapsed, 2),
+                "error_rate": round(1 - sum(s["ok"] for s in scenarios.values()) / max(1, len(all_latencies)), 4),
+                "p50_ms": percentile(all_latencies, 0.50),
+                "p95_ms": percentile(all_latencies, 0.95),
+                "p99_ms": percentile(all_latencies, 0.99),
+            },
+            "db": {
+                "write_statements": writes,
+                "write_statements_per_second": round(sum(writes.values()) / elapsed, 1),
+                "stories_created": self.stories_created,
+                "stories_per_second": round(self.stories_created / elapsed, 1),
+            },
+            "scenarios": scenarios,
+        }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: Dict):
+    overall, db = result["overall"], result["db"]
+    print(f"{overall['requests']} requests in {result['elapsed_seconds']}s: {overall['requests_per_second']} req/s, "
+          f"p50 {overall['p50_ms']}ms, p95 {overall['p95_ms']}ms, p99 {overall['p99_ms']}ms, "
+          f"errors {overall['error_rate']:.1%}")
+    print(f"DB: {db['write_statements_per_second']} write statements/s {db['write_statements']}, "
+          f"{db['stories_per_second']} stories/s")
+    print(f"  {'scenario':<18}{'req':>6}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}  statuses")
+    for name, stats in result["scenarios"].items():
+        print(f"  {name:<18}{stats['requests']:>6}{stats['requests_per_second']:>8}"
+              f"{stats['p50_ms'] or '-':>9}{stats['p95_ms'] or '-':>9}{stats['p99_ms'] or '-':>9}  {stats['statuses']}")
+
+
+def compare(result: Dict, baseline: Dict, max_regression: float) -> bool:
+    """Print changes against baseline; False if throughput or p95 regressed beyond max_regression"""
+    print(f"Compared with {baseline.get('name')} at {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    ok = True
+    changed = sorted(
+        key for key, value in result["config"].items()
+        if key != "name" and baseline.get("config", {}).get(key) != value
+    )
+    if changed:
+        print(f"  note: run settings differ ({', '.join(changed)}), so the numbers are not like for like")
+    rows = [("overall", result["overall"], baseline["overall"])] + [
+        (name, stats, baseline["scenarios"].get(name)) for name, stats in result["scenarios"].items()
+    ]
+    for name, now, before in rows:
+        if not before or not before.get("requests"):
+            continue
+        throughput = now["requests_per_second"] / before["requests_per_second"] - 1 if before["requests_per_second"] else 0
+        p95 = (now["p95_ms"] or 0) / before["p95_ms"] - 1 if before.get("p95_ms") else 0
+        flag = ""
+        if name == "overall" and (throughput < -max_regression or p95 > max_regression):
+            flag, ok = "  REGRESSION", False
+        print(f"  {name:<18} req/s {throughput:+7.1%}   p95 {p95:+7.1%}{flag}")
+    return ok
+
+
+async def main_async(args) -> Dict:
+    import httpx
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=120)
+    else:
+        from app.database import engine
+        from app.main import app
+        from app.migrations import init_schema
+        init_schema(engine)  # ASGITransport does not run the app's startup
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=120)
+    async with client:
+        return await LoadTest(client, args).run()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.base_url:
+        configure_in_process(args)
+
+    result = asyncio.run(main_async(args))
+    result = {
+        "name": args.name,
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output_dir")},
+        **result,
+    }
+    print_report(result)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{args.name}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            return 0 if compare(result, json.load(f), args.max_regression) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
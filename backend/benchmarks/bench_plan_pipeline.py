@@ -0,0 +1,76 @@
+# benchmarks/bench_plan_pipeline.py - Run from backend/: python -m benchmarks.bench_plan_pipeline
+#
+# Plans a whole project through POST /api/projects/{id}/plan with a slow
+# stand-in model and compares wall time with the serial per-epic flow.
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+
+from fastapi.testclient import TestClient
+
+from app.database import engine
+from app.main import app
+from app.migrations import init_schema
+from app.services.gemini import gemini_service
+
+# The app creates its schema at startup, which these clients do not run
+init_schema(engine)
+
+MODEL_LATENCY = 0.4
+EPIC_COUNT = 8
+MAX_PARALLEL = 8
+
+EPICS_JSON = json.dumps([
+    {"title": f"Epic {i}", "description": "Bench epic"} for i in range(EPIC_COUNT)
+])
+STORIES_JSON = json.dumps([
+    {"title": "Story", "user_story": "As a user, I want x so that y",
+     "acceptance_criteria": ["Given a, when b, then c"], "priority": "Medium", "story_points": 3}
+])
+
+
+class SlowModel:
+    """Blocking stand-in for genai.GenerativeModel with a fixed round trip"""
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(MODEL_LATENCY)
+        text = EPICS_JSON if "suggest 5-8 epics" in prompt else STORIES_JSON
+        return type("Response", (), {"text": text})()
+
+
+def main():
+    gemini_service.model = SlowModel()
+    client = TestClient(app)
+    project = client.post("/api/projects/", json={
+        "name": "Bench", "app_type": "benchmark", "context": "Benchmark project"
+    }).json()
+
+    start = time.perf_counter()
+    first_stories_at = None
+    with client.stream("POST", f"/api/projects/{project['id']}/plan?max_parallel={MAX_PARALLEL}") as response:
+        for line in response.iter_lines():
+            event = json.loads(line)
+            if event["event"] == "stories_generated" and first_stories_at is None:
+                first_stories_at = time.perf_counter() - start
+            if event["event"] == "completed":
+                summary = event
+    wall = time.perf_counter() - start
+
+    serial = MODEL_LATENCY * (EPIC_COUNT + 1)
+    print(f"Planned {summary['epics']} epics / {summary['stories']} stories at {MODEL_LATENCY:.2f}s model latency")
+    print(f"  wall time:            {wall:.2f}s (serial flow would be {serial:.2f}s)")
+    print(f"  first epic persisted: {first_stories_at:.2f}s")
+    return 0 if wall < serial / 2 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
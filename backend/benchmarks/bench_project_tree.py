@@ -0,0 +1,88 @@
+# benchmarks/bench_project_tree.py - Run from backend/: python -m benchmarks.bench_project_tree
+#
+# Builds projects of growing size and times GET /api/projects/{id}/tree and its
+# SQL query count against the per-epic calls the frontend made before. The
+# constant query count is asserted by benchmarks/check_tree_queries.py.
+
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import SessionLocal, engine
+from app.main import app
+from app.migrations import init_schema
+from app.models import Project, Epic, UserStory
+
+# The app creates its schema at startup, which these clients do not run
+init_schema(engine)
+
+SIZES = [(1, 1), (5, 5), (20, 10), (50, 20)]
+REFINED_VERSIONS = 2
+
+queries = []
+event.listen(engine, "before_cursor_execute", lambda *args: queries.append(1))
+
+
+def seed(epic_count: int, stories_per_epic: int) -> int:
+    db = SessionLocal()
+    project = Project(name="Bench", app_type="benchmark", description="Bench", context="x" * 5000)
+    db.add(project)
+    db.flush()
+    for e in range(epic_count):
+        epic = Epic(project_id=project.id, title=f"Epic {e}", description="Bench epic")
+        db.add(epic)
+        db.flush()
+        for s in range(stories_per_epic):
+            root = UserStory(epic_id=epic.id, title=f"Story {s}", user_story="As a user...",
+                             acceptance_criteria=["Given a, when b, then c"], priority="Medium", version=1)
+            db.add(root)
+            db.flush()
+            for v in range(2, REFINED_VERSIONS + 2):
+                db.add(UserStory(epic_id=epic.id, title=f"Story {s} v{v}", user_story="As a user...",
+                                 acceptance_criteria=["Given a, when b, then c"], priority="Medium", version=v,
+                                 parent_story_id=root.id, root_story_id=root.id))
+    db.commit()
+    project_id = project.id
+    db.close()
+    return project_id
+
+
+def measure(client: TestClient, urls):
+    queries.clear()
+    start = time.perf_counter()
+    for url in urls:
+        client.get(url).raise_for_status()
+    return len(queries), time.perf_counter() - start
+
+
+def main():
+    client = TestClient(app)
+    print(f"{'epics':>6} {'stories':>8} {'tree queries':>13} {'tree ms':>8} {'per-epic queries':>17} {'per-epic ms':>12}")
+    for epic_count, stories_per_epic in SIZES:
+        project_id = seed(epic_count, stories_per_epic)
+        tree = client.get(f"/api/projects/{project_id}/tree").json()
+        assert len(tree["epics"]) == epic_count
+        assert all(len(epic["user_stories"]) == stories_per_epic for epic in tree["epics"])
+
+        tree_queries, tree_time = measure(client, [f"/api/projects/{project_id}/tree"])
+        epic_ids = [epic["id"] for epic in tree["epics"]]
+        legacy_urls = [f"/api/projects/{project_id}", f"/api/projects/{project_id}/epics"]
+        legacy_urls += [f"/api/epics/{epic_id}/stories?latest_only=true" for epic_id in epic_ids]
+        legacy_queries, legacy_time = measure(client, legacy_urls)
+
+        print(f"{epic_count:>6} {epic_count * stories_per_epic:>8} {tree_queries:>13} {tree_time * 1000:>8.1f} "
+              f"{legacy_queries:>17} {legacy_time * 1000:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
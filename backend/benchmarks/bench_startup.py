@@ -0,0 +1,113 @@
+# benchmarks/bench_startup.py - Run from backend/: python -m benchmarks.bench_startup [--ref HEAD~1]
+#
+# Time to first request on CRUD-only routes for a freshly started API process:
+# interpreter start, importing app.main, startup, then listing, creating and
+# reading a project. Each run is a new process against an existing database, as
+# on a worker restart. --ref also measures an earlier commit (checked out into a
+# temporary git worktree) so the two can be compared side by side.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Runs in the child process; phases are measured from its first line
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+t1 = time.perf_counter()
+with TestClient(app) as client:
+    t2 = time.perf_counter()
+    client.get("/api/projects/").raise_for_status()
+    created = client.post("/api/projects/", json={
+        "name": "Startup", "app_type": "benchmark", "description": "Startup", "context": "Startup"
+    })
+    created.raise_for_status()
+    client.get(f"/api/projects/{created.json()['id']}").raise_for_status()
+    t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000, "startup_ms": (t2 - t1) * 1000, "first_requests_ms": (t3 - t2) * 1000,
+    "sdk_loaded": "google.generativeai" in sys.modules
+}))
+"""
+
+
+def run_once(tree: str, env: dict) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=tree, env=env, capture_output=True, text=True, timeout=300
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Child process failed in {tree}:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["wall_ms"] = wall
+    return timings
+
+
+def measure(label: str, tree: str, runs: int, api_key: bool) -> dict:
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+    env.update(
+        PYTHONPATH=tree,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'app.db')}",
+        LLM_CACHE_PATH=os.path.join(workdir, "cache.db"),
+        PROFILING_ENABLED="false"
+    )
+    if api_key:
+        env["GEMINI_API_KEY"] = "startup-benchmark"
+
+    run_once(tree, env)  # Creates the schema and warms the OS file cache
+    samples = [run_once(tree, env) for _ in range(runs)]
+    summary = {
+        phase: statistics.median(sample[phase] for sample in samples)
+        for phase in ("import_ms", "startup_ms", "first_requests_ms", "wall_ms")
+    }
+    summary["sdk_loaded"] = samples[-1]["sdk_loaded"]
+    print(
+        f"{label:<10} import {summary['import_ms']:7.0f} ms  startup {summary['startup_ms']:6.0f} ms  "
+        f"first requests {summary['first_requests_ms']:6.0f} ms  process total {summary['wall_ms']:7.0f} ms  "
+        f"(Gemini SDK {'loaded' if summary['sdk_loaded'] else 'not loaded'}, "
+        f"{'with' if api_key else 'without'} API key)"
+    )
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="Measured process starts per tree; medians are reported")
+    parser.add_argument("--ref", help="Also measure this git revision, for a before/after comparison")
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"Median of {args.runs} process starts, CRUD routes only\n")
+
+    baseline = None
+    if args.ref:
+        repo = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=here, capture_output=True,
+                              text=True, check=True).stdout.strip()
+        worktree = tempfile.mkdtemp(prefix="startup-ref-")
+        subprocess.run(["git", "worktree", "add", "--detach", "--force", worktree, args.ref], cwd=repo,
+                       capture_output=True, check=True)
+        try:
+            # Earlier revisions refused to start without an API key
+            baseline = measure(args.ref, os.path.join(worktree, os.path.relpath(here, repo)), args.runs, api_key=True)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=repo, capture_output=True)
+
+    current = measure("working", here, args.runs, api_key=False)
+
+    if baseline:
+        before = baseline["wall_ms"]
+        after = current["wall_ms"]
+        print(f"\nTime to first request: {before:.0f} ms -> {after:.0f} ms ({(before - after) / before:.0%} less)")
+
+
+if __name__ == "__main__":
+    main()
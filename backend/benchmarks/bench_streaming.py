@@ -0,0 +1,102 @@
+# benchmarks/bench_streaming.py - Run from backend/: python -m benchmarks.bench_streaming
+#
+# Compares time-to-first-story for the SSE streaming route against the
+# blocking generate-stories route, using a stand-in model that emits its
+# JSON in small chunks over time.
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal, engine
+from app.main import app
+from app.migrations import init_schema
+from app.models import Epic
+from app.services.gemini import gemini_service
+
+# The app creates its schema at startup, which these clients do not run
+init_schema(engine)
+
+STORY_COUNT = 5
+SECONDS_PER_STORY = 0.3
+CHUNK_SIZE = 40
+
+STORIES_JSON = "```json\n" + json.dumps([
+    {"title": f"Story {i}", "user_story": "As a user, I want x so that y",
+     "acceptance_criteria": ["Given a, when b, then c"], "priority": "Medium", "story_points": 3}
+    for i in range(STORY_COUNT)
+], indent=2) + "\n```"
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StreamingModel:
+    """Stand-in model that produces its output at a steady token rate"""
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        chunks = [STORIES_JSON[i:i + CHUNK_SIZE] for i in range(0, len(STORIES_JSON), CHUNK_SIZE)]
+        delay = SECONDS_PER_STORY * STORY_COUNT / len(chunks)
+        if not stream:
+            time.sleep(delay * len(chunks))
+            return Chunk(STORIES_JSON)
+        return self._stream(chunks, delay)
+
+    @staticmethod
+    def _stream(chunks, delay):
+        for chunk in chunks:
+            time.sleep(delay)
+            yield Chunk(chunk)
+
+
+def main():
+    gemini_service.model = StreamingModel()
+    client = TestClient(app)
+    project = client.post("/api/projects/", json={
+        "name": "Bench", "app_type": "benchmark", "context": "Benchmark project"
+    }).json()
+    db = SessionLocal()
+    epic = Epic(project_id=project["id"], title="Epic", description="Bench epic")
+    db.add(epic)
+    db.commit()
+    epic_id = epic.id
+    db.close()
+
+    start = time.perf_counter()
+    client.post(f"/api/epics/{epic_id}/generate-stories").raise_for_status()
+    blocking = time.perf_counter() - start
+
+    # The test transport buffers the response, so timings come from the server's done event
+    stories = 0
+    with client.stream("POST", f"/api/epics/{epic_id}/generate-stories/stream") as response:
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "story":
+                stories += 1
+            elif line.startswith("data: ") and event == "done":
+                done = json.loads(line[len("data: "):])
+    first_story = done["first_story_seconds"]
+    streaming = done["total_seconds"]
+
+    print(f"{STORY_COUNT} stories, ~{SECONDS_PER_STORY:.2f}s of model output each")
+    print(f"  blocking route, first story:  {blocking:.2f}s")
+    print(f"  streaming route, first story: {first_story:.2f}s ({first_story / streaming:.0%} of {streaming:.2f}s total)")
+    return 0 if stories == STORY_COUNT and first_story < streaming / 2 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,94 @@
+# benchmarks/check_tree_queries.py - Run from backend/: python -m benchmarks.check_tree_queries
+#
+# Regression check for CI: GET /api/projects/{id}/tree must issue the same
+# number of SQL queries whatever the project size, and return only the latest
+# version of each story. Exits non-zero on failure; takes about a second.
+
+import os
+import sys
+import tempfile
+
+workdir = tempfile.TemporaryDirectory()  # Scratch databases, removed at exit
+os.environ.setdefault("GEMINI_API_KEY", "check")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir.name, 'app.db')}")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(workdir.name, "llm_cache.db"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import SessionLocal, engine
+from app.main import app
+from app.migrations import init_schema
+from app.models import Project, Epic, UserStory
+
+# The app creates its schema at startup, which this client does not run
+init_schema(engine)
+
+# (epics, stories per epic), smallest first
+SIZES = [(1, 1), (3, 2), (20, 10)]
+REFINED_VERSIONS = 2
+
+
+def seed(epic_count: int, stories_per_epic: int) -> int:
+    db = SessionLocal()
+    project = Project(name="Check", app_type="check", description="Check", context="Check project")
+    db.add(project)
+    db.flush()
+    for e in range(epic_count):
+        epic = Epic(project_id=project.id, title=f"Epic {e}", description="Check epic")
+        db.add(epic)
+        db.flush()
+        for s in range(stories_per_epic):
+            root = UserStory(epic_id=epic.id, title=f"Story {s}", user_story="As a user...",
+                             acceptance_criteria=["Given a, when b, then c"], priority="Medium", version=1)
+            db.add(root)
+            db.flush()
+            for v in range(2, REFINED_VERSIONS + 2):
+                db.add(UserStory(epic_id=epic.id, title=f"Story {s} v{v}", user_story="As a user...",
+                                 acceptance_criteria=["Given a, when b, then c"], priority="Medium", version=v,
+                                 parent_story_id=root.id, root_story_id=root.id))
+    db.commit()
+    project_id = project.id
+    db.close()
+    return project_id
+
+
+def main():
+    client = TestClient(app)
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(1))
+    failures = []
+
+    counts = {}
+    for epic_count, stories_per_epic in SIZES:
+        project_id = seed(epic_count, stories_per_epic)
+        queries.clear()
+        response = client.get(f"/api/projects/{project_id}/tree")
+        counts[(epic_count, stories_per_epic)] = len(queries)
+        if response.status_code != 200:
+            failures.append(f"{epic_count}x{stories_per_epic}: status {response.status_code}")
+            continue
+        tree = response.json()
+        versions = {story["version"] for epic in tree["epics"] for story in epic["user_stories"]}
+        if len(tree["epics"]) != epic_count or any(len(epic["user_stories"]) != stories_per_epic for epic in tree["epics"]):
+            failures.append(f"{epic_count}x{stories_per_epic}: wrong number of epics or stories")
+        if versions != {REFINED_VERSIONS + 1}:
+            failures.append(f"{epic_count}x{stories_per_epic}: expected only latest versions, got {sorted(versions)}")
+
+    if len(set(counts.values())) != 1:
+        failures.append(f"query count varies with project size: {counts}")
+
+    trimmed = client.get(f"/api/projects/{project_id}/tree?omit=project.context,story.acceptance_criteria").json()
+    if "context" in trimmed or "acceptance_criteria" in trimmed["epics"][0]["user_stories"][0]:
+        failures.append("omit did not drop project.context and story.acceptance_criteria")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        return 1
+    print(f"OK: tree endpoint uses {counts[SIZES[0]]} queries at every size")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())